@@ -1,18 +1,35 @@
 import asyncio
 import logging
 from datetime import datetime
+from typing import Optional
 
 import pytz
 
 from bot.bot_client import BotClient
+from bot.code_messages import CodeMessageCleaner
 from bot.commands import CommandHandler
+from bot.membership import group_membership
+from bot.username_resolver import username_resolver
 from config import config
 from core.emby_api import EmbyApi, EmbyRouterAPI
-from services import UserService
+from core.emby_pool import EmbyBackend, EmbyPool
+from core.member_registry import member_registry
+from services import (
+    BanQueue,
+    LibraryStats,
+    ReconcileService,
+    RegisterQueue,
+    UserService,
+)
+from utils import tracing
+from utils.metrics import start_metrics_server
+from models.group_member_model import GroupMemberRepository
 from models.database import (
     init_db,
+    database_url,
     create_database_if_not_exists,
     create_tables,
+    get_pool_stats,
 )
 
 # Initialize logger
@@ -22,29 +39,59 @@ logger = logging.getLogger(__name__)
 
 async def _init_db() -> None:
     """初始化数据库连接并创建表。"""
-    # Create database if it doesn't exist
-    await create_database_if_not_exists(
-        host=config.db_host,
-        port=config.db_port,
-        user=config.db_user,
-        password=config.db_pass,
-        db_name=config.db_name,
-    )
+    # Create database if it doesn't exist (SQLite creates the file on connect)
+    if config.db_backend == "mysql":
+        await create_database_if_not_exists(
+            host=config.db_host,
+            port=config.db_port,
+            user=config.db_user,
+            password=config.db_pass,
+            db_name=config.db_name,
+        )
 
     # Initialize the engine and session factory
     await init_db(
-        host=config.db_host,
-        port=config.db_port,
-        user=config.db_user,
-        password=config.db_pass,
-        db_name=config.db_name,
-        echo=True,
+        database_url(
+            config.db_backend,
+            host=config.db_host,
+            port=config.db_port,
+            user=config.db_user,
+            password=config.db_pass,
+            db_name=config.db_name,
+            sqlite_path=config.db_path,
+        ),
+        echo=config.db_echo,
+        pool_size=config.db_pool_size,
+        max_overflow=config.db_max_overflow,
+        pool_recycle=config.db_pool_recycle,
+        pool_pre_ping=config.db_pool_pre_ping,
+        pool_timeout=config.db_pool_timeout,
+        slow_query_ms=config.db_slow_query_ms,
+        slow_query_sample_rate=config.db_slow_query_sample_rate,
+        sqlite_busy_timeout_ms=config.db_sqlite_busy_timeout,
     )
 
     # Create all tables
     await create_tables()
 
 
+async def _log_pool_stats(interval: int) -> None:
+    """定期输出数据库连接池状态。"""
+    while True:
+        await asyncio.sleep(interval)
+        logger.info(f"数据库连接池状态: {get_pool_stats()}")
+
+
+async def _run_reconcile(reconcile_service: ReconcileService, interval: int) -> None:
+    """定期执行数据库与 Emby 的对账任务。"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await reconcile_service.run(fix=config.reconcile_fix)
+        except Exception as e:
+            logger.error(f"定期对账失败: {e}", exc_info=True)
+
+
 def _init_logger() -> None:
     """初始化日志记录器。"""
     # Clear any existing handlers to prevent duplicates
@@ -92,17 +139,53 @@ async def setup_bot() -> BotClient:
         api_hash=config.api_hash,
         bot_token=config.bot_token,
         name="emby_bot",
+        send_rate=config.send_rate,
+        chat_interval=config.send_chat_interval,
+        group_interval=config.send_group_interval,
     )
     await bot_client.start()
     return bot_client
 
 
-async def fetch_group_members(bot_client: BotClient) -> None:
-    """获取群组成员并更新配置。"""
+async def refresh_group_members(bot_client: BotClient) -> None:
+    """从 Telegram 获取最新群组成员，更新内存索引并保存快照。"""
     members_in_group = await bot_client.get_group_members(config.telegram_group_ids)
-    for group_members in members_in_group.values():
-        for telegram_id in group_members:
-            config.group_members[telegram_id] = group_members[telegram_id]
+    for group_id, members in members_in_group.items():
+        group_membership.replace_group(group_id, members)
+        try:
+            await GroupMemberRepository.replace_group(group_id, members)
+        except Exception as e:
+            logger.error(f"保存群组 {group_id} 成员快照失败: {e}", exc_info=True)
+    logger.info(f"群组成员登记表内存占用: {member_registry.memory_usage()}")
+
+
+async def _refresh_group_members_in_background(bot_client: BotClient) -> None:
+    try:
+        await refresh_group_members(bot_client)
+        logger.info("群组成员已在后台追平。")
+    except Exception as e:
+        logger.error(f"后台更新群组成员失败: {e}", exc_info=True)
+
+
+async def fetch_group_members(bot_client: BotClient) -> Optional[asyncio.Task]:
+    """
+    获取群组成员并更新配置。
+    有数据库快照时立即加载快照，再在后台从 Telegram 追平；否则同步拉取。
+    """
+    snapshot = await GroupMemberRepository.get_all()
+    if not snapshot:
+        await refresh_group_members(bot_client)
+        return None
+
+    by_group: dict[int, dict[int, Optional[str]]] = {}
+    for row in snapshot:
+        if row.group_id not in config.telegram_group_ids:
+            continue
+        by_group.setdefault(row.group_id, {})[row.telegram_id] = row.username
+    for group_id, members in by_group.items():
+        group_membership.seed(group_id, members)
+    logger.info(f"已从快照加载 {len(snapshot)} 条群组成员记录，后台追平中。")
+    return asyncio.create_task(_refresh_group_members_in_background(bot_client))
 
 
 async def main() -> None:
@@ -115,24 +198,122 @@ async def main() -> None:
 
     await _init_db()
     logger.info("数据库初始化完成。")
+    pool_stats_task = None
+    if config.db_pool_stats_interval > 0:
+        pool_stats_task = asyncio.create_task(
+            _log_pool_stats(config.db_pool_stats_interval)
+        )
+
+    # 开启更新追踪（慢命令日志 / JSON Lines 导出）
+    tracing.configure(config.trace_slow_ms, config.trace_export_path)
+
+    # 启动 Prometheus 指标服务
+    metrics_runner = None
+    if config.metrics_port > 0:
+        metrics_runner = await start_metrics_server(
+            config.metrics_host, config.metrics_port
+        )
 
     # 初始化 Bot 客户端
     bot_client = await setup_bot()
     logger.info("Bot 客户端初始化完成。")
 
-    # 初始化 Emby API 和命令处理器
-    emby_api = EmbyApi(config.emby_url, config.emby_api)
-    emby_router_api = EmbyRouterAPI(config.api_url, config.api_key)
+    # 初始化 Emby 后端和命令处理器
+    emby_pool = EmbyPool(
+        [
+            EmbyBackend(
+                backend["name"],
+                EmbyApi(
+                    backend["url"],
+                    backend["api_key"],
+                    timeout=config.emby_timeout,
+                    pool_limit=config.emby_pool_limit,
+                    pool_limit_per_host=config.emby_pool_limit_per_host,
+                    keepalive_timeout=config.emby_keepalive_timeout,
+                    user_cache_size=config.emby_user_cache_size,
+                    user_cache_ttl=config.emby_user_cache_ttl,
+                    user_negative_ttl=config.emby_user_negative_ttl,
+                    breaker_threshold=config.emby_breaker_threshold,
+                    breaker_recovery=config.emby_breaker_recovery,
+                    min_timeout=config.emby_timeout_min,
+                    timeout_multiplier=config.emby_timeout_multiplier,
+                    name=backend["name"],
+                ),
+                backend["capacity"],
+            )
+            for backend in config.emby_backends
+        ],
+        placement=config.emby_placement,
+    )
+    emby_router_api = EmbyRouterAPI(
+        config.api_url,
+        config.api_key,
+        timeout=config.emby_timeout,
+        keepalive_timeout=config.emby_keepalive_timeout,
+        breaker_threshold=config.emby_breaker_threshold,
+        breaker_recovery=config.emby_breaker_recovery,
+        min_timeout=config.emby_timeout_min,
+        timeout_multiplier=config.emby_timeout_multiplier,
+    )
+    reconcile_service = ReconcileService(
+        emby_pool,
+        page_size=config.reconcile_page_size,
+        concurrency=config.reconcile_concurrency,
+    )
+    user_service = UserService(emby_pool=emby_pool, emby_router_api=emby_router_api)
+    ban_queue = BanQueue(
+        user_service,
+        concurrency=config.ban_queue_concurrency,
+        max_attempts=config.ban_queue_max_attempts,
+        backoff=config.ban_queue_backoff,
+        poll_interval=config.ban_queue_poll_interval,
+    )
+    register_queue = RegisterQueue(
+        user_service, concurrency=config.register_queue_concurrency
+    )
+    code_messages = CodeMessageCleaner(
+        bot_client.client,
+        ttl=config.code_message_ttl,
+        flush_interval=config.code_message_flush_interval,
+    )
+    # 影片数量统计取自默认后端
+    library_stats = LibraryStats(
+        emby_pool.default.api,
+        refresh_interval=config.count_refresh_interval,
+        per_library=config.count_per_library,
+    )
     command_handler = CommandHandler(
         bot_client=bot_client,
-        user_service=UserService(emby_api=emby_api, emby_router_api=emby_router_api),
+        user_service=user_service,
+        reconcile_service=reconcile_service,
+        ban_queue=ban_queue,
+        register_queue=register_queue,
+        code_messages=code_messages,
+        library_stats=library_stats,
     )
     logger.info("Emby API 和命令处理器初始化完成。")
+    reconcile_task = None
+    refresh_task = None
+    if config.reconcile_interval > 0:
+        reconcile_task = asyncio.create_task(
+            _run_reconcile(reconcile_service, config.reconcile_interval)
+        )
 
     try:
-        # 获取群组成员
-        await fetch_group_members(bot_client)
-        logger.info("群组成员信息已更新。")
+        # 获取群组成员（有快照时后台追平）
+        refresh_task = await fetch_group_members(bot_client)
+        logger.info("群组成员信息已加载。")
+
+        # 启动退群禁用队列
+        ban_queue.start()
+        # 启动注册排队
+        register_queue.start()
+        # 启动用户名落库任务
+        username_resolver.start()
+        # 启动邀请码消息清理任务
+        code_messages.start()
+        # 后台刷新影片数量统计
+        library_stats.start()
 
         # 设置命令并进入空闲状态
         command_handler.setup_commands()
@@ -142,7 +323,20 @@ async def main() -> None:
     except Exception as e:
         logger.error(f"启动 Bot 失败: {e}", exc_info=True)
     finally:
+        for task in (pool_stats_task, reconcile_task, refresh_task):
+            if task is not None:
+                task.cancel()
+        await ban_queue.stop()
+        await register_queue.stop()
+        await username_resolver.stop()
+        await code_messages.stop()
+        await library_stats.stop()
         await bot_client.stop()
+        await emby_pool.close()
+        await emby_router_api.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        tracing.close()
         logger.info("Bot 已停止。")
 
 
@@ -0,0 +1,369 @@
+"""
+端到端基准测试：在本地模拟的 Emby / 路由服务和 Telegram 客户端上，
+以不同并发度执行完整的命令流程，输出每个流程的吞吐量与延迟分位数。
+
+用法（在仓库根目录执行）：
+    python -m benchmarks.e2e --concurrency 1,10,50 --requests 200
+    python -m benchmarks.e2e --output new.json --compare baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# 项目模块在导入时读取配置，需在导入前提供基准测试所需的默认值
+os.environ.setdefault("TELEGRAM_GROUP_ID", "-1001")
+os.environ.setdefault("ADMIN_LIST", "1")
+
+from benchmarks.fakes import (  # noqa: E402
+    FakeEmbyServer,
+    FakeTelegramClient,
+    make_callback,
+    make_message,
+)
+from bot.bot_client import BotClient  # noqa: E402
+from bot.code_messages import CodeMessageCleaner  # noqa: E402
+from bot.commands import CommandHandler  # noqa: E402
+from config import config  # noqa: E402
+from core.emby_api import EmbyApi, EmbyRouterAPI  # noqa: E402
+from core.emby_pool import EmbyBackend, EmbyPool  # noqa: E402
+from models import database  # noqa: E402
+from services import (  # noqa: E402
+    BanQueue,
+    LibraryStats,
+    ReconcileService,
+    RegisterQueue,
+    UserService,
+)
+from utils.metrics import COMMANDS  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+# 每个并发度使用独立的一段 Telegram ID，避免不同轮次之间互相影响
+USER_ID_STRIDE = 1_000_000
+
+
+class Flow:
+    """一个被测流程：名称、对应的命令名（用于统计错误）以及单次调用"""
+
+    def __init__(self, name: str, command: str, call):
+        self.name = name
+        self.command = command
+        self.call = call
+
+
+def build_flows(
+    handler: CommandHandler,
+    client: FakeTelegramClient,
+    register_queue: RegisterQueue,
+    codes: dict,
+):
+    admin_id = config.admin_list[0]
+    group_id = config.telegram_group_ids[0]
+    async def create(uid: int):
+        # 创建在注册队列中完成，计时到账号创建结束并已回复用户
+        await handler.create_user(make_message(client, uid, f"/create bench{uid}"))
+        await register_queue.wait(uid)
+
+    return [
+        Flow(
+            "use_code",
+            "use_code",
+            lambda uid: handler.use_code(
+                make_message(client, uid, f"/use_code {codes[uid]}")
+            ),
+        ),
+        Flow("create", "create_user", create),
+        Flow("info", "info", lambda uid: handler.info(make_message(client, uid, "/info"))),
+        Flow(
+            "select_line",
+            "select_line",
+            lambda uid: handler.select_line(make_message(client, uid, "/select_line")),
+        ),
+        Flow(
+            "select_line_cb",
+            "handle_callback_query",
+            lambda uid: handler.handle_callback_query(
+                client, make_callback(client, uid, "SELECTROUTE_2")
+            ),
+        ),
+        Flow(
+            "ban_emby",
+            "ban_emby",
+            lambda uid: handler.ban_emby(
+                make_message(client, admin_id, "/ban_emby", group_id, reply_to_id=uid)
+            ),
+        ),
+        Flow(
+            "unban_emby",
+            "unban_emby",
+            lambda uid: handler.unban_emby(
+                make_message(client, admin_id, "/unban_emby", group_id, reply_to_id=uid)
+            ),
+        ),
+        Flow(
+            "member_leave",
+            "group_member_change_handler",
+            lambda uid: handler.group_member_change_handler(
+                client, make_message(client, uid, None, group_id, left_member_id=uid)
+            ),
+        ),
+    ]
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """最近秩法计算分位数"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+async def run_flow(flow: Flow, user_ids: list[int], concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    exceptions = 0
+
+    async def one(uid: int):
+        nonlocal exceptions
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await flow.call(uid)
+            except Exception as e:
+                exceptions += 1
+                logger.debug(f"{flow.name} 抛出异常: {e}")
+            latencies.append(time.perf_counter() - start)
+
+    errors_before = COMMANDS.get(flow.command, "error")
+    start = time.perf_counter()
+    await asyncio.gather(*(one(uid) for uid in user_ids))
+    elapsed = time.perf_counter() - start
+    errors = COMMANDS.get(flow.command, "error") - errors_before + exceptions
+
+    latencies.sort()
+    ms = [value * 1000 for value in latencies]
+    return {
+        "flow": flow.name,
+        "concurrency": concurrency,
+        "requests": len(user_ids),
+        "errors": int(errors),
+        "throughput": round(len(user_ids) / elapsed, 2) if elapsed > 0 else 0.0,
+        "p50_ms": round(percentile(ms, 50), 2),
+        "p95_ms": round(percentile(ms, 95), 2),
+        "p99_ms": round(percentile(ms, 99), 2),
+        "mean_ms": round(sum(ms) / len(ms), 2) if ms else 0.0,
+        "max_ms": round(ms[-1], 2) if ms else 0.0,
+    }
+
+
+async def setup_database(db_url: str):
+    """初始化数据库并重建表结构"""
+    await database.init_db(db_url, slow_query_ms=0)
+    async with database.engine.begin() as conn:
+        await conn.run_sync(database.Base.metadata.drop_all)
+    await database.create_tables()
+
+
+async def run(args) -> dict:
+    await setup_database(args.db_url)
+
+    # 每个 Emby 后端一个模拟服务，第一个同时充当路由服务
+    servers = [
+        FakeEmbyServer(latency_ms=args.emby_latency, jitter=args.jitter)
+        for _ in range(args.backends)
+    ]
+    urls = [await server.start() for server in servers]
+    emby_pool = EmbyPool(
+        [
+            EmbyBackend(f"bench{i}", EmbyApi(url, "bench", name=f"bench{i}"))
+            for i, url in enumerate(urls)
+        ]
+    )
+    emby_router_api = EmbyRouterAPI(urls[0], "bench")
+    bot_client = BotClient(
+        api_id="1",
+        api_hash="x",
+        bot_token="1:x",
+        name="bench",
+        send_rate=1e9,
+        chat_interval=0,
+        group_interval=0,
+    )
+    client = FakeTelegramClient(latency_ms=args.tg_latency)
+    bot_client.client = client
+
+    user_service = UserService(emby_pool=emby_pool, emby_router_api=emby_router_api)
+    register_queue = RegisterQueue(user_service, concurrency=args.register_concurrency)
+    register_queue.start()
+    handler = CommandHandler(
+        bot_client=bot_client,
+        user_service=user_service,
+        reconcile_service=ReconcileService(emby_pool),
+        # 队列不启动：只测量退群事件的入队耗时
+        ban_queue=BanQueue(user_service),
+        register_queue=register_queue,
+        code_messages=CodeMessageCleaner(client),
+        library_stats=LibraryStats(emby_pool.default.api),
+    )
+
+    results = []
+    try:
+        admin_id = config.admin_list[0]
+        for level, concurrency in enumerate(args.concurrency, start=1):
+            user_ids = [
+                level * USER_ID_STRIDE + i for i in range(1, args.requests + 1)
+            ]
+            invite_codes = await user_service.create_invite_code(
+                admin_id, args.requests
+            )
+            codes = {
+                uid: code.code
+                for uid, code in zip(user_ids, invite_codes, strict=True)
+            }
+            for flow in build_flows(handler, client, register_queue, codes):
+                result = await run_flow(flow, user_ids, concurrency)
+                results.append(result)
+                print_row(result)
+    finally:
+        await register_queue.stop()
+        await bot_client.outbox.stop()
+        await emby_pool.close()
+        await emby_router_api.close()
+        for server in servers:
+            await server.stop()
+        db_pool = database.get_pool_stats()
+        await database.engine.dispose()
+
+    return {
+        "meta": {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "db_url": args.db_url,
+            "db_pool": db_pool,
+            "requests": args.requests,
+            "emby_latency_ms": args.emby_latency,
+            "tg_latency_ms": args.tg_latency,
+            "jitter": args.jitter,
+            "emby_backends": args.backends,
+            "register_concurrency": args.register_concurrency,
+            "emby_requests": [server.requests for server in servers],
+            "emby_users": [len(server.users) for server in servers],
+            "telegram_messages": client.sent,
+        },
+        "results": results,
+    }
+
+
+COLUMNS = (
+    ("flow", 16),
+    ("concurrency", 12),
+    ("requests", 9),
+    ("errors", 7),
+    ("throughput", 11),
+    ("p50_ms", 9),
+    ("p95_ms", 9),
+    ("p99_ms", 9),
+    ("mean_ms", 9),
+    ("max_ms", 9),
+)
+
+
+def print_header():
+    print("".join(name.ljust(width) for name, width in COLUMNS))
+
+
+def print_row(result: dict):
+    print("".join(str(result[name]).ljust(width) for name, width in COLUMNS))
+
+
+def compare(results: list[dict], baseline_path: str):
+    """与基线结果对比吞吐量和 p95 延迟"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {
+            (row["flow"], row["concurrency"]): row for row in json.load(f)["results"]
+        }
+
+    print(f"\n对比基线 {baseline_path}：")
+    print("flow".ljust(16) + "concurrency".ljust(12) + "throughput".ljust(20) + "p95_ms")
+    for row in results:
+        base = baseline.get((row["flow"], row["concurrency"]))
+        if base is None:
+            continue
+        print(
+            row["flow"].ljust(16)
+            + str(row["concurrency"]).ljust(12)
+            + _delta(base["throughput"], row["throughput"]).ljust(20)
+            + _delta(base["p95_ms"], row["p95_ms"])
+        )
+
+
+def _delta(old: float, new: float) -> str:
+    if not old:
+        return f"{new}"
+    return f"{new} ({(new - old) / old * 100:+.1f}%)"
+
+
+def parse_args(argv=None):
+    default_db = os.path.join(tempfile.gettempdir(), "embybot-bench.db")
+    parser = argparse.ArgumentParser(description="Emby Bot 端到端基准测试")
+    parser.add_argument(
+        "--concurrency",
+        type=lambda value: [int(v) for v in value.split(",") if v],
+        default=[1, 10, 50],
+        help="逗号分隔的并发度列表，默认 1,10,50",
+    )
+    parser.add_argument(
+        "--requests", type=int, default=200, help="每个流程在每个并发度下的请求数"
+    )
+    parser.add_argument(
+        "--db-url",
+        default=f"sqlite+aiosqlite:///{default_db}",
+        help="SQLAlchemy 异步数据库地址，默认使用临时 SQLite 文件",
+    )
+    parser.add_argument(
+        "--emby-latency", type=float, default=20, help="模拟 Emby/路由 延迟（毫秒）"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.2, help="模拟延迟的随机抖动比例"
+    )
+    parser.add_argument(
+        "--backends", type=int, default=1, help="模拟的 Emby 后端数量"
+    )
+    parser.add_argument(
+        "--register-concurrency",
+        type=int,
+        default=config.register_queue_concurrency,
+        help="注册排队同时创建 Emby 账号的数量",
+    )
+    parser.add_argument(
+        "--tg-latency", type=float, default=0, help="模拟 Telegram 发送延迟（毫秒）"
+    )
+    parser.add_argument("--output", help="结果写入的 JSON 文件")
+    parser.add_argument("--compare", help="用于对比的基线 JSON 文件")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.CRITICAL)
+    print_header()
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.output}")
+    if args.compare:
+        compare(report["results"], args.compare)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
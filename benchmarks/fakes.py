@@ -0,0 +1,221 @@
+"""
+基准测试使用的本地替身：可配置延迟的 Emby / 路由 HTTP 服务，
+以及记录发送内容、不连接 Telegram 的 pyrogram Client 替身。
+"""
+
+import asyncio
+import itertools
+import random
+import uuid
+from datetime import datetime
+
+from aiohttp import web
+from pyrogram import enums, types
+
+
+class FakeEmbyServer:
+    """模拟 Emby 与路由服务的接口，每个请求按配置的延迟返回"""
+
+    def __init__(self, latency_ms: float = 20, jitter: float = 0.2, routes: int = 3):
+        """
+        :param latency_ms: 每个请求的平均延迟（毫秒）
+        :param jitter: 延迟的随机抖动比例
+        :param routes: 可选线路数量
+        """
+        self.latency = latency_ms / 1000
+        self.jitter = jitter
+        self.routes = [
+            {"index": str(i), "name": f"线路{i}"} for i in range(1, routes + 1)
+        ]
+        self.users: dict[str, dict] = {}
+        self.user_routes: dict[str, str] = {}
+        self.requests = 0
+        self._runner = None
+        self.url = ""
+
+    @web.middleware
+    async def _latency(self, request, handler):
+        self.requests += 1
+        if self.latency > 0:
+            delay = self.latency * random.uniform(1 - self.jitter, 1 + self.jitter)
+            await asyncio.sleep(delay)
+        return await handler(request)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application(middlewares=[self._latency])
+        app.router.add_post("/emby/Users/New", self._create_user)
+        app.router.add_get("/emby/Users/Query", self._query_users)
+        app.router.add_get("/emby/Users/{id}", self._get_user)
+        app.router.add_post("/emby/Users/{id}/Policy", self._update_policy)
+        app.router.add_post("/emby/Users/{id}/Delete", self._delete_user)
+        app.router.add_post("/emby/users/{id}/Password", self._empty)
+        app.router.add_get("/emby/Items/Counts", self._counts)
+        app.router.add_get("/emby/System/Info", self._empty)
+        app.router.add_get("/api/route", self._all_routes)
+        app.router.add_get("/api/route/{id}", self._user_route)
+        app.router.add_get("/api/route/{id}/{index}", self._update_route)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _create_user(self, request):
+        data = await request.json()
+        user = {
+            "Id": uuid.uuid4().hex,
+            "Name": data.get("Name", ""),
+            "DateCreated": datetime.utcnow().isoformat() + "0Z",
+            "LastActivityDate": None,
+            "Policy": {"IsDisabled": False, "IsAdministrator": False},
+        }
+        self.users[user["Id"]] = user
+        return web.json_response(user)
+
+    async def _get_user(self, request):
+        user = self.users.get(request.match_info["id"])
+        if user is None:
+            return web.Response(status=404)
+        return web.json_response(user)
+
+    async def _query_users(self, request):
+        start = int(request.query.get("StartIndex", 0))
+        limit = int(request.query.get("Limit", 100))
+        items = list(self.users.values())
+        return web.json_response(
+            {"Items": items[start : start + limit], "TotalRecordCount": len(items)}
+        )
+
+    async def _update_policy(self, request):
+        data = await request.json()
+        user = self.users.get(request.match_info["id"])
+        if user is None:
+            return web.Response(status=404)
+        user["Policy"].update(data)
+        return web.Response(status=204)
+
+    async def _delete_user(self, request):
+        if self.users.pop(request.match_info["id"], None) is None:
+            return web.Response(status=404)
+        return web.Response(status=204)
+
+    async def _empty(self, request):
+        return web.Response(status=204)
+
+    async def _counts(self, request):
+        return web.json_response(
+            {"MovieCount": 12000, "SeriesCount": 3000, "EpisodeCount": 150000}
+        )
+
+    async def _all_routes(self, request):
+        return web.json_response(self.routes)
+
+    async def _user_route(self, request):
+        index = self.user_routes.get(request.match_info["id"], "1")
+        return web.json_response({"index": index})
+
+    async def _update_route(self, request):
+        self.user_routes[request.match_info["id"]] = request.match_info["index"]
+        return web.json_response({"success": True})
+
+
+class FakeTelegramClient:
+    """pyrogram Client 的替身：记录发出的消息，可模拟 Telegram 的 RPC 延迟"""
+
+    def __init__(self, latency_ms: float = 0):
+        self.latency = latency_ms / 1000
+        self._ids = itertools.count(1)
+        self.sent = 0
+        self.deleted = 0
+        self.last_text: dict[int, str] = {}
+
+    async def _rpc(self):
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        await self._rpc()
+        self.sent += 1
+        self.last_text[chat_id] = text
+        return types.Message(
+            client=self,
+            id=next(self._ids),
+            chat=types.Chat(id=chat_id, type=enums.ChatType.PRIVATE),
+            text=text,
+        )
+
+    async def edit_message_text(self, chat_id: int, message_id: int, text: str, **kw):
+        await self._rpc()
+        self.last_text[chat_id] = text
+        return True
+
+    async def answer_callback_query(self, callback_query_id: str, **kwargs):
+        await self._rpc()
+        return True
+
+    async def delete_messages(self, chat_id: int, message_ids, **kwargs):
+        await self._rpc()
+        self.deleted += len(message_ids) if isinstance(message_ids, list) else 1
+        return True
+
+    async def get_users(self, username):
+        raise NotImplementedError("基准测试不解析 @username")
+
+
+def make_user(telegram_id: int) -> types.User:
+    return types.User(id=telegram_id, first_name=f"bench{telegram_id}")
+
+
+def make_message(
+    client: FakeTelegramClient,
+    from_id: int,
+    text: str = None,
+    chat_id: int = None,
+    reply_to_id: int = None,
+    left_member_id: int = None,
+) -> types.Message:
+    """构造一条合成消息；chat_id 为空时视为与 Bot 的私聊"""
+    chat_id = from_id if chat_id is None else chat_id
+    chat_type = enums.ChatType.PRIVATE if chat_id > 0 else enums.ChatType.SUPERGROUP
+    chat = types.Chat(id=chat_id, type=chat_type)
+    reply_to = None
+    if reply_to_id is not None:
+        reply_to = types.Message(
+            client=client,
+            id=next(client._ids),
+            from_user=make_user(reply_to_id),
+            chat=chat,
+            text="hi",
+        )
+    return types.Message(
+        client=client,
+        id=next(client._ids),
+        from_user=make_user(from_id),
+        chat=chat,
+        text=text,
+        reply_to_message=reply_to,
+        left_chat_member=(
+            make_user(left_member_id) if left_member_id is not None else None
+        ),
+        date=datetime.now(),
+    )
+
+
+def make_callback(
+    client: FakeTelegramClient, from_id: int, data: str
+) -> types.CallbackQuery:
+    message = make_message(client, from_id, "当前线路")
+    return types.CallbackQuery(
+        client=client,
+        id=str(next(client._ids)),
+        from_user=make_user(from_id),
+        chat_instance="bench",
+        message=message,
+        data=data,
+    )
@@ -1,6 +1,13 @@
+import asyncio
 import logging
+from typing import Optional
 
 from pyrogram import Client, idle
+from pyrogram.types import Message
+
+from utils import tracing
+
+from .outbox import PRIORITY_USER, OutboundQueue
 
 logger = logging.getLogger(__name__)
 
@@ -12,21 +19,84 @@ class BotClient:
         api_hash: str,
         bot_token: str,
         name="emby_bot",
+        send_rate: float = 25,
+        chat_interval: float = 1.0,
+        group_interval: float = 3.0,
     ):
         self.client = Client(
             name=name, api_id=api_id, api_hash=api_hash, bot_token=bot_token
         )
+        self.outbox = OutboundQueue(
+            global_rate=send_rate,
+            chat_interval=chat_interval,
+            group_interval=group_interval,
+        )
         logger.info(f"Bot client initialized with name: {name}")
 
+    async def _get_chat_members(self, group_id: int) -> dict[int, Optional[str]]:
+        members = {}
+        async for member in self.client.get_chat_members(int(group_id)):
+            members[member.user.id] = member.user.username
+        logger.debug(f"Fetched {len(members)} members for group ID: {group_id}")
+        return members
+
     async def get_group_members(self, group_ids: list[int]):
+        """
+        并发获取各群组成员，获取失败的群组会被跳过。
+        :return: group_id -> {telegram_id: username}
+        """
+        results = await asyncio.gather(
+            *(self._get_chat_members(group_id) for group_id in group_ids),
+            return_exceptions=True,
+        )
         members = {}
-        for group_id in group_ids:
-            members[group_id] = {}
-            async for member in self.client.get_chat_members(int(group_id)):
-                members[group_id][member.user.id] = member.user
-        logger.debug(f"Fetched members for group ID: {group_id}")
+        for group_id, result in zip(group_ids, results, strict=True):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to fetch members for group {group_id}: {result}")
+                continue
+            members[group_id] = result
         return members
 
+    async def send_message(
+        self, chat_id: int, text: str, priority: int = PRIORITY_USER, **kwargs
+    ):
+        """经由出站队列发送消息，受速率限制并自动处理 FloodWait。"""
+        with tracing.span("send"):
+            return await self.outbox.submit(
+                chat_id,
+                lambda: self.client.send_message(chat_id=chat_id, text=text, **kwargs),
+                priority,
+            )
+
+    async def reply(
+        self, message: Message, text: str, priority: int = PRIORITY_USER, **kwargs
+    ):
+        """经由出站队列回复消息。"""
+        with tracing.span("reply"):
+            return await self.outbox.submit(
+                message.chat.id,
+                lambda: message.reply(text, **kwargs),
+                priority,
+            )
+
+    async def edit_message_text(
+        self,
+        chat_id: int,
+        message_id: int,
+        text: str,
+        priority: int = PRIORITY_USER,
+        **kwargs,
+    ):
+        """经由出站队列编辑已发送的消息。"""
+        with tracing.span("edit"):
+            return await self.outbox.submit(
+                chat_id,
+                lambda: self.client.edit_message_text(
+                    chat_id=chat_id, message_id=message_id, text=text, **kwargs
+                ),
+                priority,
+            )
+
     async def start(self):
         logger.info("Starting bot client")
         return await self.client.start()
@@ -36,6 +106,7 @@ class BotClient:
         logger.info("Bot client is now idle")
         return await idle()
 
-    def stop(self):
+    async def stop(self):
         logger.info("Stopping bot client")
-        return self.client.stop()
+        await self.outbox.stop()
+        return await self.client.stop()
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Optional
+
+from pyrogram.errors import FloodWait, MessageDeleteForbidden, MessageIdInvalid
+
+from models.invite_code_model import InviteCodeMessageRepository
+
+logger = logging.getLogger(__name__)
+
+# delete_messages 单次最多删除的消息数
+DELETE_BATCH_SIZE = 100
+
+
+class CodeMessageCleaner:
+    """
+    邀请码消息清理：发送邀请码的消息记录在数据库中，
+    邀请码被使用后标记为待删除，由后台任务按会话批量调用 delete_messages。
+    记录超过有效期后直接清理（Bot 无法删除 48 小时前的消息）。
+    """
+
+    def __init__(self, client, ttl: int = 172800, flush_interval: int = 5):
+        """
+        :param client: pyrogram Client
+        :param ttl: 消息记录的有效期（秒）
+        :param flush_interval: 批量删除消息的间隔（秒）
+        """
+        self.client = client
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.deleted = 0
+
+    async def record(self, rows: list[tuple[str, int, int]]):
+        """
+        记录发送邀请码的消息。
+        :param rows: (code, chat_id, message_id) 列表
+        """
+        expire_at = int(datetime.now().timestamp()) + self.ttl
+        await InviteCodeMessageRepository.bulk_save(rows, expire_at)
+
+    async def mark_used(self, code: str):
+        """邀请码已使用，其消息将在下一次批量删除时移除"""
+        now = int(datetime.now().timestamp())
+        if await InviteCodeMessageRepository.mark_pending(code, now):
+            self._wakeup.set()
+
+    async def flush(self) -> Optional[int]:
+        """
+        删除所有待删除的消息，并清理过期记录。
+        :return: 遇到临时错误（FloodWait、网络等）时，建议的重试等待秒数；
+            相应记录保留到下一次删除
+        """
+        now = int(datetime.now().timestamp())
+        retry_after: Optional[int] = None
+        while retry_after is None:
+            rows = await InviteCodeMessageRepository.get_pending(now, 1000)
+            if not rows:
+                break
+            by_chat: dict[int, list[tuple[int, int]]] = defaultdict(list)
+            for row_id, chat_id, message_id in rows:
+                by_chat[chat_id].append((row_id, message_id))
+
+            done: list[int] = []
+            for chat_id, items in by_chat.items():
+                for i in range(0, len(items), DELETE_BATCH_SIZE):
+                    batch = items[i : i + DELETE_BATCH_SIZE]
+                    try:
+                        await self.client.delete_messages(
+                            chat_id, [message_id for _, message_id in batch]
+                        )
+                        self.deleted += len(batch)
+                    except (MessageDeleteForbidden, MessageIdInvalid) as e:
+                        # 消息已被手动删除或无法删除，记录同样清理掉
+                        logger.warning(f"删除会话 {chat_id} 的邀请码消息失败: {e}")
+                    except FloodWait as e:
+                        logger.warning(f"删除邀请码消息触发限流，{e.value} 秒后重试")
+                        retry_after = e.value
+                        break
+                    except Exception as e:
+                        logger.warning(
+                            f"删除会话 {chat_id} 的邀请码消息失败，稍后重试: {e}"
+                        )
+                        retry_after = self.flush_interval
+                        break
+                    done.extend(row_id for row_id, _ in batch)
+                if retry_after is not None:
+                    break
+            await InviteCodeMessageRepository.delete_by_ids(done)
+            if len(rows) < 1000:
+                break
+
+        expired = await InviteCodeMessageRepository.delete_expired(now)
+        if expired:
+            logger.debug(f"Removed {expired} expired invite code messages")
+        return retry_after
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _flush_loop(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                retry_after = await self.flush()
+            except Exception as e:
+                logger.error(f"清理邀请码消息失败: {e}", exc_info=True)
+                retry_after = None
+            if retry_after is not None:
+                # 删除遇到临时错误，等待后重试保留下来的记录
+                await asyncio.sleep(retry_after)
+                continue
+            try:
+                # 没有新的待删除消息时，每小时清理一次过期记录
+                await asyncio.wait_for(self._wakeup.wait(), 3600)
+            except asyncio.TimeoutError:
+                continue
+            # 稍等片刻，合并同一时间段内的多次使用
+            await asyncio.sleep(self.flush_interval)
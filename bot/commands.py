@@ -1,6 +1,9 @@
+import asyncio
+import html
 import logging
 import functools
 from datetime import datetime
+from typing import Optional
 
 from pyrogram import filters
 from pyrogram.enums import ParseMode
@@ -12,36 +15,76 @@ from pyrogram.types import (
 )
 
 from bot.bot_client import BotClient
+from bot.code_messages import CodeMessageCleaner
 from bot.filters import (
     user_in_group_on_filter,
     admin_user_on_filter,
     emby_user_on_filter,
 )
+from bot.membership import group_membership
+from bot.outbox import PRIORITY_ADMIN, PRIORITY_BULK, PRIORITY_USER, pack_lines
 from bot.message_helper import get_user_telegram_id
-from bot.utils import parse_iso8601_to_normal_date
+from bot.username_resolver import username_resolver
+from bot.utils import parse_iso8601_to_normal_date, parse_timestamp_to_normal_date
 from config import config
+from models.group_member_model import GroupMemberRepository
 from models.invite_code_model import InviteCodeType
-from services import UserService
+from services import (
+    BanQueue,
+    LibraryStats,
+    ReconcileService,
+    RegisterQueue,
+    UserService,
+)
 from services.user_service import NotBoundError
+from utils import tracing
+from utils.circuit_breaker import CircuitOpenError
+from utils.metrics import defer_command_result, instrumented, mark_command_failed
 
 logger = logging.getLogger(__name__)
 
+# 不超过该数量的邀请码逐条发送，超出后合并发送
+SINGLE_CODE_MESSAGE_LIMIT = 20
+
 
 class CommandHandler:
-    def __init__(self, bot_client: BotClient, user_service: UserService):
+    def __init__(
+        self,
+        bot_client: BotClient,
+        user_service: UserService,
+        reconcile_service: ReconcileService,
+        ban_queue: BanQueue,
+        register_queue: RegisterQueue,
+        code_messages: CodeMessageCleaner,
+        library_stats: LibraryStats,
+    ):
         self.bot_client = bot_client
         self.user_service = user_service
-        self.code_to_message_id = {}
+        self.reconcile_service = reconcile_service
+        self.ban_queue = ban_queue
+        self.register_queue = register_queue
+        self.code_messages = code_messages
+        self.library_stats = library_stats
         logger.info("CommandHandler initialized")
 
     # =============== 辅助方法 ===============
 
-    @staticmethod
-    async def _reply_html(message: Message, text: str, **kwargs):
+    async def _reply_html(
+        self, message: Message, text: str, priority: Optional[int] = None, **kwargs
+    ):
         """
-        统一回复方法，使用 HTML parse_mode。
+        统一回复方法，使用 HTML parse_mode，经由出站队列发送。
+        未指定优先级时，管理员的回复优先于普通用户。
         """
-        return await message.reply(text, parse_mode=ParseMode.HTML, **kwargs)
+        if priority is None:
+            is_admin = (
+                message.from_user is not None
+                and message.from_user.id in config.admin_list
+            )
+            priority = PRIORITY_ADMIN if is_admin else PRIORITY_USER
+        return await self.bot_client.reply(
+            message, text, priority=priority, parse_mode=ParseMode.HTML, **kwargs
+        )
 
     @staticmethod
     def _parse_args(message: Message) -> list[str]:
@@ -81,11 +124,84 @@ class CommandHandler:
         """
         统一的异常捕获后回复方式。
         """
-        logger.error(f"{prefix}：{error}", exc_info=True)
+        if isinstance(error, CircuitOpenError):
+            # 熔断期间的快速失败是预期行为，不输出堆栈
+            logger.warning(f"{prefix}：{error}")
+        else:
+            logger.error(f"{prefix}：{error}", exc_info=True)
+        mark_command_failed()
         await self._reply_html(message, f"{prefix}：{error}")
 
+    async def _report_code_shortfall(
+        self, message: Message, created: int, requested: int, title: str
+    ):
+        """邀请码冲突重试后仍未生成足够数量时，告知管理员实际生成的数量"""
+        if created < requested:
+            await self._reply_html(
+                message,
+                f"⚠️ 请求生成 {requested} 个{title}，实际仅生成 {created} 个，"
+                f"请重新生成剩余的 {requested - created} 个",
+            )
+
+    async def _send_codes(self, message: Message, code_list: list, title: str):
+        """
+        发送生成的邀请码。少量邀请码逐条发送（便于使用后删除对应消息），
+        大批量或转发给他人时合并为尽量少的消息。
+        所有消息以批量优先级进入出站队列，不阻塞其他回复。
+        """
+        if message.reply_to_message is not None:
+            chat_ids = [message.from_user.id, message.reply_to_message.from_user.id]
+        else:
+            chat_ids = []
+
+        if chat_ids or len(code_list) > SINGLE_CODE_MESSAGE_LIMIT:
+            texts = pack_lines(
+                [f"<code>{code_obj.code}</code>" for code_obj in code_list],
+                header=f"📌 {title}（共 {len(code_list)} 个）：",
+            )
+            if chat_ids:
+                await asyncio.gather(
+                    *(
+                        self.bot_client.send_message(
+                            chat_id,
+                            text,
+                            priority=PRIORITY_BULK,
+                            parse_mode=ParseMode.HTML,
+                        )
+                        for chat_id in chat_ids
+                        for text in texts
+                    )
+                )
+                await self._reply_html(message, "✅ 已发送邀请码")
+            else:
+                await asyncio.gather(
+                    *(
+                        self._reply_html(message, text, priority=PRIORITY_BULK)
+                        for text in texts
+                    )
+                )
+            return
+
+        messages = await asyncio.gather(
+            *(
+                self._reply_html(
+                    message,
+                    f"📌 {title}：\n点击复制👉<code>{code_obj.code}</code>",
+                    priority=PRIORITY_BULK,
+                )
+                for code_obj in code_list
+            )
+        )
+        await self.code_messages.record(
+            [
+                (code_obj.code, message.chat.id, msg.id)
+                for code_obj, msg in zip(code_list, messages, strict=True)
+            ]
+        )
+
     # =============== 各类命令逻辑 ===============
 
+    @instrumented
     @ensure_args(1, "/create <用户名>")
     async def create_user(self, message: Message, args: list[str]):
         """
@@ -93,21 +209,51 @@ class CommandHandler:
         """
 
         emby_name = args[0]
+        default_password = self.user_service.gen_default_passwd()
+        # 排队提示消息发出后才能编辑，创建结果需等待它
+        notice = asyncio.get_running_loop().create_future()
+
+        async def on_done(user, error):
+            sent = await notice
+            succeeded = error is None and user and user.has_emby_account()
+            record_result(not succeeded)
+            if error is not None:
+                logger.warning(f"创建用户失败：{error}")
+                text = f"创建用户失败：{error}"
+            elif succeeded:
+                text = f"✅ 创建用户成功。\n初始密码：<code>{default_password}</code>"
+            else:
+                text = "❌ 创建用户失败，请稍后重试。"
+            if sent is None:
+                await self._reply_html(message, text)
+            else:
+                await self.bot_client.edit_message_text(
+                    sent.chat.id, sent.id, text, parse_mode=ParseMode.HTML
+                )
+
         try:
-            default_password = self.user_service.gen_default_passwd()
-            user = await self.user_service.emby_create_user(
-                message.from_user.id, emby_name, default_password
+            position = await self.register_queue.submit(
+                message.from_user.id, emby_name, default_password, on_done
             )
-            if user and user.has_emby_account():
-                await self._reply_html(
+        except Exception as e:
+            notice.set_result(None)
+            return await self._send_error(message, e, prefix="创建用户失败")
+        # 创建在注册队列中完成，命令结果在 on_done 中记录
+        record_result = defer_command_result()
+
+        # 需要等待时先告知排队位置，创建完成后编辑这条消息
+        sent = None
+        try:
+            if position > 0:
+                sent = await self._reply_html(
                     message,
-                    f"✅ 创建用户成功。\n初始密码：<code>{default_password}</code>",
+                    f"⏳ 注册排队中，您当前排在第 <code>{position}</code> 位，"
+                    f"账号创建完成后将更新此消息。",
                 )
-            else:
-                await self._reply_html(message, "❌ 创建用户失败，请稍后重试。")
-        except Exception as e:
-            await self._send_error(message, e, prefix="创建用户失败")
+        finally:
+            notice.set_result(sent)
 
+    @instrumented
     async def info(self, message: Message):
         """
         /info
@@ -117,13 +263,11 @@ class CommandHandler:
         try:
             user, emby_info = await self.user_service.emby_info(telegram_id)
             last_active = (
-                parse_iso8601_to_normal_date(emby_info.get("LastActivityDate"))
-                if emby_info.get("LastActivityDate")
+                parse_iso8601_to_normal_date(emby_info.last_activity_date)
+                if emby_info.last_activity_date
                 else "无"
             )
-            date_created = parse_iso8601_to_normal_date(
-                emby_info.get("DateCreated", "")
-            )
+            date_created = parse_iso8601_to_normal_date(emby_info.date_created or "")
             ban_status = (
                 "正常" if (user.ban_time is None or user.ban_time == 0) else "已禁用"
             )
@@ -154,6 +298,7 @@ class CommandHandler:
             await self._send_error(message, e, prefix="查询失败")
             return
 
+    @instrumented
     @ensure_args(1, "/use_code <邀请码>")
     async def use_code(self, message: Message, args: list[str]):
         """
@@ -174,16 +319,12 @@ class CommandHandler:
             else:
                 await self._reply_html(message, "✅ 邀请码使用成功，您已获得白名单资格")
 
-            # 如果该邀请码在bot中记录了消息，需要删除
-            if self.code_to_message_id.get(code):
-                code_to_message_id = self.code_to_message_id[code]
-                await self.bot_client.client.delete_messages(
-                    code_to_message_id[0], code_to_message_id[1]
-                )
-                del self.code_to_message_id[code]
+            # 如果该邀请码在bot中记录了消息，稍后批量删除
+            await self.code_messages.mark_used(code)
         except Exception as e:
             await self._send_error(message, e, prefix="邀请码使用失败")
 
+    @instrumented
     async def reset_emby_password(self, message: Message):
         """
         /reset_emby_password
@@ -202,6 +343,7 @@ class CommandHandler:
         except Exception as e:
             await self._send_error(message, e, prefix="密码重置失败")
 
+    @instrumented
     async def new_code(self, message: Message):
         """
         /new_code [数量]
@@ -216,31 +358,17 @@ class CommandHandler:
                     message, "❌ 请输入有效数量 /new_code [整数]"
                 )
 
-        num = min(num, 20)
+        num = min(num, config.invite_code_max_batch)
         try:
             code_list = await self.user_service.create_invite_code(
                 message.from_user.id, num
             )
-            for code_obj in code_list:
-                message_text = f"📌 邀请码：\n点击复制👉<code>{code_obj.code}</code>"
-                if message.reply_to_message is not None:
-                    await self.bot_client.client.send_message(
-                        chat_id=message.from_user.id,
-                        text=message_text,
-                        parse_mode=ParseMode.HTML,
-                    )
-                    await self.bot_client.client.send_message(
-                        chat_id=message.reply_to_message.from_user.id,
-                        text=message_text,
-                        parse_mode=ParseMode.HTML,
-                    )
-                    await self._reply_html(message, "✅ 已发送邀请码")
-                else:
-                    msg = await self._reply_html(message, message_text)
-                    self.code_to_message_id[code_obj.code] = (message.chat.id, msg.id)
+            await self._send_codes(message, code_list, "邀请码")
+            await self._report_code_shortfall(message, len(code_list), num, "邀请码")
         except Exception as e:
             await self._send_error(message, e, prefix="创建邀请码失败")
 
+    @instrumented
     async def new_whitelist_code(self, message: Message):
         """
         /new_whitelist_code [数量]
@@ -255,33 +383,19 @@ class CommandHandler:
                     message, "❌ 请输入有效数量 /new_whitelist_code [整数]"
                 )
 
-        num = min(num, 20)
+        num = min(num, config.invite_code_max_batch)
         try:
             code_list = await self.user_service.create_whitelist_code(
                 message.from_user.id, num
             )
-            for code_obj in code_list:
-                message_text = (
-                    f"📌 白名单邀请码：\n点击复制👉<code>{code_obj.code}</code>"
-                )
-                if message.reply_to_message is not None:
-                    await self.bot_client.client.send_message(
-                        chat_id=message.from_user.id,
-                        text=message_text,
-                        parse_mode=ParseMode.HTML,
-                    )
-                    await self.bot_client.client.send_message(
-                        chat_id=message.reply_to_message.from_user.id,
-                        text=message_text,
-                        parse_mode=ParseMode.HTML,
-                    )
-                    await self._reply_html(message, "✅ 已发送邀请码")
-                else:
-                    msg = await self._reply_html(message, message_text)
-                    self.code_to_message_id[code_obj.code] = (message.chat.id, msg.id)
+            await self._send_codes(message, code_list, "白名单邀请码")
+            await self._report_code_shortfall(
+                message, len(code_list), num, "白名单邀请码"
+            )
         except Exception as e:
             await self._send_error(message, e, prefix="创建白名单邀请码失败")
 
+    @instrumented
     async def ban_emby(self, message: Message):
         """
         /ban_emby [原因] (群里需回复某人或手动指定)
@@ -301,6 +415,7 @@ class CommandHandler:
         except Exception as e:
             await self._send_error(message, e, prefix="禁用失败")
 
+    @instrumented
     async def unban_emby(self, message: Message):
         """
         /unban_emby (群里需回复某人或手动指定)
@@ -317,6 +432,7 @@ class CommandHandler:
         except Exception as e:
             await self._send_error(message, e, prefix="解禁失败")
 
+    @instrumented
     async def select_line(self, message: Message):
         """
         /select_line
@@ -356,26 +472,45 @@ class CommandHandler:
         except Exception as e:
             await self._send_error(message, e, prefix="查询失败")
 
+    @instrumented
     async def group_member_change_handler(self, clent, message: Message):
         """
         群组成员变动处理器。
         """
-        if message.left_chat_member:
-            left_member_id = message.left_chat_member.id
-            left_member = await self.user_service.must_get_user(left_member_id)
-            if (
-                left_member.has_emby_account()
-                and not left_member.is_emby_baned()
-                and not left_member.is_whitelist
-            ):
-                await self.user_service.emby_ban(
-                    message.left_chat_member.id, "用户已退出群组"
+        if message.chat.id in config.telegram_group_ids:
+            if message.left_chat_member:
+                group_membership.remove(message.chat.id, message.left_chat_member.id)
+                await GroupMemberRepository.remove(
+                    message.chat.id, message.left_chat_member.id
+                )
+            for new_member in message.new_chat_members or []:
+                group_membership.add(
+                    message.chat.id, new_member.id, new_member.username
                 )
-            config.group_members.pop(message.left_chat_member.id, None)
-        if message.new_chat_members:
-            for new_member in message.new_chat_members:
-                config.group_members[new_member.id] = new_member
+                await GroupMemberRepository.add(
+                    message.chat.id, new_member.id, new_member.username
+                )
+                # 重新加入退出的群组，取消尚未执行的禁用任务
+                await self.ban_queue.cancel(new_member.id, message.chat.id)
 
+        if message.left_chat_member:
+            # 禁用交给后台队列执行，事件处理器立即返回
+            await self.ban_queue.enqueue(
+                message.left_chat_member.id, "用户已退出群组", message.chat.id
+            )
+
+    def observe_users(self, message: Message):
+        """
+        记录消息中出现的用户名，用于本地解析 @username。
+        """
+        username_resolver.observe(message.from_user)
+        if message.reply_to_message:
+            username_resolver.observe(message.reply_to_message.from_user)
+        username_resolver.observe(message.left_chat_member)
+        for new_member in message.new_chat_members or []:
+            username_resolver.observe(new_member)
+
+    @instrumented
     async def handle_callback_query(self, client, callback_query: CallbackQuery):
         """
         回调按钮事件统一处理，如切换线路。
@@ -407,27 +542,38 @@ class CommandHandler:
                 await callback_query.answer(f"操作失败：{str(e)}", show_alert=True)
                 logger.error(f"Callback query failed: {e}", exc_info=True)
 
+    @instrumented
     async def count(self, message: Message):
         """
         /count
         查询服务器内片子数量
         """
         try:
-            count_data = self.user_service.emby_count()
+            snapshot = await self.library_stats.get()
+            count_data = snapshot.counts
             if not count_data:
                 return await self._reply_html(message, "❌ 查询失败：无法获取数据")
 
-            await self._reply_html(
-                message,
-                (
-                    f"🎬 电影数量：<code>{count_data.get('MovieCount', 0)}</code>\n"
-                    f"📽️ 剧集数量：<code>{count_data.get('SeriesCount', 0)}</code>\n"
-                    f"🎞️ 总集数：<code>{count_data.get('EpisodeCount', 0)}</code>\n"
-                ),
+            message_text = (
+                f"🎬 电影数量：<code>{count_data.get('MovieCount', 0)}</code>\n"
+                f"📽️ 剧集数量：<code>{count_data.get('SeriesCount', 0)}</code>\n"
+                f"🎞️ 总集数：<code>{count_data.get('EpisodeCount', 0)}</code>\n"
             )
+            if snapshot.libraries:
+                message_text += "\n📚 各媒体库：\n"
+                for library in snapshot.libraries:
+                    message_text += (
+                        f"• {html.escape(library.name)}：电影 <code>{library.movies}</code> / "
+                        f"剧集 <code>{library.series}</code> / "
+                        f"集数 <code>{library.episodes}</code>\n"
+                    )
+            taken_at = parse_timestamp_to_normal_date(snapshot.taken_at)
+            message_text += f"\n🕒 统计时间：{taken_at}"
+            await self._reply_html(message, message_text)
         except Exception as e:
             await self._send_error(message, e, prefix="查询失败")
 
+    @instrumented
     @ensure_args(2, "/register_until 2023-10-01 12:00:00")
     async def register_until(self, message: Message, args: list[str]):
         """
@@ -451,6 +597,7 @@ class CommandHandler:
         except Exception as e:
             await self._send_error(message, e, prefix="开放注册失败")
 
+    @instrumented
     @ensure_args(1, "/register_amount <人数>")
     async def register_amount(self, message: Message, args: list[str]):
         """
@@ -469,6 +616,71 @@ class CommandHandler:
         except Exception as e:
             await self._send_error(message, e, prefix="开放注册失败")
 
+    @instrumented
+    async def reconcile(self, message: Message):
+        """
+        /reconcile [fix]
+        对账数据库与 Emby 用户状态，带 fix 参数时自动修复禁用状态不一致的账号
+        """
+        args = self._parse_args(message)
+        fix = bool(args) and args[0].lower() == "fix"
+        await self._reply_html(message, "⏳ 正在对账，请稍候……")
+        try:
+            report = await self.reconcile_service.run(fix=fix)
+            status = "⚠️ 发现不一致" if report.has_mismatch() else "✅ 数据一致"
+            await self._reply_html(message, f"{status}\n{report.summary()}")
+        except Exception as e:
+            await self._send_error(message, e, prefix="对账失败")
+
+    @instrumented
+    async def ban_queue_status(self, message: Message):
+        """
+        /ban_queue
+        查看退群禁用队列状态
+        """
+        try:
+            depth = await self.ban_queue.depth()
+            await self._reply_html(
+                message,
+                (
+                    f"📋 禁用队列：\n"
+                    f"• 待执行：<code>{depth['pending']}</code>\n"
+                    f"• 执行中：<code>{depth['inflight']}</code>\n"
+                    f"• 已失败：<code>{depth['failed']}</code>\n"
+                    f"• 本次运行已处理：<code>{self.ban_queue.processed}</code>\n"
+                ),
+            )
+        except Exception as e:
+            await self._send_error(message, e, prefix="查询失败")
+
+    @instrumented
+    async def emby_backends(self, message: Message):
+        """
+        /emby_backends
+        查看各 Emby 后端的账号数、容量与熔断状态
+        """
+        try:
+            lines = [
+                f"🖥 Emby 后端负载（放置策略：{self.user_service.emby_pool.placement}）："
+            ]
+            for item in await self.user_service.backend_load():
+                capacity = item["capacity"]
+                usage = (
+                    f"{item['users']} / {capacity}（{item['users'] / capacity:.0%}）"
+                    if capacity
+                    else f"{item['users']} / 不限"
+                )
+                line = f"• {item['name']}：<code>{usage}</code>"
+                if item["reserved"]:
+                    line += f"，创建中 <code>{item['reserved']}</code>"
+                if item["open_endpoints"]:
+                    line += f"\n  ⚠️ 熔断中：{', '.join(item['open_endpoints'])}"
+                lines.append(line)
+            await self._reply_html(message, "\n".join(lines))
+        except Exception as e:
+            await self._send_error(message, e, prefix="查询失败")
+
+    @instrumented
     async def help_command(self, message: Message):
         """
         /help 或 /start
@@ -494,11 +706,29 @@ class CommandHandler:
                 "/info (群里回复某人) - 查看他人信息\n"
                 "/ban_emby [原因] - 禁用某用户的Emby账号\n"
                 "/unban_emby - 解禁某用户的Emby账号\n"
+                "/reconcile [fix] - 对账数据库与 Emby 用户状态\n"
+                "/ban_queue - 查看退群禁用队列状态\n"
+                "/emby_backends - 查看各 Emby 后端负载\n"
             )
         await self._reply_html(message, help_message)
 
     # =============== 命令挂载 ===============
     def setup_commands(self):
+        # 在命令处理之前的分组中开始追踪并记录用户名，不影响后续处理器
+        @self.bot_client.client.on_message(group=-1)
+        async def observe_message_users(client, message):
+            tracing.begin(
+                "message",
+                message.from_user.id if message.from_user else None,
+                message.chat.id if message.chat else None,
+            )
+            self.observe_users(message)
+
+        @self.bot_client.client.on_callback_query(group=-1)
+        async def observe_callback_users(client, callback_query):
+            tracing.begin("callback_query", callback_query.from_user.id)
+            username_resolver.observe(callback_query.from_user)
+
         @self.bot_client.client.on_message(
             filters.private & filters.command(["help", "start"])
         )
@@ -506,25 +736,25 @@ class CommandHandler:
             await self.help_command(message)
 
         @self.bot_client.client.on_message(
-            filters.command("count") & user_in_group_on_filter()
+            filters.command("count") & user_in_group_on_filter(self.bot_client)
         )
         async def c_count(client, message):
             await self.count(message)
 
         @self.bot_client.client.on_message(
-            filters.command("info") & user_in_group_on_filter()
+            filters.command("info") & user_in_group_on_filter(self.bot_client)
         )
         async def c_info(client, message):
             await self.info(message)
 
         @self.bot_client.client.on_message(
-            filters.private & filters.command("use_code") & user_in_group_on_filter()
+            filters.private & filters.command("use_code") & user_in_group_on_filter(self.bot_client)
         )
         async def c_use_code(client, message):
             await self.use_code(message)
 
         @self.bot_client.client.on_message(
-            filters.private & filters.command("create") & user_in_group_on_filter()
+            filters.private & filters.command("create") & user_in_group_on_filter(self.bot_client)
         )
         async def c_create_user(client, message):
             await self.create_user(message)
@@ -532,7 +762,7 @@ class CommandHandler:
         @self.bot_client.client.on_message(
             filters.private
             & filters.command("reset_emby_password")
-            & user_in_group_on_filter()
+            & user_in_group_on_filter(self.bot_client)
             & emby_user_on_filter
         )
         async def c_reset_emby_password(client, message):
@@ -541,7 +771,7 @@ class CommandHandler:
         @self.bot_client.client.on_message(
             filters.private
             & filters.command("select_line")
-            & user_in_group_on_filter()
+            & user_in_group_on_filter(self.bot_client)
             & emby_user_on_filter
         )
         async def c_select_line(client, message):
@@ -583,6 +813,24 @@ class CommandHandler:
         async def c_register_amount(client, message):
             await self.register_amount(message)
 
+        @self.bot_client.client.on_message(
+            filters.private & filters.command("reconcile") & admin_user_on_filter
+        )
+        async def c_reconcile(client, message):
+            await self.reconcile(message)
+
+        @self.bot_client.client.on_message(
+            filters.command("ban_queue") & admin_user_on_filter
+        )
+        async def c_ban_queue(client, message):
+            await self.ban_queue_status(message)
+
+        @self.bot_client.client.on_message(
+            filters.command("emby_backends") & admin_user_on_filter
+        )
+        async def c_emby_backends(client, message):
+            await self.emby_backends(message)
+
         @self.bot_client.client.on_callback_query()
         async def c_select_line_cb(client, callback_query):
             await self.handle_callback_query(client, callback_query)
@@ -1,41 +1,63 @@
+import functools
 import logging
+import time
 
 from pyrogram.filters import create
 
-from config import config
+from bot.bot_client import BotClient
+from bot.membership import group_membership
+from bot.outbox import PRIORITY_USER
 from services import UserService
+from utils import tracing
+from utils.metrics import FILTER_LATENCY, FILTERS
 
 logger = logging.getLogger(__name__)
 
 
+def _observed(name: str):
+    """装饰器：记录过滤器的耗时与通过 / 拒绝次数"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = "error"
+            try:
+                with tracing.span(f"filter:{name}"):
+                    passed = await func(*args, **kwargs)
+                result = "pass" if passed else "reject"
+                return passed
+            finally:
+                FILTER_LATENCY.observe(time.perf_counter() - start, name)
+                FILTERS.inc(name, result)
+
+        return wrapper
+
+    return decorator
+
+
 async def check_group_membership(client, message) -> bool:
-    """检查用户是否在任一配置中的群聊中。"""
-    user_id = message.from_user.id
-    for group_id in config.telegram_group_ids:
-        try:
-            member = await client.get_chat_member(group_id, user_id)
-            if member and member.status:
-                logger.debug(f"用户 {user_id} 已加入群 {group_id}")
-                return True
-        except Exception as e:
-            logger.debug(f"查询用户 {user_id} 在群 {group_id} 的信息失败：{e}")
-            continue
-    return False
+    """检查用户是否在任一配置中的群聊中（优先查询成员索引）。"""
+    return await group_membership.is_member(client, message.from_user.id)
 
 
-def user_in_group_on_filter():
-    """自定义过滤器：判断用户是否在指定群组中；如果不在则回复提示。"""
+def user_in_group_on_filter(bot_client: BotClient):
+    """自定义过滤器：判断用户是否在指定群组中；如果不在则经由出站队列回复提示。"""
+    @_observed("user_in_group")
     async def custom_filter(flt, client, message):
         if await check_group_membership(client, message):
             return True
         try:
-            await message.reply("❌ 请先加入指定的群聊后再使用本命令。")
+            await bot_client.reply(
+                message, "❌ 请先加入指定的群聊后再使用本命令。", priority=PRIORITY_USER
+            )
         except Exception as exc:
             logger.error(f"回复提示消息失败：{exc}")
         return False
     return create(custom_filter)
 
 
+@_observed("admin_user")
 async def admin_user_on_filter(filter, client, update) -> bool:
     user = update.from_user or update.sender_chat
     telegram_id = user.id
@@ -52,6 +74,7 @@ async def admin_user_on_filter(filter, client, update) -> bool:
     return False
 
 
+@_observed("emby_user")
 async def emby_user_on_filter(filter, client, update) -> bool:
     user = update.from_user or update.sender_chat
     telegram_id = user.id
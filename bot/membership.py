@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from pyrogram.enums import ChatMemberStatus
+
+from config import config
+from core.member_registry import MemberRegistry, member_registry
+from utils import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# 这些状态表示用户已不在群内
+_NOT_MEMBER_STATUSES = (ChatMemberStatus.LEFT, ChatMemberStatus.BANNED)
+
+
+class GroupMembershipIndex:
+    """
+    群组成员索引：成员关系保存在 MemberRegistry 中，启动时批量加载，
+    随入群 / 退群事件实时更新。命令过滤器优先查询索引，
+    只有未命中或过期时才并发向 Telegram 查询。
+    """
+
+    def __init__(
+        self,
+        registry: MemberRegistry,
+        ttl: int = 3600,
+        negative_ttl: int = 60,
+        negative_cache_size: int = 10000,
+    ):
+        """
+        :param registry: 成员登记表
+        :param ttl: 成员记录的有效期（秒）
+        :param negative_ttl: “不在群内”记录的有效期（秒）
+        :param negative_cache_size: “不在群内”记录的最大条目数
+        """
+        self.registry = registry
+        self.group_ids = registry.group_ids
+        self.ttl = ttl
+        self._negative = TTLCache(maxsize=negative_cache_size, ttl=negative_ttl)
+
+    def seed(self, group_id: int, members: dict[int, Optional[str]]):
+        """
+        批量写入某个群组的成员（启动时加载）。
+        :param members: telegram_id -> username
+        """
+        for telegram_id, username in members.items():
+            self.registry.add(group_id, telegram_id, username)
+            self._negative.pop(telegram_id)
+        logger.debug(f"Seeded {len(members)} members for group {group_id}")
+
+    def replace_group(self, group_id: int, members: dict[int, Optional[str]]):
+        """用最新的完整成员列表替换某个群组的成员（后台追平时使用）。"""
+        self.registry.replace_group(group_id, members)
+        for telegram_id in members:
+            self._negative.pop(telegram_id)
+
+    def add(self, group_id: int, telegram_id: int, username: Optional[str] = None):
+        """记录用户加入群组。"""
+        self.registry.add(group_id, telegram_id, username)
+        self._negative.pop(telegram_id)
+
+    def remove(self, group_id: int, telegram_id: int):
+        """记录用户退出群组。"""
+        self.registry.remove(group_id, telegram_id)
+        if telegram_id not in self.registry:
+            self._negative.set(telegram_id, True)
+
+    def lookup(self, telegram_id: int) -> Optional[bool]:
+        """
+        仅查询索引。
+        :return: True / False 表示命中，None 表示未命中或已过期
+        """
+        record = self.registry.get(telegram_id)
+        if record is not None and time.monotonic() - record.last_seen < self.ttl:
+            return True
+        if telegram_id in self._negative:
+            return False
+        return None
+
+    def __len__(self) -> int:
+        return len(self.registry)
+
+    async def _fetch_group(self, client, group_id: int, telegram_id: int):
+        try:
+            member = await client.get_chat_member(group_id, telegram_id)
+        except Exception as e:
+            logger.debug(f"查询用户 {telegram_id} 在群 {group_id} 的信息失败：{e}")
+            return None
+        if member and member.status not in _NOT_MEMBER_STATUSES:
+            return member
+        return None
+
+    async def is_member(self, client, telegram_id: int) -> bool:
+        """判断用户是否在任一群组中，未命中时并发查询所有群组并回填索引。"""
+        cached = self.lookup(telegram_id)
+        if cached is not None:
+            return cached
+
+        results = await asyncio.gather(
+            *(
+                self._fetch_group(client, group_id, telegram_id)
+                for group_id in self.group_ids
+            )
+        )
+        joined = [
+            (group_id, member)
+            for group_id, member in zip(self.group_ids, results, strict=True)
+            if member is not None
+        ]
+        username = joined[0][1].user.username if joined else None
+        self.registry.set_groups(
+            telegram_id, [group_id for group_id, _ in joined], username
+        )
+        if not joined:
+            self._negative.set(telegram_id, True)
+        logger.debug(f"用户 {telegram_id} 所在群组：{[g for g, _ in joined]}")
+        return bool(joined)
+
+
+group_membership = GroupMembershipIndex(
+    member_registry,
+    ttl=config.group_member_ttl,
+    negative_ttl=config.group_member_negative_ttl,
+)
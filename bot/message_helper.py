@@ -2,6 +2,8 @@ import logging
 
 from pyrogram.errors import UsernameNotOccupied, PeerIdInvalid
 
+from .username_resolver import username_resolver
+
 logger = logging.getLogger(__name__)
 
 
@@ -34,8 +36,7 @@ async def get_user_telegram_id(client, message):
     # 通过用户名查找 ID
     if telegram_username:
         try:
-            user = await client.get_users(telegram_username)
-            telegram_id = user.id
+            telegram_id = await username_resolver.resolve(client, telegram_username)
             logger.debug(
                 f"Telegram ID resolved from username {telegram_username}: {telegram_id}"
             )
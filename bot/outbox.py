@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+from pyrogram.errors import FloodWait
+
+logger = logging.getLogger(__name__)
+
+# 优先级，数值越小越先发送
+PRIORITY_ADMIN = 0
+PRIORITY_USER = 1
+PRIORITY_BULK = 2
+
+# Telegram 单条消息的最大长度
+MESSAGE_MAX_LENGTH = 4096
+
+
+def pack_lines(
+    lines: list[str], header: str = "", limit: int = MESSAGE_MAX_LENGTH
+) -> list[str]:
+    """将多行文本在不超过 limit 的前提下尽量合并为更少的消息。"""
+    messages = []
+    current = header
+    for line in lines:
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit and current and current != header:
+            messages.append(current)
+            current = f"{header}\n{line}" if header else line
+        else:
+            current = candidate
+    if current and current != header:
+        messages.append(current)
+    return messages
+
+
+class _Outgoing:
+    __slots__ = ("chat_id", "priority", "send", "future")
+
+    def __init__(
+        self, chat_id: int, priority: int, send: Callable[[], Awaitable], future
+    ):
+        self.chat_id = chat_id
+        self.priority = priority
+        self.send = send
+        self.future = future
+
+
+class OutboundQueue:
+    """
+    出站消息队列：所有发送经由一个调度器，
+    同时遵守全局速率和单个会话的发送间隔，遇到 FloodWait 时整体暂停后重试。
+    高优先级（管理员回复）总是先于批量消息发送，同一会话内保持先后顺序。
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 25,
+        chat_interval: float = 1.0,
+        group_interval: float = 3.0,
+    ):
+        """
+        :param global_rate: 全局每秒最多发送的消息数
+        :param chat_interval: 私聊中两条消息的最小间隔（秒）
+        :param group_interval: 群组中两条消息的最小间隔（秒）
+        """
+        self.global_rate = global_rate
+        self.chat_interval = chat_interval
+        self.group_interval = group_interval
+        self._levels = (deque(), deque(), deque())
+        self._tokens = float(global_rate)
+        self._refilled_at = time.monotonic()
+        self._chat_ready: dict[int, float] = {}
+        self._busy: set[int] = set()
+        self._paused_until = 0.0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._sending: set[asyncio.Task] = set()
+        self.sent = 0
+        self.flood_waits = 0
+
+    def submit(
+        self,
+        chat_id: int,
+        send: Callable[[], Awaitable],
+        priority: int = PRIORITY_USER,
+    ) -> asyncio.Future:
+        """
+        提交一次发送，返回的 Future 在发送完成后得到 pyrogram 的返回值。
+        :param send: 无参协程函数，执行实际的 API 调用
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._levels[priority].append(_Outgoing(chat_id, priority, send, future))
+        self._ensure_started()
+        self._wakeup.set()
+        return future
+
+    def depth(self) -> dict:
+        """各优先级排队中的消息数"""
+        return {
+            "admin": len(self._levels[PRIORITY_ADMIN]),
+            "user": len(self._levels[PRIORITY_USER]),
+            "bulk": len(self._levels[PRIORITY_BULK]),
+            "sending": len(self._sending),
+        }
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._dispatch())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.gather(*self._sending, return_exceptions=True)
+        for level in self._levels:
+            while level:
+                level.popleft().future.cancel()
+
+    def _interval(self, chat_id: int) -> float:
+        # 群组 / 频道的 ID 为负数
+        return self.group_interval if chat_id < 0 else self.chat_interval
+
+    def _refill(self, now: float):
+        self._tokens = min(
+            self.global_rate,
+            self._tokens + (now - self._refilled_at) * self.global_rate,
+        )
+        self._refilled_at = now
+
+    def _take_next(self, now: float):
+        """
+        取出下一条可以发送的消息。
+        :return: (消息, 下次需要检查的时间)，没有可发送的消息时消息为 None
+        """
+        wake_at = None
+        blocked: set[int] = set()
+        for level in self._levels:
+            for index, item in enumerate(level):
+                chat_id = item.chat_id
+                if chat_id in blocked:
+                    continue
+                if item.future.cancelled():
+                    del level[index]
+                    return None, now
+                ready_at = self._chat_ready.get(chat_id, 0.0)
+                if chat_id in self._busy or ready_at > now:
+                    blocked.add(chat_id)
+                    if chat_id not in self._busy and (
+                        wake_at is None or ready_at < wake_at
+                    ):
+                        wake_at = ready_at
+                    continue
+                del level[index]
+                return item, None
+        return None, wake_at
+
+    async def _dispatch(self):
+        while True:
+            now = time.monotonic()
+            if self._paused_until > now:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+
+            self._refill(now)
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.global_rate)
+                continue
+
+            item, wake_at = self._take_next(now)
+            if item is None:
+                if wake_at == now:
+                    continue
+                self._wakeup.clear()
+                timeout = None if wake_at is None else max(wake_at - now, 0)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._tokens -= 1
+            self._busy.add(item.chat_id)
+            task = asyncio.create_task(self._send(item))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(self, item: _Outgoing):
+        try:
+            result = await item.send()
+        except FloodWait as e:
+            self.flood_waits += 1
+            wait = float(e.value or 1)
+            logger.warning(f"触发 FloodWait，暂停发送 {wait} 秒")
+            self._paused_until = max(self._paused_until, time.monotonic() + wait)
+            # 放回所在优先级的队首，恢复后优先重发
+            self._levels[item.priority].appendleft(item)
+        except Exception as e:
+            if not item.future.done():
+                item.future.set_exception(e)
+        else:
+            self.sent += 1
+            if not item.future.done():
+                item.future.set_result(result)
+        finally:
+            now = time.monotonic()
+            self._chat_ready[item.chat_id] = now + self._interval(item.chat_id)
+            if len(self._chat_ready) > 10000:
+                self._chat_ready = {
+                    k: v for k, v in self._chat_ready.items() if v > now
+                }
+            self._busy.discard(item.chat_id)
+            self._wakeup.set()
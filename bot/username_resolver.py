@@ -0,0 +1,146 @@
+import asyncio
+import logging
+from typing import Optional
+
+from pyrogram.errors import UsernameNotOccupied
+
+from config import config
+from core.member_registry import MemberRegistry, member_registry
+from models.telegram_username_model import TelegramUsernameRepository
+from utils import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# 负缓存中表示“用户名不存在”的标记
+_NOT_OCCUPIED = object()
+
+
+class UsernameResolver:
+    """
+    @username -> telegram_id 的本地解析。
+    依次查询：群组成员登记表、Bot 见过的用户名表（持久化）、
+    最近的 RPC 结果缓存，全部未命中时才调用 Telegram。
+    “用户名不存在”的结果会被短期缓存。
+    """
+
+    def __init__(
+        self,
+        registry: MemberRegistry,
+        cache_size: int = 5000,
+        cache_ttl: int = 86400,
+        negative_ttl: int = 600,
+        flush_interval: int = 10,
+    ):
+        """
+        :param registry: 群组成员登记表
+        :param cache_size: RPC 结果缓存的最大条目数
+        :param cache_ttl: RPC 结果缓存与数据库中用户名记录的有效期（秒），
+            超过有效期的记录需重新向 Telegram 确认
+        :param negative_ttl: “用户名不存在”结果的有效期（秒）
+        :param flush_interval: 将新见到的用户名写入数据库的间隔（秒）
+        """
+        self.registry = registry
+        self.cache_ttl = cache_ttl
+        self.negative_ttl = negative_ttl
+        self.flush_interval = flush_interval
+        self._rpc_cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        # 已写入数据库的 telegram_id -> username，避免重复写入
+        self._saved = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        # 等待写入数据库的 telegram_id -> username，按见到的先后排列
+        self._pending: dict[int, str] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.rpc_calls = 0
+
+    def observe(self, user):
+        """记录 Bot 在更新中见到的用户，稍后批量写入数据库。"""
+        if user is None or not user.username:
+            return
+        username = user.username.lower()
+        if self._saved.get(user.id) == username:
+            return
+        # 同一用户在写入前改名时只保留最新的用户名
+        self._pending.pop(user.id, None)
+        self._pending[user.id] = username
+        self._rpc_cache.pop(username)
+
+    async def flush(self):
+        """将待写入的用户名批量写入数据库。"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            await TelegramUsernameRepository.save_many(pending)
+        except Exception as e:
+            logger.error(f"保存用户名失败: {e}", exc_info=True)
+            # 保留未写入的记录，下次重试（期间见到的新记录优先）
+            for telegram_id in self._pending:
+                pending.pop(telegram_id, None)
+            self._pending = {**pending, **self._pending}
+            return
+        for telegram_id, username in pending.items():
+            self._saved.set(telegram_id, username)
+        logger.debug(f"Saved {len(pending)} usernames")
+
+    async def resolve(self, client, username: str) -> int:
+        """
+        解析用户名。
+        :raises UsernameNotOccupied: 用户名不存在（可能来自负缓存）
+        """
+        username = username.lstrip("@")
+        key = username.lower()
+
+        telegram_id = self.registry.resolve_username(key)
+        if telegram_id is not None:
+            return telegram_id
+
+        for telegram_id, pending_name in reversed(self._pending.items()):
+            if pending_name == key:
+                return telegram_id
+
+        # 过期的记录可能已被改名或转让，视为未命中，重新向 Telegram 确认
+        telegram_id = await TelegramUsernameRepository.get_telegram_id(
+            key, max_age=self.cache_ttl
+        )
+        if telegram_id is not None:
+            return telegram_id
+
+        cached = self._rpc_cache.get(key)
+        if cached is _NOT_OCCUPIED:
+            raise UsernameNotOccupied()
+        if cached is not None:
+            return cached
+
+        self.rpc_calls += 1
+        try:
+            user = await client.get_users(username)
+        except UsernameNotOccupied:
+            self._rpc_cache.set(key, _NOT_OCCUPIED, ttl=self.negative_ttl)
+            raise
+        self._rpc_cache.set(key, user.id)
+        self.observe(user)
+        return user.id
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+
+username_resolver = UsernameResolver(
+    member_registry,
+    cache_size=config.username_cache_size,
+    cache_ttl=config.username_cache_ttl,
+    negative_ttl=config.username_negative_ttl,
+    flush_interval=config.username_flush_interval,
+)
@@ -8,6 +8,38 @@ load_dotenv()
 logger = logging.getLogger(__name__)
 
 
+def _parse_emby_backends(
+    value: str, default_url: str, default_api_key: str
+) -> list[dict]:
+    """
+    解析 EMBY_BACKENDS：名称|地址|API Key|容量，多个后端以分号分隔，容量可省略（不限）。
+    未配置时只有一个名为 default 的后端，使用 EMBY_URL / EMBY_API_KEY。
+    """
+    backends = []
+    for entry in filter(None, (part.strip() for part in value.split(";"))):
+        fields = [field.strip() for field in entry.split("|")]
+        if len(fields) < 3:
+            raise ValueError(f"EMBY_BACKENDS 配置格式错误: {entry}")
+        backends.append(
+            {
+                "name": fields[0],
+                "url": fields[1],
+                "api_key": fields[2],
+                "capacity": int(fields[3]) if len(fields) > 3 and fields[3] else 0,
+            }
+        )
+    if not backends:
+        backends.append(
+            {
+                "name": "default",
+                "url": default_url,
+                "api_key": default_api_key,
+                "capacity": 0,
+            }
+        )
+    return backends
+
+
 class Config:
     def __init__(self):
         self.timezone = os.getenv("TIMEZONE")
@@ -18,19 +50,101 @@ class Config:
         self.telegram_group_ids = list(
             map(int, os.getenv("TELEGRAM_GROUP_ID").split(","))
         )
+        self.group_member_ttl = int(os.getenv("GROUP_MEMBER_TTL", "3600"))
+        self.group_member_negative_ttl = int(
+            os.getenv("GROUP_MEMBER_NEGATIVE_TTL", "60")
+        )
+        self.username_cache_size = int(os.getenv("USERNAME_CACHE_SIZE", "5000"))
+        self.username_cache_ttl = int(os.getenv("USERNAME_CACHE_TTL", "86400"))
+        self.username_negative_ttl = int(os.getenv("USERNAME_NEGATIVE_TTL", "600"))
+        self.username_flush_interval = int(os.getenv("USERNAME_FLUSH_INTERVAL", "10"))
+        # 出站消息速率限制
+        self.send_rate = float(os.getenv("SEND_RATE", "25"))
+        self.send_chat_interval = float(os.getenv("SEND_CHAT_INTERVAL", "1.0"))
+        self.send_group_interval = float(os.getenv("SEND_GROUP_INTERVAL", "3.0"))
+        # 邀请码消息记录的有效期（秒），Bot 无法删除 48 小时前的消息
+        self.code_message_ttl = int(os.getenv("CODE_MESSAGE_TTL", "172800"))
+        self.code_message_flush_interval = int(
+            os.getenv("CODE_MESSAGE_FLUSH_INTERVAL", "5")
+        )
         self.emby_url = os.getenv("EMBY_URL")
         self.emby_api = os.getenv("EMBY_API_KEY")
+        # 多个 Emby 后端，第一个为默认后端（未记录后端的旧账号属于它）
+        self.emby_backends = _parse_emby_backends(
+            os.getenv("EMBY_BACKENDS", ""), self.emby_url, self.emby_api
+        )
+        # 新账号的放置策略：least_loaded（按容量占用率最低）或 fill（按顺序填满）
+        self.emby_placement = os.getenv("EMBY_PLACEMENT", "least_loaded")
+        self.emby_timeout = int(os.getenv("EMBY_TIMEOUT", "10"))
+        self.emby_pool_limit = int(os.getenv("EMBY_POOL_LIMIT", "100"))
+        self.emby_pool_limit_per_host = int(os.getenv("EMBY_POOL_LIMIT_PER_HOST", "20"))
+        self.emby_keepalive_timeout = int(os.getenv("EMBY_KEEPALIVE_TIMEOUT", "30"))
+        # Emby / 路由接口熔断：连续失败次数阈值与熔断后的冷却时间（秒）
+        self.emby_breaker_threshold = int(os.getenv("EMBY_BREAKER_THRESHOLD", "5"))
+        self.emby_breaker_recovery = float(os.getenv("EMBY_BREAKER_RECOVERY", "30"))
+        # 自适应超时：近期耗时 p99 的倍数，下限为 EMBY_TIMEOUT_MIN，上限为 EMBY_TIMEOUT
+        self.emby_timeout_min = float(os.getenv("EMBY_TIMEOUT_MIN", "1"))
+        self.emby_timeout_multiplier = float(
+            os.getenv("EMBY_TIMEOUT_MULTIPLIER", "3")
+        )
+        self.emby_user_cache_size = int(os.getenv("EMBY_USER_CACHE_SIZE", "1000"))
+        self.emby_user_cache_ttl = int(os.getenv("EMBY_USER_CACHE_TTL", "30"))
+        self.emby_user_negative_ttl = int(os.getenv("EMBY_USER_NEGATIVE_TTL", "10"))
+        self.ban_queue_concurrency = int(os.getenv("BAN_QUEUE_CONCURRENCY", "5"))
+        self.ban_queue_max_attempts = int(os.getenv("BAN_QUEUE_MAX_ATTEMPTS", "5"))
+        self.ban_queue_backoff = int(os.getenv("BAN_QUEUE_BACKOFF", "10"))
+        self.ban_queue_poll_interval = int(os.getenv("BAN_QUEUE_POLL_INTERVAL", "5"))
+        # 注册排队时同时创建 Emby 账号的数量
+        self.register_queue_concurrency = int(
+            os.getenv("REGISTER_QUEUE_CONCURRENCY", "3")
+        )
+        # 定期对账的间隔（秒），0 表示关闭
+        self.reconcile_interval = int(os.getenv("RECONCILE_INTERVAL", "0"))
+        self.reconcile_fix = os.getenv("RECONCILE_FIX", "false").lower() == "true"
+        self.reconcile_concurrency = int(os.getenv("RECONCILE_CONCURRENCY", "10"))
+        self.reconcile_page_size = int(os.getenv("RECONCILE_PAGE_SIZE", "500"))
+        # /count 统计的后台刷新间隔（秒）
+        self.count_refresh_interval = int(os.getenv("COUNT_REFRESH_INTERVAL", "600"))
+        self.count_per_library = (
+            os.getenv("COUNT_PER_LIBRARY", "false").lower() == "true"
+        )
         self.api_url = os.getenv("API_URL")
         self.api_key = os.getenv("API_KEY")
+        # 数据库后端：mysql 或 sqlite（单机部署，无需 MySQL 服务）
+        self.db_backend = os.getenv("DB_BACKEND", "mysql").lower()
+        self.db_path = os.getenv("DB_PATH", "embybot.db")
+        self.db_sqlite_busy_timeout = int(os.getenv("DB_SQLITE_BUSY_TIMEOUT", "5000"))
         self.db_host = os.getenv("DB_HOST")
         self.db_port = os.getenv("DB_PORT")
         self.db_user = os.getenv("DB_USER")
         self.db_pass = os.getenv("DB_PASS")
         self.db_name = os.getenv("DB_NAME")
+        self.db_echo = os.getenv("DB_ECHO", "false").lower() == "true"
+        self.db_pool_size = int(os.getenv("DB_POOL_SIZE", "10"))
+        self.db_max_overflow = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+        self.db_pool_recycle = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+        self.db_pool_pre_ping = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+        self.db_pool_timeout = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+        self.db_slow_query_ms = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+        self.db_slow_query_sample_rate = float(
+            os.getenv("DB_SLOW_QUERY_SAMPLE_RATE", "1.0")
+        )
+        # 定期输出连接池状态的间隔（秒），0 表示关闭
+        self.db_pool_stats_interval = int(os.getenv("DB_POOL_STATS_INTERVAL", "300"))
+        # 处理耗时超过该值（毫秒）的命令输出分段耗时日志，0 表示关闭
+        self.trace_slow_ms = float(os.getenv("TRACE_SLOW_MS", "0"))
+        # 以 JSON Lines 格式导出全部 trace 的文件路径，留空表示不导出
+        self.trace_export_path = os.getenv("TRACE_EXPORT_PATH", "")
+        # Prometheus 指标 HTTP 服务端口，0 表示关闭
+        self.metrics_port = int(os.getenv("METRICS_PORT", "0"))
+        self.metrics_host = os.getenv("METRICS_HOST", "127.0.0.1")
+        self.user_cache_size = int(os.getenv("USER_CACHE_SIZE", "10000"))
+        self.user_cache_ttl = int(os.getenv("USER_CACHE_TTL", "300"))
         # 处理以逗号分隔的管理员列表
         self.admin_list = list(map(int, os.getenv("ADMIN_LIST").split(",")))
+        # 单次命令最多生成的邀请码数量
+        self.invite_code_max_batch = int(os.getenv("INVITE_CODE_MAX_BATCH", "5000"))
         self.router_list = {}
-        self.group_members = {}
 
         logger.info(f"Configuration loaded")
 
@@ -1,35 +1,230 @@
+import asyncio
+import json
 import logging
-import requests
+import time
+from typing import AsyncIterator, NamedTuple, Optional
+
+import aiohttp
+
+from utils import TTLCache, tracing
+from utils.circuit_breaker import CircuitBreakers, CircuitOpenError
+from utils.metrics import (
+    EMBY_LATENCY,
+    EMBY_REQUESTS,
+    ROUTER_LATENCY,
+    ROUTER_REQUESTS,
+    endpoint_label,
+)
 
 logger = logging.getLogger(__name__)
 
+_MISSING = object()
+
+
+def _build_session(
+    pool_limit: int, pool_limit_per_host: int, keepalive_timeout: int, timeout: int
+) -> aiohttp.ClientSession:
+    """
+    创建带连接池的 aiohttp 会话，复用 keep-alive 连接，响应自动 gzip 解压。
+    """
+    connector = aiohttp.TCPConnector(
+        limit=pool_limit,
+        limit_per_host=pool_limit_per_host,
+        keepalive_timeout=keepalive_timeout,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=timeout),
+        headers={"Accept-Encoding": "gzip, deflate"},
+    )
+
+
+class EmbyApiError(Exception):
+    """Emby API 返回错误状态码"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class EmbyUnavailableError(Exception):
+    """Emby / 路由服务无法访问（超时、连接失败等）"""
+
+
+def _is_service_failure(error: BaseException) -> bool:
+    """超时、连接失败和 5xx 计为服务故障，4xx 说明服务本身正常"""
+    if isinstance(error, EmbyUnavailableError):
+        return True
+    return isinstance(error, EmbyApiError) and (error.status or 0) >= 500
+
+
+class EmbyUserRecord(NamedTuple):
+    """
+    Emby 用户的精简记录，只保留批量任务和 /info 需要的字段。
+    """
+
+    id: str
+    name: str
+    is_disabled: bool
+    is_administrator: bool
+    is_hidden: bool
+    last_activity_date: Optional[str]
+    date_created: Optional[str] = None
+
+    @classmethod
+    def from_json(cls, data: dict) -> "EmbyUserRecord":
+        policy = data.get("Policy") or {}
+        return cls(
+            id=data["Id"],
+            name=data.get("Name", ""),
+            is_disabled=bool(policy.get("IsDisabled", False)),
+            is_administrator=bool(policy.get("IsAdministrator", False)),
+            is_hidden=bool(policy.get("IsHidden", False)),
+            last_activity_date=data.get("LastActivityDate"),
+            date_created=data.get("DateCreated"),
+        )
+
 
 class EmbyApi:
     """
     用于与 Emby 服务器交互的API封装，支持超时机制和异常处理。
     """
 
-    def __init__(self, emby_url: str, emby_api: str, timeout: int = 10):
+    def __init__(
+        self,
+        emby_url: str,
+        emby_api: str,
+        timeout: int = 10,
+        pool_limit: int = 100,
+        pool_limit_per_host: int = 20,
+        keepalive_timeout: int = 30,
+        user_cache_size: int = 1000,
+        user_cache_ttl: int = 30,
+        user_negative_ttl: int = 10,
+        breaker_threshold: int = 5,
+        breaker_recovery: float = 30,
+        min_timeout: float = 1,
+        timeout_multiplier: float = 3,
+        name: str = "default",
+    ):
         """
         :param emby_url: Emby 服务器的基础 URL（例如：https://your-emby-server.com）
         :param emby_api: Emby 服务器的 API Key
-        :param timeout: 每次请求的超时时间，默认为 10 秒
-        """
+        :param timeout: 每次请求的超时时间上限，默认为 10 秒
+        :param pool_limit: 连接池总连接数上限
+        :param pool_limit_per_host: 连接池对单个主机的连接数上限
+        :param keepalive_timeout: 空闲 keep-alive 连接的保留时间（秒）
+        :param user_cache_size: 用户信息缓存的最大条目数
+        :param user_cache_ttl: 用户信息缓存的有效期（秒）
+        :param user_negative_ttl: “用户不存在”结果的缓存有效期（秒）
+        :param breaker_threshold: 同一接口连续失败多少次后熔断
+        :param breaker_recovery: 熔断后多久（秒）放行探测请求
+        :param min_timeout: 自适应超时的下限（秒）
+        :param timeout_multiplier: 自适应超时为近期耗时 p99 的倍数
+        :param name: 后端名称（多台 Emby 时区分日志与指标）
+        """
+        self.name = name
         self.base_url: str = emby_url.rstrip("/")
         self.api_key: str = emby_api
         self.timeout: int = timeout
+        self.pool_limit: int = pool_limit
+        self.pool_limit_per_host: int = pool_limit_per_host
+        self.keepalive_timeout: int = keepalive_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.user_negative_ttl = user_negative_ttl
+        self._user_cache = TTLCache(maxsize=user_cache_size, ttl=user_cache_ttl)
+        # 正在进行的用户信息查询，同一用户的并发查询共用一次请求
+        self._user_inflight: dict[str, asyncio.Task] = {}
+        self.breakers = CircuitBreakers(
+            f"emby:{name}",
+            "Emby 服务",
+            _is_service_failure,
+            failure_threshold=breaker_threshold,
+            recovery_time=breaker_recovery,
+            min_timeout=min_timeout,
+            max_timeout=timeout,
+            timeout_multiplier=timeout_multiplier,
+        )
         logger.info(
-            f"EmbyApi initialized with URL: {self.base_url}, timeout: {self.timeout}"
+            f"EmbyApi {name} initialized with URL: {self.base_url}, "
+            f"timeout: {self.timeout}, "
+            f"pool limit: {self.pool_limit}/{self.pool_limit_per_host}"
         )
 
-    def _request(self, method: str, path: str, data=None, params=None):
+    def _get_session(self) -> aiohttp.ClientSession:
+        """
+        懒加载共享的 HTTP 会话（必须在事件循环中创建）。
         """
-        内部通用请求方法，用于简化 GET / POST 等请求的异常处理、状态码检查等。
+        if self._session is None or self._session.closed:
+            self._session = _build_session(
+                self.pool_limit,
+                self.pool_limit_per_host,
+                self.keepalive_timeout,
+                self.timeout,
+            )
+        return self._session
+
+    async def close(self):
+        """
+        关闭连接池，释放所有 keep-alive 连接。
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _request(self, method: str, path: str, data=None, params=None):
+        """
+        内部通用请求方法，经过该接口的熔断器，记录每个接口的请求数与耗时。
+        参数与返回值同 _send_request；熔断时抛出 CircuitOpenError。
+        """
+        method = method.upper()
+        endpoint = endpoint_label(path)
+        status = "error"
+        start = time.perf_counter()
+        try:
+            with tracing.span(f"emby:{method} {endpoint}"):
+                # 自适应超时只用于幂等的 GET，POST（创建用户、设置密码等）使用完整超时
+                result = await self.breakers.call(
+                    f"{method} {endpoint}",
+                    self._send_request,
+                    method,
+                    path,
+                    data,
+                    params,
+                    adaptive=method == "GET",
+                )
+            status = "ok"
+            return result
+        except CircuitOpenError:
+            # 已计入熔断拒绝数，不计入请求指标
+            status = None
+            raise
+        except EmbyApiError as e:
+            status = str(e.status)
+            raise
+        finally:
+            if status is not None:
+                EMBY_LATENCY.observe(
+                    time.perf_counter() - start, self.name, method, endpoint
+                )
+                EMBY_REQUESTS.inc(self.name, method, endpoint, status)
+
+    async def _send_request(
+        self,
+        method: str,
+        path: str,
+        data=None,
+        params=None,
+        timeout: Optional[float] = None,
+    ):
+        """
+        发送请求，用于简化 GET / POST 等请求的异常处理、状态码检查等。
 
         :param method: HTTP 方法，如 'GET' or 'POST'
         :param path: 接口路径（相对于 self.base_url 的相对路径）
         :param data: POST 请求体，通常为 JSON 格式
         :param params: URL 查询参数，将自动添加 api_key
+        :param timeout: 本次请求的超时（秒），为空时使用会话默认超时
         :return: 如果请求成功，返回响应的 JSON 内容；否则抛出异常
         """
         headers = {
@@ -46,42 +241,47 @@ class EmbyApi:
         logger.debug(
             f"Making {method} request to {url} with params: {params}, data: {data}"
         )
-        try:
-            if method.upper() == "GET":
-                response = requests.get(
-                    url, params=params, timeout=self.timeout, headers=headers
-                )
-            elif method.upper() == "POST":
-                response = requests.post(
-                    url, params=params, json=data, timeout=self.timeout, headers=headers
-                )
-            else:
-                raise Exception(f"暂不支持的 HTTP 方法: {method}")
+        if method.upper() not in ("GET", "POST"):
+            raise Exception(f"暂不支持的 HTTP 方法: {method}")
 
-        except requests.exceptions.Timeout:
+        request_timeout = (
+            aiohttp.ClientTimeout(total=timeout) if timeout is not None else None
+        )
+        try:
+            async with self._get_session().request(
+                method.upper(),
+                url,
+                params=params,
+                json=data,
+                headers=headers,
+                timeout=request_timeout,
+            ) as response:
+                status = response.status
+                text = await response.text()
+        except asyncio.TimeoutError:
             # 超时异常，抛出中文提示
-            logger.error("Request to Emby server timed out", exc_info=True)
-            raise Exception("请求 Emby 服务器超时，请稍后重试或检查网络连接。")
-        except requests.exceptions.ConnectionError as e:
+            logger.error(f"Request to Emby server timed out after {timeout}s")
+            raise EmbyUnavailableError(
+                "请求 Emby 服务器超时，请稍后重试或检查网络连接。"
+            )
+        except aiohttp.ClientConnectionError as e:
             # 连接异常
             logger.error(f"Failed to connect to Emby server: {e}", exc_info=True)
-            raise Exception(f"无法连接到 Emby 服务器: {str(e)}")
-        except requests.exceptions.RequestException as e:
-            # 其他 requests 异常
+            raise EmbyUnavailableError(f"无法连接到 Emby 服务器: {str(e)}")
+        except aiohttp.ClientError as e:
+            # 其他 aiohttp 异常
             logger.error(
                 f"An unknown error occurred while requesting Emby: {e}", exc_info=True
             )
-            raise Exception(f"请求 Emby 时发生未知错误: {str(e)}")
+            raise EmbyUnavailableError(f"请求 Emby 时发生未知错误: {str(e)}")
 
-        try:
-            response.raise_for_status()
-            logger.debug(f"Request successful, status code: {response.status_code}")
-        except Exception as e:
-            logger.error(f"Emby API request failed: {e}", exc_info=True)
-            raise Exception(f"Emby API 请求失败")
-        return response.json() if response.text else None
+        if status >= 400:
+            logger.error(f"Emby API request failed, status code: {status}")
+            raise EmbyApiError("Emby API 请求失败", status)
+        logger.debug(f"Request successful, status code: {status}")
+        return json.loads(text) if text else None
 
-    def get_user(self, emby_id: str):
+    async def get_user(self, emby_id: str):
         """
         根据用户 ID 获取 Emby 用户信息。
         :param emby_id: Emby 用户 ID
@@ -90,14 +290,93 @@ class EmbyApi:
         path = f"/emby/Users/{emby_id}"
         logger.info(f"Getting user with Emby ID: {emby_id}")
         try:
-            return self._request("GET", path)
+            return await self._request("GET", path)
         except Exception as e:
             logger.error(
                 f"Failed to get user with Emby ID {emby_id}: {e}", exc_info=True
             )
             raise
 
-    def create_user(self, name: str):
+    async def get_user_record(self, emby_id: str) -> Optional[EmbyUserRecord]:
+        """
+        获取 Emby 用户的精简记录（带缓存）。
+        同一用户的并发查询共用一次请求，用户不存在的结果也会被短期缓存。
+        :param emby_id: Emby 用户 ID
+        :return: EmbyUserRecord，用户不存在时返回 None
+        """
+        emby_id = str(emby_id)
+        cached = self._user_cache.get(emby_id, _MISSING)
+        if cached is not _MISSING:
+            return cached
+        task = self._user_inflight.get(emby_id)
+        if task is None:
+            task = asyncio.create_task(self._fetch_user_record(emby_id))
+            self._user_inflight[emby_id] = task
+            task.add_done_callback(
+                lambda t: self._user_inflight.pop(emby_id, None)
+                if self._user_inflight.get(emby_id) is t
+                else None
+            )
+        return await asyncio.shield(task)
+
+    async def _fetch_user_record(self, emby_id: str) -> Optional[EmbyUserRecord]:
+        try:
+            data = await self.get_user(emby_id)
+        except EmbyApiError as e:
+            if e.status not in (400, 404):
+                raise
+            data = None
+        record = EmbyUserRecord.from_json(data) if data else None
+        # 查询期间缓存被清除（用户信息已修改）时不写入旧结果
+        if self._user_inflight.get(emby_id) is asyncio.current_task():
+            ttl = None if record is not None else self.user_negative_ttl
+            self._user_cache.set(emby_id, record, ttl=ttl)
+        return record
+
+    def invalidate_user(self, emby_id: str):
+        """清除用户信息缓存（修改用户后调用）"""
+        emby_id = str(emby_id)
+        self._user_cache.pop(emby_id)
+        self._user_inflight.pop(emby_id, None)
+
+    def user_cache_stats(self) -> dict:
+        return self._user_cache.stats()
+
+    async def iter_users(
+        self, page_size: int = 500
+    ) -> AsyncIterator[EmbyUserRecord]:
+        """
+        分页遍历 Emby 中的全部用户（/emby/Users/Query），逐页解析并产出精简记录，
+        避免一次性拉取 /Users 的完整 JSON。
+        :param page_size: 每页用户数
+        :return: EmbyUserRecord 异步迭代器
+        """
+        path = "/emby/Users/Query"
+        start_index = 0
+        logger.info(f"Iterating Emby users with page size: {page_size}")
+        while True:
+            try:
+                page = await self._request(
+                    "GET", path, params={"StartIndex": start_index, "Limit": page_size}
+                )
+            except Exception as e:
+                logger.error(
+                    f"Failed to query Emby users at index {start_index}: {e}",
+                    exc_info=True,
+                )
+                raise
+            items = (page or {}).get("Items") or []
+            total = (page or {}).get("TotalRecordCount")
+            records = [EmbyUserRecord.from_json(item) for item in items]
+            del page, items
+            for record in records:
+                yield record
+
+            start_index += len(records)
+            if len(records) < page_size or (total is not None and start_index >= total):
+                break
+
+    async def create_user(self, name: str):
         """
         在 Emby 中创建新用户。
         :param name: 用户名
@@ -107,12 +386,30 @@ class EmbyApi:
         data = {"Name": name, "HasPassword": False}
         logger.info(f"Creating user with name: {name}")
         try:
-            return self._request("POST", path, data=data)
+            return await self._request("POST", path, data=data)
         except Exception as e:
             logger.error(f"Failed to create user with name {name}: {e}", exc_info=True)
             raise
 
-    def ban_user(self, emby_id: str):
+    async def delete_user(self, emby_id: str):
+        """
+        删除 Emby 用户。
+        :param emby_id: Emby 用户 ID
+        :return: 成功返回结果 JSON，失败抛出异常
+        """
+        path = f"/emby/Users/{emby_id}/Delete"
+        logger.info(f"Deleting user with Emby ID: {emby_id}")
+        try:
+            return await self._request("POST", path)
+        except Exception as e:
+            logger.error(
+                f"Failed to delete user with Emby ID {emby_id}: {e}", exc_info=True
+            )
+            raise
+        finally:
+            self.invalidate_user(emby_id)
+
+    async def ban_user(self, emby_id: str):
         """
         禁用 Emby 用户：设置其 Policy，使其无法登录或观看。
         :param emby_id: Emby 用户 ID
@@ -144,14 +441,14 @@ class EmbyApi:
         }
         logger.info(f"Banning user with Emby ID: {emby_id}")
         try:
-            return self.update_user_policy(emby_id, data)
+            return await self.update_user_policy(emby_id, data)
         except Exception as e:
             logger.error(
                 f"Failed to ban user with Emby ID {emby_id}: {e}", exc_info=True
             )
             raise
 
-    def set_default_policy(self, emby_id: str):
+    async def set_default_policy(self, emby_id: str):
         """
         取消禁用或为新建用户设置默认权限 Policy。
         :param emby_id: Emby 用户 ID
@@ -183,7 +480,7 @@ class EmbyApi:
         }
         logger.info(f"Setting default policy for user with Emby ID: {emby_id}")
         try:
-            return self.update_user_policy(emby_id, data)
+            return await self.update_user_policy(emby_id, data)
         except Exception as e:
             logger.error(
                 f"Failed to set default policy for user with Emby ID {emby_id}: {e}",
@@ -191,7 +488,7 @@ class EmbyApi:
             )
             raise
 
-    def update_user_policy(self, emby_id: str, policy_data: dict):
+    async def update_user_policy(self, emby_id: str, policy_data: dict):
         """
         更新 Emby 用户的 policy 设置，如是否禁用、并发数等。
         :param emby_id: Emby 用户 ID
@@ -203,15 +500,18 @@ class EmbyApi:
             f"Updating user policy for Emby ID: {emby_id} with data: {policy_data}"
         )
         try:
-            return self._request("POST", path, data=policy_data)
+            return await self._request("POST", path, data=policy_data)
         except Exception as e:
             logger.error(
                 f"Failed to update user policy for Emby ID {emby_id}: {e}",
                 exc_info=True,
             )
             raise
+        finally:
+            # 用户信息已（可能）变化，清除缓存
+            self.invalidate_user(emby_id)
 
-    def reset_user_password(self, emby_id: str):
+    async def reset_user_password(self, emby_id: str):
         """
         重置用户密码（让 Emby 忘记当前密码，此后需要重新设置新密码）。
         :param emby_id: Emby 用户 ID
@@ -221,15 +521,18 @@ class EmbyApi:
         data = {"ResetPassword": True}
         logger.info(f"Resetting password for user with Emby ID: {emby_id}")
         try:
-            return self._request("POST", path, data=data)
+            return await self._request("POST", path, data=data)
         except Exception as e:
             logger.error(
                 f"Failed to reset password for user with Emby ID {emby_id}: {e}",
                 exc_info=True,
             )
             raise
+        finally:
+            # 用户信息已（可能）变化，清除缓存
+            self.invalidate_user(emby_id)
 
-    def set_user_password(self, emby_id: str, new_pass: str):
+    async def set_user_password(self, emby_id: str, new_pass: str):
         """
         设置指定 Emby 用户的新密码。
         :param emby_id: Emby 用户 ID
@@ -240,15 +543,18 @@ class EmbyApi:
         data = {"ResetPassword": False, "CurrentPw": "", "NewPw": new_pass}
         logger.info(f"Setting password for user with Emby ID: {emby_id}")
         try:
-            return self._request("POST", path, data=data)
+            return await self._request("POST", path, data=data)
         except Exception as e:
             logger.error(
                 f"Failed to set password for user with Emby ID {emby_id}: {e}",
                 exc_info=True,
             )
             raise
+        finally:
+            # 用户信息已（可能）变化，清除缓存
+            self.invalidate_user(emby_id)
 
-    def check_emby_site(self) -> bool:
+    async def check_emby_site(self) -> bool:
         """
         检查 Emby 是否可用，仅做简单的 200 检查。
         :return: 若状态码为 200 则返回 True，否则抛出异常或返回 False
@@ -256,7 +562,7 @@ class EmbyApi:
         path = "/emby/System/Info"
         logger.info("Checking Emby site availability")
         try:
-            self._request("GET", path)
+            await self._request("GET", path)
             return True
         except Exception as e:
             logger.warning(f"Emby site check failed: {e}", exc_info=True)
@@ -264,7 +570,7 @@ class EmbyApi:
             # raise 或者 return False 看业务需求
             return False
 
-    def count(self):
+    async def count(self):
         """
         获取 Emby 中影视的数量汇总。
         :return: 包含影视数量信息的 JSON
@@ -272,87 +578,201 @@ class EmbyApi:
         path = "/emby/Items/Counts"
         logger.info("Getting Emby item counts")
         try:
-            return self._request("GET", path)
+            return await self._request("GET", path)
         except Exception as e:
             logger.error(f"Failed to get Emby item counts: {e}", exc_info=True)
             raise
 
+    async def get_media_folders(self):
+        """
+        获取 Emby 中的媒体库列表。
+        :return: 媒体库 JSON 列表（包含 Id、Name、CollectionType）
+        """
+        path = "/emby/Library/MediaFolders"
+        logger.info("Getting Emby media folders")
+        try:
+            result = await self._request("GET", path)
+            return (result or {}).get("Items") or []
+        except Exception as e:
+            logger.error(f"Failed to get Emby media folders: {e}", exc_info=True)
+            raise
+
+    async def count_items(self, parent_id: str, item_type: str) -> int:
+        """
+        统计某个媒体库中指定类型的条目数量（只取总数，不返回条目）。
+        :param parent_id: 媒体库 ID
+        :param item_type: 条目类型，如 Movie、Series、Episode
+        """
+        path = "/emby/Items"
+        params = {
+            "ParentId": parent_id,
+            "IncludeItemTypes": item_type,
+            "Recursive": "true",
+            "Limit": 0,
+        }
+        try:
+            result = await self._request("GET", path, params=params)
+            return int((result or {}).get("TotalRecordCount") or 0)
+        except Exception as e:
+            logger.error(
+                f"Failed to count {item_type} in library {parent_id}: {e}",
+                exc_info=True,
+            )
+            raise
+
 
 class EmbyRouterAPI:
     """
     如果有多条线路可供用户选择，封装了对 Emby Router 服务器的 API 访问。
     """
 
-    def __init__(self, api_url: str, api_key: str = "", timeout: int = 10):
+    def __init__(
+        self,
+        api_url: str,
+        api_key: str = "",
+        timeout: int = 10,
+        pool_limit: int = 20,
+        keepalive_timeout: int = 30,
+        breaker_threshold: int = 5,
+        breaker_recovery: float = 30,
+        min_timeout: float = 1,
+        timeout_multiplier: float = 3,
+    ):
         """
         :param api_url: 路由服务的基础URL
         :param api_key: 路由服务使用的Token（如果需要鉴权）
-        :param timeout: 请求超时，默认为10秒
+        :param timeout: 请求超时上限，默认为10秒
+        :param pool_limit: 连接池连接数上限
+        :param keepalive_timeout: 空闲 keep-alive 连接的保留时间（秒）
+        :param breaker_threshold: 同一接口连续失败多少次后熔断
+        :param breaker_recovery: 熔断后多久（秒）放行探测请求
+        :param min_timeout: 自适应超时的下限（秒）
+        :param timeout_multiplier: 自适应超时为近期耗时 p99 的倍数
         """
         self.api_url = api_url.rstrip("/")
         self.api_key = api_key
         self.timeout = timeout
+        self.pool_limit = pool_limit
+        self.keepalive_timeout = keepalive_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.breakers = CircuitBreakers(
+            "router",
+            "路由服务",
+            _is_service_failure,
+            failure_threshold=breaker_threshold,
+            recovery_time=breaker_recovery,
+            min_timeout=min_timeout,
+            max_timeout=timeout,
+            timeout_multiplier=timeout_multiplier,
+        )
         logger.info(
             f"EmbyRouterAPI initialized with URL: {self.api_url}, timeout: {self.timeout}"
         )
 
-    def call_api(self, path: str):
+    def _get_session(self) -> aiohttp.ClientSession:
+        """
+        懒加载共享的 HTTP 会话（必须在事件循环中创建）。
         """
-        路由API通用请求方法。
+        if self._session is None or self._session.closed:
+            self._session = _build_session(
+                self.pool_limit, self.pool_limit, self.keepalive_timeout, self.timeout
+            )
+        return self._session
+
+    async def close(self):
+        """
+        关闭连接池，释放所有 keep-alive 连接。
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def call_api(self, path: str):
+        """
+        路由API通用请求方法，经过该接口的熔断器。
         :param path: API路径
-        :return: 成功时返回 JSON，失败抛出异常
+        :return: 成功时返回 JSON，失败抛出异常；熔断时抛出 CircuitOpenError
         """
+        endpoint = endpoint_label(path)
+        status = "error"
+        start = time.perf_counter()
+        try:
+            with tracing.span(f"router:GET {endpoint}"):
+                result = await self.breakers.call(endpoint, self._get, path)
+            status = "ok"
+            return result
+        except CircuitOpenError:
+            # 已计入熔断拒绝数，不计入请求指标
+            status = None
+            raise
+        except EmbyApiError as e:
+            status = str(e.status)
+            raise
+        finally:
+            if status is not None:
+                ROUTER_LATENCY.observe(time.perf_counter() - start, endpoint)
+                ROUTER_REQUESTS.inc(endpoint, status)
+
+    async def _get(self, path: str, timeout: Optional[float] = None):
         url = f"{self.api_url}{path}"
         headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
         logger.debug(f"Calling API at {url}")
+        request_timeout = (
+            aiohttp.ClientTimeout(total=timeout) if timeout is not None else None
+        )
         try:
-            response = requests.get(url, headers=headers, timeout=self.timeout)
-            response.raise_for_status()  # 如果状态码非 200-299，自动抛出异常
-            return response.json()
-        except requests.exceptions.Timeout:
-            logger.error("Request to router service timed out", exc_info=True)
-            raise Exception("请求路由服务超时，请稍后重试或检查网络连接。")
-        except requests.exceptions.ConnectionError as e:
+            async with self._get_session().get(
+                url, headers=headers, timeout=request_timeout
+            ) as response:
+                response.raise_for_status()  # 如果状态码非 200-299，自动抛出异常
+                return await response.json(content_type=None)
+        except asyncio.TimeoutError:
+            logger.error(f"Request to router service timed out after {timeout}s")
+            raise EmbyUnavailableError("请求路由服务超时，请稍后重试或检查网络连接。")
+        except aiohttp.ClientResponseError as e:
+            logger.error(f"Router service request failed, status code: {e.status}")
+            raise EmbyApiError(f"请求路由服务时发生错误: {str(e)}", e.status)
+        except aiohttp.ClientConnectionError as e:
             logger.error(f"Failed to connect to router service: {e}", exc_info=True)
-            raise Exception(f"无法连接到路由服务: {str(e)}")
-        except requests.exceptions.RequestException as e:
+            raise EmbyUnavailableError(f"无法连接到路由服务: {str(e)}")
+        except aiohttp.ClientError as e:
             logger.error(
                 f"An unknown error occurred while requesting router service: {e}",
                 exc_info=True,
             )
-            raise Exception(f"请求路由服务时发生错误: {str(e)}")
+            raise EmbyUnavailableError(f"请求路由服务时发生错误: {str(e)}")
 
-    def query_all_route(self):
+    async def query_all_route(self):
         """
         获取所有可用线路。
         """
         logger.info("Querying all routes")
         try:
-            return self.call_api("/api/route")
+            return await self.call_api("/api/route")
         except Exception as e:
             logger.error(f"Failed to query all routes: {e}", exc_info=True)
             raise
 
-    def query_user_route(self, user_id: str):
+    async def query_user_route(self, user_id: str):
         """
         获取指定用户当前所选的线路信息。
         """
         logger.info(f"Querying user route for user ID: {user_id}")
         try:
-            return self.call_api(f"/api/route/{user_id}")
+            return await self.call_api(f"/api/route/{user_id}")
         except Exception as e:
             logger.error(
                 f"Failed to query user route for user ID {user_id}: {e}", exc_info=True
             )
             raise
 
-    def update_user_route(self, user_id: str, new_index: str):
+    async def update_user_route(self, user_id: str, new_index: str):
         """
         更新用户当前所使用的线路。
         """
         logger.info(f"Updating user route for user ID: {user_id} to index: {new_index}")
         try:
-            return self.call_api(f"/api/route/{user_id}/{new_index}")
+            return await self.call_api(f"/api/route/{user_id}/{new_index}")
         except Exception as e:
             logger.error(
                 f"Failed to update user route for user ID {user_id} to index {new_index}: {e}",
@@ -0,0 +1,120 @@
+import logging
+from typing import NamedTuple, Optional
+
+from core.emby_api import EmbyApi
+
+logger = logging.getLogger(__name__)
+
+PLACEMENT_LEAST_LOADED = "least_loaded"
+PLACEMENT_FILL = "fill"
+
+
+class EmbyBackend(NamedTuple):
+    name: str
+    api: EmbyApi
+    # 最多承载的账号数，0 表示不限
+    capacity: int = 0
+
+
+class EmbyPool:
+    """
+    多台 Emby 服务器。账号创建后固定在所在的后端，之后的操作都发往该后端；
+    新账号按放置策略选择后端。第一个后端为默认后端，未记录后端的旧账号属于它。
+    """
+
+    def __init__(
+        self, backends: list[EmbyBackend], placement: str = PLACEMENT_LEAST_LOADED
+    ):
+        """
+        :param backends: 后端列表，顺序即 fill 策略的填充顺序
+        :param placement: least_loaded（容量占用率最低）或 fill（按顺序填满容量）
+        """
+        if not backends:
+            raise ValueError("至少需要配置一个 Emby 后端")
+        if placement not in (PLACEMENT_LEAST_LOADED, PLACEMENT_FILL):
+            raise ValueError(f"未知的 Emby 放置策略: {placement}")
+        self.backends: dict[str, EmbyBackend] = {b.name: b for b in backends}
+        self.default = backends[0]
+        self.placement = placement
+        # 已选定后端、尚未完成创建的账号数
+        self._reserved: dict[str, int] = {b.name: 0 for b in backends}
+
+    def __iter__(self):
+        return iter(self.backends.values())
+
+    def __len__(self):
+        return len(self.backends)
+
+    def get(self, name: Optional[str]) -> EmbyBackend:
+        """按名称获取后端，None 表示默认后端"""
+        if name is None:
+            return self.default
+        backend = self.backends.get(name)
+        if backend is None:
+            raise Exception(f"未找到 Emby 后端 {name}，请检查 EMBY_BACKENDS 配置。")
+        return backend
+
+    def api_for(self, name: Optional[str]) -> EmbyApi:
+        return self.get(name).api
+
+    def loads(self, counts: dict[Optional[str], int]) -> dict[str, int]:
+        """
+        将按后端统计的账号数（None 为未记录后端的旧账号）换算为各后端当前负载，
+        包含已预留的名额。
+        """
+        loads = dict(self._reserved)
+        for name, count in counts.items():
+            key = self.default.name if name is None else name
+            if key in loads:
+                loads[key] += count
+        return loads
+
+    def place(self, counts: dict[Optional[str], int]) -> EmbyBackend:
+        """
+        为新账号选择后端并预留一个名额，创建结束后（无论成功与否）需调用 release()。
+        已满的后端不参与选择；熔断中的后端只在没有其他可用后端时才会被选中。
+        :param counts: 各后端已有的账号数
+        """
+        loads = self.loads(counts)
+        candidates = [
+            backend
+            for backend in self.backends.values()
+            if not backend.capacity or loads[backend.name] < backend.capacity
+        ]
+        if not candidates:
+            raise Exception("所有 Emby 服务器的名额均已用完，暂时无法创建账号。")
+        healthy = [b for b in candidates if not b.api.breakers.open_endpoints()]
+        candidates = healthy or candidates
+
+        if self.placement == PLACEMENT_FILL:
+            backend = candidates[0]
+        elif all(b.capacity for b in candidates):
+            backend = min(candidates, key=lambda b: loads[b.name] / b.capacity)
+        else:
+            backend = min(candidates, key=lambda b: loads[b.name])
+        self._reserved[backend.name] += 1
+        logger.debug(f"Placing new Emby account on backend {backend.name}")
+        return backend
+
+    def release(self, name: str):
+        """释放 place() 预留的名额"""
+        if self._reserved.get(name, 0) > 0:
+            self._reserved[name] -= 1
+
+    def report(self, counts: dict[Optional[str], int]) -> list[dict]:
+        """各后端的负载报告"""
+        loads = self.loads(counts)
+        return [
+            {
+                "name": backend.name,
+                "users": loads[backend.name] - self._reserved[backend.name],
+                "reserved": self._reserved[backend.name],
+                "capacity": backend.capacity,
+                "open_endpoints": backend.api.breakers.open_endpoints(),
+            }
+            for backend in self.backends.values()
+        ]
+
+    async def close(self):
+        for backend in self.backends.values():
+            await backend.api.close()
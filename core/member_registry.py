@@ -0,0 +1,161 @@
+import logging
+import sys
+import time
+from typing import Iterable, Optional
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class MemberRecord:
+    """
+    群组成员的精简记录，代替完整的 pyrogram User 对象。
+    groups 为所在群组的位掩码，位序与配置中的群组顺序一致。
+    """
+
+    __slots__ = ("id", "username", "first_seen", "last_seen", "groups")
+
+    def __init__(self, telegram_id: int, username: Optional[str] = None):
+        self.id = telegram_id
+        self.username = username
+        # 首次见到的时间（Unix 时间戳）
+        self.first_seen = int(time.time())
+        # 最近一次确认成员关系的时间（monotonic）
+        self.last_seen = time.monotonic()
+        self.groups = 0
+
+    def __repr__(self):
+        return (
+            f"<MemberRecord(id={self.id}, username={self.username}, "
+            f"groups={self.groups:b})>"
+        )
+
+
+class MemberRegistry:
+    """
+    群组成员登记表：telegram_id -> MemberRecord，
+    并维护 username -> telegram_id 的反向索引（大小写不敏感）。
+    不在任何群组中的成员会被移除。
+    """
+
+    def __init__(self, group_ids: Iterable[int]):
+        self.group_ids = list(group_ids)
+        self._bits = {group_id: 1 << i for i, group_id in enumerate(self.group_ids)}
+        self._members: dict[int, MemberRecord] = {}
+        self._by_username: dict[str, int] = {}
+
+    def _set_username(self, record: MemberRecord, username: Optional[str]):
+        if username is None or record.username == username:
+            return
+        if record.username:
+            old_key = record.username.lower()
+            if self._by_username.get(old_key) == record.id:
+                del self._by_username[old_key]
+        record.username = username
+        self._by_username[username.lower()] = record.id
+
+    def _drop(self, record: MemberRecord):
+        self._members.pop(record.id, None)
+        if record.username:
+            key = record.username.lower()
+            if self._by_username.get(key) == record.id:
+                del self._by_username[key]
+
+    def add(self, group_id: int, telegram_id: int, username: Optional[str] = None):
+        """登记成员加入某个群组（未配置的群组会被忽略）。"""
+        bit = self._bits.get(group_id)
+        if bit is None:
+            return
+        record = self._members.get(telegram_id)
+        if record is None:
+            record = self._members[telegram_id] = MemberRecord(telegram_id)
+        record.groups |= bit
+        record.last_seen = time.monotonic()
+        self._set_username(record, username)
+
+    def remove(self, group_id: int, telegram_id: int):
+        """登记成员退出某个群组。"""
+        bit = self._bits.get(group_id)
+        record = self._members.get(telegram_id)
+        if bit is None or record is None:
+            return
+        record.groups &= ~bit
+        record.last_seen = time.monotonic()
+        if not record.groups:
+            self._drop(record)
+
+    def set_groups(
+        self,
+        telegram_id: int,
+        group_ids: Iterable[int],
+        username: Optional[str] = None,
+    ):
+        """用一次完整查询的结果覆盖成员所在的群组。"""
+        mask = 0
+        for group_id in group_ids:
+            mask |= self._bits.get(group_id, 0)
+        record = self._members.get(telegram_id)
+        if not mask:
+            if record is not None:
+                self._drop(record)
+            return
+        if record is None:
+            record = self._members[telegram_id] = MemberRecord(telegram_id)
+        record.groups = mask
+        record.last_seen = time.monotonic()
+        self._set_username(record, username)
+
+    def replace_group(self, group_id: int, members: dict[int, Optional[str]]):
+        """
+        用完整的成员列表替换某个群组的成员。
+        :param members: telegram_id -> username
+        """
+        bit = self._bits.get(group_id)
+        if bit is None:
+            return
+        for record in list(self._members.values()):
+            if record.groups & bit and record.id not in members:
+                self.remove(group_id, record.id)
+        for telegram_id, username in members.items():
+            self.add(group_id, telegram_id, username)
+
+    def get(self, telegram_id: int) -> Optional[MemberRecord]:
+        return self._members.get(telegram_id)
+
+    def get_username(self, telegram_id: int) -> Optional[str]:
+        record = self._members.get(telegram_id)
+        return record.username if record else None
+
+    def resolve_username(self, username: str) -> Optional[int]:
+        """通过 @username 查找 telegram_id，找不到返回 None。"""
+        return self._by_username.get(username.lstrip("@").lower())
+
+    def groups_of(self, telegram_id: int) -> list[int]:
+        record = self._members.get(telegram_id)
+        if record is None:
+            return []
+        return [gid for gid, bit in self._bits.items() if record.groups & bit]
+
+    def memory_usage(self) -> dict:
+        """估算登记表占用的内存（字节）。"""
+        total = sys.getsizeof(self._members) + sys.getsizeof(self._by_username)
+        for record in self._members.values():
+            total += sys.getsizeof(record) + sys.getsizeof(record.last_seen)
+            if record.username:
+                total += sys.getsizeof(record.username)
+        total += sum(sys.getsizeof(key) for key in self._by_username)
+        return {
+            "members": len(self._members),
+            "usernames": len(self._by_username),
+            "bytes": total,
+        }
+
+    def __contains__(self, telegram_id: int) -> bool:
+        return telegram_id in self._members
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+
+member_registry = MemberRegistry(config.telegram_group_ids)
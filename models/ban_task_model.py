@@ -0,0 +1,172 @@
+import logging
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Integer,
+    String,
+    delete,
+    func,
+    insert,
+    or_,
+    select,
+)
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .database import Base, BaseModelWithTS, DbOperations, get_session
+
+logger = logging.getLogger(__name__)
+
+
+class BanTask(Base, BaseModelWithTS):
+    """待执行的 Emby 禁用任务（持久化队列，每个 telegram_id 最多一条）"""
+
+    __tablename__ = "ban_task"
+
+    telegram_id: Mapped[int] = mapped_column(
+        BigInteger, index=True, unique=True, nullable=False
+    )
+    reason: Mapped[str] = mapped_column(String(100), nullable=True)
+    # 触发禁用的群组（用户从该群组退出），为空表示不限定群组
+    chat_id: Mapped[int] = mapped_column(BigInteger, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    next_run_at: Mapped[int] = mapped_column(
+        BigInteger, index=True, default=0, nullable=False
+    )
+    is_failed: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    last_error: Mapped[str] = mapped_column(String(255), nullable=True)
+
+    def __repr__(self):
+        return (
+            f"<BanTask(telegram_id={self.telegram_id}, chat_id={self.chat_id}, "
+            f"reason={self.reason}, "
+            f"attempts={self.attempts}, next_run_at={self.next_run_at}, "
+            f"is_failed={self.is_failed})>"
+        )
+
+
+class BanTaskRepository:
+    """BanTask 队列的数据库操作"""
+
+    @staticmethod
+    async def enqueue(
+        telegram_id: int, reason: str, chat_id: Optional[int] = None
+    ) -> bool:
+        """
+        加入禁用任务。同一用户已有待执行任务时合并（返回 False），
+        合并时记录最近一次退出的群组；已失败的任务会被重置为待执行。
+        """
+        now = int(datetime.now().timestamp())
+        async for session in get_session():
+            result = await session.execute(
+                select(BanTask).where(BanTask.telegram_id == telegram_id)
+            )
+            task = result.scalars().first()
+            if task is None:
+                await session.execute(
+                    insert(BanTask)
+                    .prefix_with("IGNORE", dialect="mysql")
+                    .prefix_with("OR IGNORE", dialect="sqlite"),
+                    [
+                        {
+                            "telegram_id": telegram_id,
+                            "reason": reason,
+                            "chat_id": chat_id,
+                            "attempts": 0,
+                            "next_run_at": now,
+                            "is_failed": False,
+                        }
+                    ],
+                )
+                await session.commit()
+                return True
+            task.chat_id = chat_id
+            if task.is_failed:
+                task.is_failed = False
+                task.attempts = 0
+                task.next_run_at = now
+                task.reason = reason
+                await session.commit()
+                return True
+            await session.commit()
+            return False
+
+    @staticmethod
+    async def cancel(telegram_id: int, chat_id: Optional[int] = None) -> bool:
+        """
+        删除该用户的禁用任务（包括已失败的），返回是否有任务被删除。
+        指定 chat_id 时只删除由退出该群组触发（或未限定群组）的任务。
+        """
+        query = delete(BanTask).where(BanTask.telegram_id == telegram_id)
+        if chat_id is not None:
+            query = query.where(
+                or_(BanTask.chat_id.is_(None), BanTask.chat_id == chat_id)
+            )
+        async for session in get_session():
+            result = await session.execute(query)
+            await session.commit()
+            return result.rowcount > 0
+
+    @staticmethod
+    async def fetch_due(limit: int, exclude_ids: set[int]) -> list[BanTask]:
+        """取出已到执行时间的任务（排除正在执行的任务）"""
+        now = int(datetime.now().timestamp())
+        query = (
+            select(BanTask)
+            .where(BanTask.is_failed.is_(False), BanTask.next_run_at <= now)
+            .order_by(BanTask.next_run_at)
+            .limit(limit)
+        )
+        if exclude_ids:
+            query = query.where(BanTask.id.not_in(exclude_ids))
+        async for session in get_session():
+            result = await session.execute(query)
+            return list(result.scalars().all())
+
+    # 任务执行期间可能被取消，SQLite 会复用被删除任务的 id，
+    # 以下操作同时匹配 telegram_id，避免误改其他用户的新任务
+
+    @staticmethod
+    async def complete(task: BanTask) -> bool:
+        async for session in get_session():
+            result = await session.execute(
+                delete(BanTask).where(
+                    BanTask.id == task.id, BanTask.telegram_id == task.telegram_id
+                )
+            )
+            await session.commit()
+            return result.rowcount > 0
+
+    @staticmethod
+    async def retry(task: BanTask, attempts: int, next_run_at: int, error: str):
+        return await DbOperations.update_fields(
+            BanTask,
+            task.id,
+            where=(BanTask.telegram_id == task.telegram_id,),
+            attempts=attempts,
+            next_run_at=next_run_at,
+            last_error=error[:255],
+        )
+
+    @staticmethod
+    async def fail(task: BanTask, attempts: int, error: str):
+        return await DbOperations.update_fields(
+            BanTask,
+            task.id,
+            where=(BanTask.telegram_id == task.telegram_id,),
+            attempts=attempts,
+            is_failed=True,
+            last_error=error[:255],
+        )
+
+    @staticmethod
+    async def count_by_state() -> dict:
+        """统计待执行与已失败的任务数量"""
+        async for session in get_session():
+            result = await session.execute(
+                select(BanTask.is_failed, func.count()).group_by(BanTask.is_failed)
+            )
+            counts = {bool(is_failed): count for is_failed, count in result.all()}
+            return {"pending": counts.get(False, 0), "failed": counts.get(True, 0)}
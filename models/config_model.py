@@ -37,8 +37,38 @@ class ConfigRepository:
             return result.scalars().first()
 
     @staticmethod
-    async def update_config(config_id: int, **kwargs):
-        return await DbOperations.update(Config, config_id, **kwargs)
+    async def update_config(config_id: int, refresh: bool = False, **kwargs):
+        return await DbOperations.update_fields(
+            Config, config_id, refresh=refresh, **kwargs
+        )
+
+    @staticmethod
+    async def claim_public_slot(config_id: int) -> bool:
+        """Atomically take one public registration slot; False when none are left"""
+        claimed = await DbOperations.update_fields(
+            Config,
+            config_id,
+            where=(Config.register_public_user > 0,),
+            register_public_user=Config.register_public_user - 1,
+        )
+        return claimed > 0
+
+    @staticmethod
+    async def release_public_slot(config_id: int):
+        """Give back a slot taken by claim_public_slot"""
+        return await DbOperations.update_fields(
+            Config,
+            config_id,
+            register_public_user=Config.register_public_user + 1,
+        )
+
+    @staticmethod
+    async def increment_total_register(config_id: int):
+        return await DbOperations.update_fields(
+            Config,
+            config_id,
+            total_register_user=Config.total_register_user + 1,
+        )
 
     @staticmethod
     async def create_invite_code(**kwargs):
@@ -66,11 +96,11 @@ class ConfigRepository:
 
     @staticmethod
     async def update_invite_code(code_id: int, **kwargs):
-        return await DbOperations.update(InviteCode, code_id, **kwargs)
+        return await DbOperations.update_fields(InviteCode, code_id, **kwargs)
 
     @staticmethod
     async def mark_as_used(code_id: int, used_time: int, used_user_id: int):
-        return await DbOperations.update(
+        return await DbOperations.update_fields(
             InviteCode,
             code_id,
             is_used=True,
@@ -1,8 +1,33 @@
+import asyncio
+import functools
 import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from datetime import datetime
-from typing import AsyncGenerator, Optional, Type, TypeVar, Any
+from typing import (
+    Any,
+    AsyncGenerator,
+    Callable,
+    Iterable,
+    Optional,
+    Type,
+    TypeVar,
+    Union,
+)
 
-from sqlalchemy import Column, DateTime, Integer, text
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    event,
+    inspect,
+    make_url,
+    text,
+    update,
+)
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
     create_async_engine,
@@ -10,6 +35,11 @@ from sqlalchemy.ext.asyncio import (
     AsyncEngine,
 )
 from sqlalchemy.orm import declarative_base, DeclarativeMeta
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.util import await_only
+
+from utils import tracing
+from utils.metrics import DB_OPERATION_LATENCY, DB_OPERATIONS, record_db_query
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +47,15 @@ logger = logging.getLogger(__name__)
 engine: Optional[AsyncEngine] = None
 async_session_factory: Optional[async_sessionmaker] = None
 
+# Session of the unit of work active in the current task, if any
+_current_session: ContextVar[Optional[AsyncSession]] = ContextVar(
+    "current_session", default=None
+)
+# Callbacks to run once the current unit of work has finished
+_after_transaction: ContextVar[Optional[list[Callable[[], None]]]] = ContextVar(
+    "after_transaction", default=None
+)
+
 # Create base model class
 Base = declarative_base()
 
@@ -39,26 +78,297 @@ class BaseModelWithTS(BaseModel):
     )
 
 
+class PoolStats:
+    """Counters for connection checkouts from the engine pool."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_wait(self, seconds: float) -> None:
+        self.checkouts += 1
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+
+
+pool_stats = PoolStats()
+# Waits for the SQLite single-writer lock (unused with MySQL)
+writer_stats = PoolStats()
+
+# Statements that need SQLite's write lock
+_SQLITE_WRITE_VERBS = frozenset(
+    {"INSERT", "UPDATE", "DELETE", "REPLACE", "CREATE", "DROP", "ALTER"}
+)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            pool_stats.timeouts += 1
+            logger.error(f"Database pool exhausted: {self.status()}")
+            raise
+        finally:
+            pool_stats.record_wait(time.perf_counter() - start)
+
+
+def _install_slow_query_log(
+    async_engine: AsyncEngine, threshold_ms: float, sample_rate: float
+) -> None:
+    """Log statements slower than threshold_ms, sampled at sample_rate.
+
+    The start time lives on the per-statement execution context, so a
+    statement that fails (no after_cursor_execute) leaves nothing behind
+    on the pooled connection.
+    """
+    sync_engine = async_engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._query_start = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_query_start", None)
+        if start is None:
+            return
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if elapsed_ms >= threshold_ms and random.random() < sample_rate:
+            logger.warning(f"Slow query ({elapsed_ms:.1f} ms): {statement}")
+
+
+def _install_query_counter(async_engine: AsyncEngine) -> None:
+    """Count executed statements, overall and per bot command."""
+
+    @event.listens_for(async_engine.sync_engine, "after_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        record_db_query()
+
+
+def _install_tracing(async_engine: AsyncEngine) -> None:
+    """Add a span for every statement executed while an update is traced."""
+    sync_engine = async_engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if tracing.current_trace() is not None:
+            conn.info["trace_start"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info.pop("trace_start", None)
+        trace = tracing.current_trace()
+        if start is not None and trace is not None:
+            verb = statement.lstrip().split(None, 1)[0].upper()
+            trace.add(f"sql:{verb}", start, time.perf_counter())
+
+
+def _install_sqlite_pragmas(async_engine: AsyncEngine, busy_timeout_ms: int) -> None:
+    """Enable WAL and tune every new SQLite connection."""
+
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        # sqlite3 opens a transaction implicitly before the first DML statement;
+        # make it BEGIN IMMEDIATE so the write lock is taken up front instead of
+        # failing with SQLITE_BUSY when a reader later tries to upgrade.
+        dbapi_connection.isolation_level = "IMMEDIATE"
+        cursor = dbapi_connection.cursor()
+        for pragma in (
+            "PRAGMA journal_mode=WAL",
+            "PRAGMA synchronous=NORMAL",
+            f"PRAGMA busy_timeout={int(busy_timeout_ms)}",
+            "PRAGMA foreign_keys=ON",
+            "PRAGMA temp_store=MEMORY",
+            "PRAGMA cache_size=-16000",
+            "PRAGMA mmap_size=268435456",
+        ):
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def _install_sqlite_writer_queue(async_engine: AsyncEngine) -> None:
+    """Serialize write transactions through one asyncio lock.
+
+    SQLite allows a single writer. Queueing writers on the event loop keeps
+    them in FIFO order instead of spinning on SQLITE_BUSY in driver threads.
+    The lock is taken before the first write statement of a transaction and
+    released once the driver has finished its COMMIT or ROLLBACK (the
+    "commit"/"rollback" events fire before the driver call, too early), or
+    when the connection goes back to the pool.
+    """
+    lock = asyncio.Lock()
+    sync_engine = async_engine.sync_engine
+    dialect = sync_engine.dialect
+    # DBAPI connection whose transaction currently holds the lock
+    holder: list[Any] = [None]
+
+    def _raw(connection: Any) -> Any:
+        # Pool proxies (passed to do_commit / do_rollback) wrap the connection
+        return getattr(connection, "dbapi_connection", connection)
+
+    def _release(connection: Any) -> None:
+        if connection is not None and holder[0] is _raw(connection):
+            holder[0] = None
+            lock.release()
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _acquire(conn, cursor, statement, parameters, context, executemany):
+        dbapi_connection = _raw(conn.connection)
+        if holder[0] is dbapi_connection:
+            return
+        verb = statement.lstrip().split(None, 1)[0].upper()
+        if verb in _SQLITE_WRITE_VERBS:
+            start = time.perf_counter()
+            with tracing.span("sqlite:writer_wait"):
+                await_only(lock.acquire())
+            holder[0] = dbapi_connection
+            writer_stats.record_wait(time.perf_counter() - start)
+
+    do_commit = dialect.do_commit
+    do_rollback = dialect.do_rollback
+
+    def _do_commit(dbapi_connection):
+        try:
+            do_commit(dbapi_connection)
+        finally:
+            _release(dbapi_connection)
+
+    def _do_rollback(dbapi_connection):
+        try:
+            do_rollback(dbapi_connection)
+        finally:
+            _release(dbapi_connection)
+
+    dialect.do_commit = _do_commit
+    dialect.do_rollback = _do_rollback
+
+    @event.listens_for(sync_engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        _release(dbapi_connection)
+
+
+def database_url(
+    backend: str,
+    host: Optional[str] = None,
+    port: Optional[int] = None,
+    user: Optional[str] = None,
+    password: Optional[str] = None,
+    db_name: Optional[str] = None,
+    sqlite_path: str = "embybot.db",
+) -> str:
+    """Build the SQLAlchemy URL for the configured backend ("mysql" or "sqlite")."""
+    if backend == "mysql":
+        return f"mysql+asyncmy://{user}:{password}@{host}:{port}/{db_name}"
+    if backend == "sqlite":
+        return f"sqlite+aiosqlite:///{sqlite_path}"
+    raise ValueError(f"Unsupported database backend: {backend}")
+
+
+def is_sqlite() -> bool:
+    """Whether the initialized engine uses the SQLite backend."""
+    return engine is not None and engine.dialect.name == "sqlite"
+
+
 async def init_db(
-    host: str, port: int, user: str, password: str, db_name: str, echo: bool = False
+    url: str,
+    echo: bool = False,
+    pool_size: int = 10,
+    max_overflow: int = 20,
+    pool_recycle: int = 3600,
+    pool_pre_ping: bool = True,
+    pool_timeout: float = 30,
+    slow_query_ms: float = 200,
+    slow_query_sample_rate: float = 1.0,
+    sqlite_busy_timeout_ms: int = 5000,
 ) -> None:
-    """Initialize database connection."""
+    """Initialize database connection.
+
+    The backend follows the URL scheme (see database_url). SQLite runs in WAL
+    mode with writes serialized in-process; pool_recycle and pool_pre_ping
+    only apply to MySQL.
+    """
     global engine, async_session_factory
 
-    connection_string = f"mysql+asyncmy://{user}:{password}@{host}:{port}/{db_name}"
-    engine = create_async_engine(connection_string, echo=echo)
+    if make_url(url).get_backend_name() == "sqlite":
+        engine = create_async_engine(
+            url,
+            echo=echo,
+            poolclass=TimedQueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+        )
+        _install_sqlite_pragmas(engine, sqlite_busy_timeout_ms)
+        _install_sqlite_writer_queue(engine)
+    else:
+        engine = create_async_engine(
+            url,
+            echo=echo,
+            poolclass=TimedQueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_recycle=pool_recycle,
+            pool_pre_ping=pool_pre_ping,
+            pool_timeout=pool_timeout,
+        )
+    if slow_query_ms > 0 and slow_query_sample_rate > 0:
+        _install_slow_query_log(engine, slow_query_ms, slow_query_sample_rate)
+    _install_query_counter(engine)
+    _install_tracing(engine)
     async_session_factory = async_sessionmaker(
         engine, expire_on_commit=False, class_=AsyncSession
     )
 
 
+def get_pool_stats() -> dict:
+    """Return live connection pool statistics."""
+    if engine is None:
+        raise RuntimeError("Database engine not initialized")
+
+    pool = engine.pool
+    stats = {"status": pool.status()}
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=pool.overflow(),
+        )
+    stats.update(
+        checkouts=pool_stats.checkouts,
+        timeouts=pool_stats.timeouts,
+        wait_avg_ms=(
+            pool_stats.wait_total / pool_stats.checkouts * 1000
+            if pool_stats.checkouts
+            else 0.0
+        ),
+        wait_max_ms=pool_stats.wait_max * 1000,
+    )
+    if is_sqlite():
+        stats.update(
+            writer_locks=writer_stats.checkouts,
+            writer_wait_avg_ms=(
+                writer_stats.wait_total / writer_stats.checkouts * 1000
+                if writer_stats.checkouts
+                else 0.0
+            ),
+            writer_wait_max_ms=writer_stats.wait_max * 1000,
+        )
+    return stats
+
+
 async def create_database_if_not_exists(
     host: str, port: int, user: str, password: str, db_name: str
 ) -> None:
-    """Create database if it doesn't exist."""
+    """Create database if it doesn't exist (MySQL only)."""
     engine_without_db = create_async_engine(
         f"mysql+asyncmy://{user}:{password}@{host}:{port}/",
-        echo=True,
     )
     async with engine_without_db.begin() as conn:
         query = f"CREATE DATABASE IF NOT EXISTS {db_name}"
@@ -67,18 +377,57 @@ async def create_database_if_not_exists(
     await engine_without_db.dispose()
 
 
+def _add_missing_columns(sync_conn) -> None:
+    """Add nullable columns that were introduced after a table was created."""
+    inspector = inspect(sync_conn)
+    existing_tables = set(inspector.get_table_names())
+    preparer = sync_conn.dialect.identifier_preparer
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable:
+                logger.error(
+                    f"Column {table.name}.{column.name} is missing and NOT NULL, "
+                    "add it manually"
+                )
+                continue
+            column_type = column.type.compile(dialect=sync_conn.dialect)
+            query = (
+                f"ALTER TABLE {preparer.format_table(table)} "
+                f"ADD COLUMN {preparer.format_column(column)} {column_type}"
+            )
+            logger.info(f"SQL Query: {query}, Context: Adding missing column")
+            sync_conn.execute(text(query))
+            for index in table.indexes:
+                if column.name in index.columns:
+                    index.create(sync_conn)
+
+
 async def create_tables() -> None:
-    """Create all tables defined in the models."""
+    """Create all tables defined in the models and add missing columns."""
     if engine is None:
         raise RuntimeError("Database engine not initialized")
 
     async with engine.begin() as conn:
         logger.info("Context: Creating tables")
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
 
 
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
-    """Provide a session for database operations."""
+    """Provide a session for database operations.
+
+    Inside a unit of work the shared session is yielded and left open.
+    """
+    session = _current_session.get()
+    if session is not None:
+        yield session
+        return
+
     if async_session_factory is None:
         raise RuntimeError("Session factory not initialized")
 
@@ -89,26 +438,110 @@ async def get_session() -> AsyncGenerator[AsyncSession, None]:
             await session.close()
 
 
+@asynccontextmanager
+async def unit_of_work() -> AsyncGenerator[AsyncSession, None]:
+    """Run every DbOperations / repository call in the block on one session.
+
+    The transaction is committed once when the block exits and rolled back if
+    it raises. Nested blocks join the outer unit of work. Do not issue
+    concurrent queries (e.g. asyncio.gather) inside a unit of work.
+    """
+    if _current_session.get() is not None:
+        yield _current_session.get()
+        return
+
+    if async_session_factory is None:
+        raise RuntimeError("Session factory not initialized")
+
+    async with async_session_factory() as session:
+        session_token = _current_session.set(session)
+        callbacks: list[Callable[[], None]] = []
+        callbacks_token = _after_transaction.set(callbacks)
+        try:
+            yield session
+            await session.commit()
+        except BaseException:
+            await session.rollback()
+            raise
+        finally:
+            _current_session.reset(session_token)
+            _after_transaction.reset(callbacks_token)
+            for callback in callbacks:
+                callback()
+
+
+def in_unit_of_work() -> bool:
+    """Whether a unit of work is active in the current task."""
+    return _current_session.get() is not None
+
+
+def after_transaction(callback: Callable[[], None]) -> None:
+    """Run callback once the active unit of work ends, or now if there is none."""
+    callbacks = _after_transaction.get()
+    if callbacks is None:
+        callback()
+    else:
+        callbacks.append(callback)
+
+
+async def commit_session(session: AsyncSession) -> None:
+    """Commit, or only flush when the session belongs to a unit of work."""
+    if _current_session.get() is session:
+        await session.flush()
+    else:
+        await session.commit()
+
+
+async def rollback_session(session: AsyncSession) -> None:
+    """Roll back unless the session belongs to a unit of work."""
+    if _current_session.get() is not session:
+        await session.rollback()
+
+
+def _timed_operation(func):
+    """Record call count and latency of a DbOperations method per model."""
+    operation = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        model = args[0].__name__ if args and isinstance(args[0], type) else "-"
+        status = "error"
+        start = time.perf_counter()
+        try:
+            with tracing.span(f"db:{operation}({model})"):
+                result = await func(*args, **kwargs)
+            status = "ok"
+            return result
+        finally:
+            DB_OPERATION_LATENCY.observe(time.perf_counter() - start, operation, model)
+            DB_OPERATIONS.inc(operation, model, status)
+
+    return wrapper
+
+
 class DbOperations:
     """Class to replace DBManager for common database operations."""
 
     @staticmethod
+    @_timed_operation
     async def create(model: Type[T], **kwargs) -> T:
         """Create a new record."""
         async for session in get_session():
             instance = model(**kwargs)
             session.add(instance)
-            await session.commit()
+            await commit_session(session)
             await session.refresh(instance)
             return instance
 
     @staticmethod
+    @_timed_operation
     async def get_by_id(model: Type[T], id: int) -> Optional[T]:
         """Get record by ID."""
         async for session in get_session():
             return await session.get(model, id)
 
     @staticmethod
+    @_timed_operation
     async def update(model: Type[T], id: int, **kwargs) -> Optional[T]:
         """Update a record by ID."""
         async for session in get_session():
@@ -116,22 +549,52 @@ class DbOperations:
             if instance:
                 for key, value in kwargs.items():
                     setattr(instance, key, value)
-                await session.commit()
+                await commit_session(session)
                 await session.refresh(instance)
             return instance
 
     @staticmethod
+    @_timed_operation
+    async def update_fields(
+        model: Type[T],
+        id: int,
+        refresh: bool = False,
+        where: Iterable[Any] = (),
+        **kwargs,
+    ) -> Union[int, Optional[T]]:
+        """
+        Update a record by ID with a single UPDATE statement.
+
+        Extra conditions in `where` make the update conditional; values may be
+        SQL expressions (e.g. Model.col - 1). Returns the affected row count,
+        or the reloaded record when refresh=True.
+        """
+        async for session in get_session():
+            result = await session.execute(
+                update(model)
+                .where(model.id == id, *where)
+                .values(**kwargs)
+                .execution_options(synchronize_session=False)
+            )
+            await commit_session(session)
+            if refresh:
+                return await session.get(model, id, populate_existing=True)
+            return result.rowcount
+
+    @staticmethod
+    @_timed_operation
     async def delete(model: Type[T], id: int) -> bool:
         """Delete a record by ID."""
         async for session in get_session():
             instance = await session.get(model, id)
             if instance:
                 await session.delete(instance)
-                await session.commit()
+                await commit_session(session)
                 return True
             return False
 
     @staticmethod
+    @_timed_operation
     async def execute(query: Any) -> Any:
         """Execute a custom query."""
         async for session in get_session():
@@ -0,0 +1,103 @@
+import logging
+from typing import Optional
+
+from sqlalchemy import BigInteger, String, UniqueConstraint, delete, insert, select
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .database import Base, BaseModelWithTS, get_session
+
+logger = logging.getLogger(__name__)
+
+# 批量写入快照时每条 INSERT 的行数
+SNAPSHOT_CHUNK_SIZE = 1000
+
+
+class GroupMember(Base, BaseModelWithTS):
+    """群组成员快照，用于重启后快速恢复成员信息"""
+
+    __tablename__ = "group_member"
+    __table_args__ = (UniqueConstraint("group_id", "telegram_id"),)
+
+    group_id: Mapped[int] = mapped_column(BigInteger, index=True, nullable=False)
+    telegram_id: Mapped[int] = mapped_column(BigInteger, index=True, nullable=False)
+    username: Mapped[str] = mapped_column(String(100), nullable=True)
+
+    def __repr__(self):
+        return (
+            f"<GroupMember(group_id={self.group_id}, "
+            f"telegram_id={self.telegram_id}, username={self.username})>"
+        )
+
+
+def _insert_ignore():
+    return (
+        insert(GroupMember)
+        .prefix_with("IGNORE", dialect="mysql")
+        .prefix_with("OR IGNORE", dialect="sqlite")
+    )
+
+
+class GroupMemberRepository:
+    """GroupMember 快照的数据库操作"""
+
+    @staticmethod
+    async def get_all() -> list:
+        """读取全部快照，返回 (group_id, telegram_id, username) 行"""
+        async for session in get_session():
+            result = await session.execute(
+                select(
+                    GroupMember.group_id, GroupMember.telegram_id, GroupMember.username
+                )
+            )
+            return result.all()
+
+    @staticmethod
+    async def replace_group(group_id: int, members: dict[int, Optional[str]]):
+        """
+        在一个事务内用最新成员列表替换某个群组的快照。
+        :param members: telegram_id -> username
+        """
+        rows = [
+            {"group_id": group_id, "telegram_id": telegram_id, "username": username}
+            for telegram_id, username in members.items()
+        ]
+        async for session in get_session():
+            try:
+                await session.execute(
+                    delete(GroupMember).where(GroupMember.group_id == group_id)
+                )
+                for i in range(0, len(rows), SNAPSHOT_CHUNK_SIZE):
+                    await session.execute(
+                        _insert_ignore(), rows[i : i + SNAPSHOT_CHUNK_SIZE]
+                    )
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+        logger.info(f"Saved {len(rows)} members snapshot for group {group_id}")
+
+    @staticmethod
+    async def add(group_id: int, telegram_id: int, username: Optional[str]):
+        async for session in get_session():
+            await session.execute(
+                _insert_ignore(),
+                [
+                    {
+                        "group_id": group_id,
+                        "telegram_id": telegram_id,
+                        "username": username,
+                    }
+                ],
+            )
+            await session.commit()
+
+    @staticmethod
+    async def remove(group_id: int, telegram_id: int):
+        async for session in get_session():
+            await session.execute(
+                delete(GroupMember).where(
+                    GroupMember.group_id == group_id,
+                    GroupMember.telegram_id == telegram_id,
+                )
+            )
+            await session.commit()
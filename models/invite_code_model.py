@@ -1,12 +1,33 @@
 import logging
 import enum
-from sqlalchemy import String, BigInteger, Boolean, Enum, select
+from typing import Iterable
+
+from sqlalchemy import (
+    String,
+    BigInteger,
+    Boolean,
+    Enum,
+    delete,
+    insert,
+    select,
+    update,
+)
 from sqlalchemy.orm import Mapped, mapped_column
 
-from .database import Base, BaseModelWithTS, DbOperations, get_session
+from .database import (
+    Base,
+    BaseModelWithTS,
+    DbOperations,
+    commit_session,
+    get_session,
+    rollback_session,
+)
 
 logger = logging.getLogger(__name__)
 
+# 单条 SQL 中 IN / VALUES 的最大条目数，避免语句过大
+BULK_CHUNK_SIZE = 1000
+
 
 class InviteCodeType(enum.Enum):
     REGISTER = "register"  # 注册邀请码
@@ -40,6 +61,31 @@ class InviteCode(Base, BaseModelWithTS):
         )
 
 
+class InviteCodeMessage(Base, BaseModelWithTS):
+    """Bot 发送邀请码的消息，邀请码被使用后删除对应消息"""
+
+    __tablename__ = "invite_code_message"
+
+    code: Mapped[str] = mapped_column(
+        String(50), index=True, unique=True, nullable=False
+    )
+    chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    message_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    # 超过该时间（Unix 时间戳）后不再删除消息，记录直接清理
+    expire_at: Mapped[int] = mapped_column(BigInteger, index=True, nullable=False)
+    # 邀请码已被使用，等待删除消息
+    is_pending: Mapped[bool] = mapped_column(
+        Boolean, default=False, index=True, nullable=False
+    )
+
+    def __repr__(self):
+        return (
+            f"<InviteCodeMessage(code={self.code}, chat_id={self.chat_id}, "
+            f"message_id={self.message_id}, expire_at={self.expire_at}, "
+            f"is_pending={self.is_pending})>"
+        )
+
+
 class InviteCodeRepository:
     """Replaces InviteCodeOrm to handle InviteCode database operations"""
 
@@ -47,6 +93,70 @@ class InviteCodeRepository:
     async def create_invite_code(**kwargs):
         return await DbOperations.create(InviteCode, **kwargs)
 
+    @staticmethod
+    async def bulk_create(
+        codes: Iterable[str], telegram_id: int, code_type: InviteCodeType
+    ) -> tuple[list[InviteCode], list[str]]:
+        """
+        在一个事务内批量写入邀请码（多行 INSERT）。
+        与已有 code 冲突的条目会被跳过而不是中断整批写入。
+        :return: (成功创建的邀请码列表, 发生冲突的 code 列表)
+        """
+        codes = list(dict.fromkeys(codes))
+        chunks = [
+            codes[i : i + BULK_CHUNK_SIZE] for i in range(0, len(codes), BULK_CHUNK_SIZE)
+        ]
+        stmt = (
+            insert(InviteCode)
+            .prefix_with("IGNORE", dialect="mysql")
+            .prefix_with("OR IGNORE", dialect="sqlite")
+        )
+        created: list[InviteCode] = []
+        collisions: list[str] = []
+        async for session in get_session():
+            try:
+                for chunk in chunks:
+                    result = await session.execute(
+                        select(InviteCode.code).where(InviteCode.code.in_(chunk))
+                    )
+                    existing = set(result.scalars().all())
+                    fresh = [code for code in chunk if code not in existing]
+                    collisions.extend(code for code in chunk if code in existing)
+                    if not fresh:
+                        continue
+                    await session.execute(
+                        stmt,
+                        [
+                            {
+                                "code": code,
+                                "telegram_id": telegram_id,
+                                "code_type": code_type,
+                                "is_used": False,
+                            }
+                            for code in fresh
+                        ],
+                    )
+                    result = await session.execute(
+                        select(InviteCode).where(
+                            InviteCode.code.in_(fresh),
+                            InviteCode.telegram_id == telegram_id,
+                        )
+                    )
+                    rows = {row.code: row for row in result.scalars().all()}
+                    for code in fresh:
+                        if code in rows:
+                            created.append(rows[code])
+                        else:
+                            # 并发写入导致的冲突
+                            collisions.append(code)
+                await commit_session(session)
+            except Exception:
+                await rollback_session(session)
+                raise
+        if collisions:
+            logger.warning(f"Invite code collisions skipped: {collisions}")
+        return created, collisions
+
     @staticmethod
     async def get_by_id(code_id: int):
         return await DbOperations.get_by_id(InviteCode, code_id)
@@ -69,14 +179,110 @@ class InviteCodeRepository:
 
     @staticmethod
     async def update_invite_code(code_id: int, **kwargs):
-        return await DbOperations.update(InviteCode, code_id, **kwargs)
+        return await DbOperations.update_fields(InviteCode, code_id, **kwargs)
 
     @staticmethod
     async def mark_as_used(code_id: int, used_time: int, used_user_id: int):
-        return await DbOperations.update(
+        """将未使用的邀请码标记为已使用，返回受影响行数（0 表示已被使用）。"""
+        return await DbOperations.update_fields(
             InviteCode,
             code_id,
+            where=(InviteCode.is_used.is_(False),),
             is_used=True,
             used_time=used_time,
             used_user_id=used_user_id,
         )
+
+
+class InviteCodeMessageRepository:
+    """InviteCodeMessage 的数据库操作"""
+
+    @staticmethod
+    async def bulk_save(rows: list[tuple[str, int, int]], expire_at: int):
+        """
+        批量记录邀请码消息。
+        :param rows: (code, chat_id, message_id) 列表
+        """
+        if not rows:
+            return
+        stmt = (
+            insert(InviteCodeMessage)
+            .prefix_with("IGNORE", dialect="mysql")
+            .prefix_with("OR IGNORE", dialect="sqlite")
+        )
+        async for session in get_session():
+            try:
+                for i in range(0, len(rows), BULK_CHUNK_SIZE):
+                    await session.execute(
+                        stmt,
+                        [
+                            {
+                                "code": code,
+                                "chat_id": chat_id,
+                                "message_id": message_id,
+                                "expire_at": expire_at,
+                                "is_pending": False,
+                            }
+                            for code, chat_id, message_id in rows[
+                                i : i + BULK_CHUNK_SIZE
+                            ]
+                        ],
+                    )
+                await commit_session(session)
+            except Exception:
+                await rollback_session(session)
+                raise
+
+    @staticmethod
+    async def mark_pending(code: str, now: int) -> int:
+        """邀请码已使用，标记其消息等待删除，返回受影响行数"""
+        async for session in get_session():
+            result = await session.execute(
+                update(InviteCodeMessage)
+                .where(
+                    InviteCodeMessage.code == code,
+                    InviteCodeMessage.expire_at > now,
+                )
+                .values(is_pending=True)
+            )
+            await commit_session(session)
+            return result.rowcount
+
+    @staticmethod
+    async def get_pending(now: int, limit: int) -> list:
+        """读取等待删除且未过期的消息，返回 (id, chat_id, message_id) 行"""
+        async for session in get_session():
+            result = await session.execute(
+                select(
+                    InviteCodeMessage.id,
+                    InviteCodeMessage.chat_id,
+                    InviteCodeMessage.message_id,
+                )
+                .where(
+                    InviteCodeMessage.is_pending.is_(True),
+                    InviteCodeMessage.expire_at > now,
+                )
+                .order_by(InviteCodeMessage.id)
+                .limit(limit)
+            )
+            return result.all()
+
+    @staticmethod
+    async def delete_by_ids(ids: list[int]):
+        if not ids:
+            return
+        async for session in get_session():
+            await session.execute(
+                delete(InviteCodeMessage).where(InviteCodeMessage.id.in_(ids))
+            )
+            await commit_session(session)
+
+    @staticmethod
+    async def delete_expired(now: int) -> int:
+        """清理已过期的记录，返回删除的行数"""
+        async for session in get_session():
+            result = await session.execute(
+                delete(InviteCodeMessage).where(InviteCodeMessage.expire_at <= now)
+            )
+            await commit_session(session)
+            return result.rowcount
@@ -0,0 +1,82 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import BigInteger, String, delete, insert, or_, select
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .database import Base, BaseModelWithTS, get_session
+
+logger = logging.getLogger(__name__)
+
+
+class TelegramUsername(Base, BaseModelWithTS):
+    """Bot 见过的 Telegram 用户名与 ID 的对应关系（用户名统一小写）"""
+
+    __tablename__ = "telegram_username"
+
+    username: Mapped[str] = mapped_column(
+        String(64), index=True, unique=True, nullable=False
+    )
+    telegram_id: Mapped[int] = mapped_column(BigInteger, index=True, nullable=False)
+
+    def __repr__(self):
+        return (
+            f"<TelegramUsername(username={self.username}, "
+            f"telegram_id={self.telegram_id})>"
+        )
+
+
+class TelegramUsernameRepository:
+    """TelegramUsername 的数据库操作"""
+
+    @staticmethod
+    async def get_telegram_id(
+        username: str, max_age: Optional[int] = None
+    ) -> Optional[int]:
+        """
+        :param max_age: 记录的最长有效期（秒），更早写入的记录视为未命中
+        """
+        query = select(TelegramUsername.telegram_id).where(
+            TelegramUsername.username == username.lower()
+        )
+        if max_age is not None:
+            cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+            query = query.where(TelegramUsername.updated_at >= cutoff)
+        async for session in get_session():
+            result = await session.execute(query)
+            return result.scalars().first()
+
+    @staticmethod
+    async def save_many(usernames: dict[int, str]):
+        """
+        批量保存 telegram_id -> username（按见到的先后顺序）。
+        同一用户名或同一用户的旧记录会被替换，保证两边都唯一；
+        本批内多个用户使用同一用户名时以最后见到的为准。
+        """
+        if not usernames:
+            return
+        latest: dict[str, int] = {}
+        for telegram_id, username in usernames.items():
+            latest[username.lower()] = telegram_id
+        rows = [
+            {"username": username, "telegram_id": telegram_id}
+            for username, telegram_id in latest.items()
+        ]
+        async for session in get_session():
+            try:
+                await session.execute(
+                    delete(TelegramUsername).where(
+                        or_(
+                            TelegramUsername.username.in_([r["username"] for r in rows]),
+                            TelegramUsername.telegram_id.in_(
+                                [r["telegram_id"] for r in rows]
+                            ),
+                        )
+                    )
+                )
+                await session.execute(insert(TelegramUsername), rows)
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
@@ -1,9 +1,19 @@
 import logging
-from sqlalchemy import String, Boolean, BigInteger, select
+from typing import AsyncIterator, Hashable, Iterable, Optional
+
+from sqlalchemy import String, Boolean, BigInteger, func, or_, select
 from sqlalchemy.orm import Mapped, mapped_column
 
-from .database import Base, BaseModelWithTS, DbOperations, get_session
+from .database import (
+    Base,
+    BaseModelWithTS,
+    DbOperations,
+    after_transaction,
+    get_session,
+    in_unit_of_work,
+)
 from config import config
+from utils import TTLCache
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +29,8 @@ class User(Base, BaseModelWithTS):
     emby_id: Mapped[str] = mapped_column(
         String(50), index=True, unique=True, nullable=True
     )
+    # 账号所在的 Emby 后端，为空表示默认后端
+    emby_backend: Mapped[str] = mapped_column(String(32), index=True, nullable=True)
     is_admin: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
     is_whitelist: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
     enable_register: Mapped[bool] = mapped_column(
@@ -33,6 +45,7 @@ class User(Base, BaseModelWithTS):
             f"telegram_name={self.telegram_name}, "
             f"emby_name={self.emby_name}, "
             f"emby_id={self.emby_id}, "
+            f"emby_backend={self.emby_backend}, "
             f"is_admin={self.is_admin}, "
             f"is_whitelist={self.is_whitelist}, "
             f"enable_register={self.enable_register}, "
@@ -107,35 +120,202 @@ class User(Base, BaseModelWithTS):
         return self.ban_time, self.reason
 
 
+class UserCache:
+    """
+    User 行的读穿透缓存（LRU + TTL），按主键保存，
+    并维护 telegram_id / emby_id 到主键的二级索引。
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 300):
+        self._rows = TTLCache(maxsize=maxsize, ttl=ttl, on_evict=self._drop_keys)
+        self._by_telegram_id: dict[int, int] = {}
+        self._by_emby_id: dict[str, int] = {}
+        # 每次失效自增，用于丢弃失效前发起的读查询结果
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _drop_keys(self, user_id: Hashable, user: User):
+        if self._by_telegram_id.get(user.telegram_id) == user_id:
+            del self._by_telegram_id[user.telegram_id]
+        if user.emby_id is not None and self._by_emby_id.get(user.emby_id) == user_id:
+            del self._by_emby_id[user.emby_id]
+
+    def _get(self, user_id: Optional[int]) -> Optional[User]:
+        user = self._rows.get(user_id) if user_id is not None else None
+        if user is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return user
+
+    def get_by_id(self, user_id: int) -> Optional[User]:
+        return self._get(user_id)
+
+    def get_by_telegram_id(self, telegram_id: int) -> Optional[User]:
+        return self._get(self._by_telegram_id.get(telegram_id))
+
+    def get_by_emby_id(self, emby_id: str) -> Optional[User]:
+        return self._get(self._by_emby_id.get(emby_id))
+
+    def put(self, user: Optional[User], generation: Optional[int] = None):
+        """
+        写入（或刷新）一行，None 会被忽略。
+        传入 generation 时，若期间发生过失效则放弃写入，避免缓存旧数据。
+        """
+        if user is None or (generation is not None and generation != self.generation):
+            return
+        old = self._rows.pop(user.id)
+        if old is not None:
+            self._drop_keys(user.id, old)
+        self._rows.set(user.id, user)
+        self._by_telegram_id[user.telegram_id] = user.id
+        if user.emby_id is not None:
+            self._by_emby_id[user.emby_id] = user.id
+
+    def invalidate(self, user_id: int):
+        """使某个主键对应的缓存失效。"""
+        self.generation += 1
+        user = self._rows.pop(user_id)
+        if user is not None:
+            self._drop_keys(user_id, user)
+
+    def clear(self):
+        self._rows.clear()
+        self._by_telegram_id.clear()
+        self._by_emby_id.clear()
+
+    def stats(self) -> dict:
+        """返回缓存大小及命中 / 未命中次数。"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._rows),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+user_cache = UserCache(maxsize=config.user_cache_size, ttl=config.user_cache_ttl)
+
+
+def _cache_put(user: Optional[User], generation: Optional[int] = None):
+    """写入缓存；事务（unit of work）内读到的行可能尚未提交，不写入。"""
+    if not in_unit_of_work():
+        user_cache.put(user, generation)
+
+
+def _cache_invalidate(user_id: int):
+    """立即失效，事务内的写入在事务结束后再失效一次，防止并发读回填旧数据。"""
+    user_cache.invalidate(user_id)
+    if in_unit_of_work():
+        after_transaction(lambda: user_cache.invalidate(user_id))
+
+
 class UserRepository:
     """Replaces UserOrm to handle User database operations"""
 
     @staticmethod
     async def create_user(**kwargs):
-        return await DbOperations.create(User, **kwargs)
+        user = await DbOperations.create(User, **kwargs)
+        _cache_put(user)
+        return user
 
     @staticmethod
     async def get_by_id(user_id: int):
-        return await DbOperations.get_by_id(User, user_id)
+        user = user_cache.get_by_id(user_id)
+        if user is None:
+            generation = user_cache.generation
+            user = await DbOperations.get_by_id(User, user_id)
+            _cache_put(user, generation)
+        return user
 
     @staticmethod
     async def get_by_telegram_id(telegram_id: int):
+        user = user_cache.get_by_telegram_id(telegram_id)
+        if user is not None:
+            return user
+        generation = user_cache.generation
         async for session in get_session():
             result = await session.execute(
                 select(User).where(User.telegram_id == telegram_id)
             )
-            return result.scalars().first()
+            user = result.scalars().first()
+            _cache_put(user, generation)
+            return user
 
     @staticmethod
     async def get_by_emby_id(emby_id: str):
+        user = user_cache.get_by_emby_id(emby_id)
+        if user is not None:
+            return user
+        generation = user_cache.generation
         async for session in get_session():
             result = await session.execute(select(User).where(User.emby_id == emby_id))
-            return result.scalars().first()
+            user = result.scalars().first()
+            _cache_put(user, generation)
+            return user
 
     @staticmethod
     async def update_user(user_id: int, **kwargs):
-        return await DbOperations.update(User, user_id, **kwargs)
+        """单条 UPDATE 更新用户，返回受影响行数。"""
+        rowcount = await DbOperations.update_fields(User, user_id, **kwargs)
+        _cache_invalidate(user_id)
+        return rowcount
 
     @staticmethod
     async def delete_user(user_id: int):
-        return await DbOperations.delete(User, user_id)
+        deleted = await DbOperations.delete(User, user_id)
+        _cache_invalidate(user_id)
+        return deleted
+
+    @staticmethod
+    async def iter_emby_bindings(
+        batch_size: int = 1000, backends: Optional[Iterable[Optional[str]]] = None
+    ) -> AsyncIterator:
+        """
+        按 emby_id 升序分批遍历已绑定 Emby 的用户（keyset 分页），
+        只取 id / telegram_id / emby_id / ban_time 四列。
+        :param backends: 只遍历这些后端的账号，None 表示未记录后端的账号；不传则遍历全部
+        """
+        last_emby_id = None
+        backend_filter = None
+        if backends is not None:
+            backends = list(backends)
+            backend_filter = User.emby_backend.in_([b for b in backends if b])
+            if None in backends:
+                backend_filter = or_(backend_filter, User.emby_backend.is_(None))
+        while True:
+            query = (
+                select(User.id, User.telegram_id, User.emby_id, User.ban_time)
+                .where(User.emby_id.is_not(None))
+                .order_by(User.emby_id)
+                .limit(batch_size)
+            )
+            if backend_filter is not None:
+                query = query.where(backend_filter)
+            if last_emby_id is not None:
+                query = query.where(User.emby_id > last_emby_id)
+            async for session in get_session():
+                rows = (await session.execute(query)).all()
+            for row in rows:
+                yield row
+            if len(rows) < batch_size:
+                break
+            last_emby_id = rows[-1].emby_id
+
+    @staticmethod
+    async def count_by_emby_backend() -> dict[Optional[str], int]:
+        """按 Emby 后端统计已绑定的账号数，None 为未记录后端的账号。"""
+        async for session in get_session():
+            result = await session.execute(
+                select(User.emby_backend, func.count(User.id))
+                .where(User.emby_id.is_not(None))
+                .group_by(User.emby_backend)
+            )
+            return {backend: count for backend, count in result.all()}
+
+    @staticmethod
+    def cache_stats() -> dict:
+        """返回用户缓存的命中统计。"""
+        return user_cache.stats()
@@ -1 +1,5 @@
 from .user_service import UserService
+from .reconcile_service import ReconcileService, ReconcileReport
+from .ban_queue import BanQueue
+from .register_queue import RegisterQueue
+from .library_stats import LibraryStats, CountSnapshot, LibraryCount
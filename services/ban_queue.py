@@ -0,0 +1,184 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Optional
+
+from core.member_registry import member_registry
+from models.ban_task_model import BanTask, BanTaskRepository
+from services.user_service import UserService
+
+logger = logging.getLogger(__name__)
+
+
+class BanQueue:
+    """
+    退群禁用的持久化工作队列。
+    事件处理器只负责入队，后台 worker 以有限并发执行禁用，
+    同一用户的重复任务会被合并，失败后按指数退避重试。
+    """
+
+    def __init__(
+        self,
+        user_service: UserService,
+        concurrency: int = 5,
+        max_attempts: int = 5,
+        backoff: int = 10,
+        poll_interval: int = 5,
+    ):
+        """
+        :param user_service: 用户业务层，用于执行实际的禁用
+        :param concurrency: 同时执行禁用的 worker 数量
+        :param max_attempts: 单个任务的最大尝试次数，超过后标记为失败
+        :param backoff: 首次重试的等待时间（秒），之后每次翻倍
+        :param poll_interval: 没有新任务时轮询数据库的间隔（秒）
+        """
+        self.user_service = user_service
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.poll_interval = poll_interval
+        self._queue: asyncio.Queue[BanTask] = asyncio.Queue(maxsize=concurrency * 2)
+        self._inflight: set[int] = set()
+        # 执行中任务的 telegram_id -> 任务，用于在执行途中取消
+        self._running: dict[int, BanTask] = {}
+        self._cancelled: set[int] = set()
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self.processed = 0
+        self.failed = 0
+
+    async def enqueue(
+        self, telegram_id: int, reason: str, chat_id: Optional[int] = None
+    ) -> bool:
+        """
+        加入禁用任务，返回 False 表示与已有任务合并
+        :param chat_id: 用户退出的群组，执行前用户已回到该群组时跳过禁用
+        """
+        queued = await BanTaskRepository.enqueue(telegram_id, reason, chat_id)
+        if queued:
+            self._wakeup.set()
+        logger.debug(f"Ban task for {telegram_id} queued: {queued}")
+        return queued
+
+    async def cancel(self, telegram_id: int, chat_id: Optional[int] = None) -> bool:
+        """
+        用户重新入群时取消其禁用任务，返回是否有任务被取消
+        :param chat_id: 用户加入的群组，只取消由退出该群组触发的任务
+        """
+        running = self._running.get(telegram_id)
+        if running is not None and (
+            chat_id is None or running.chat_id in (None, chat_id)
+        ):
+            # 任务已交给 worker，由 worker 在调用 Emby 前放弃
+            self._cancelled.add(running.id)
+        cancelled = await BanTaskRepository.cancel(telegram_id, chat_id)
+        if cancelled:
+            logger.info(f"Ban task for {telegram_id} cancelled: user rejoined")
+        return cancelled
+
+    async def depth(self) -> dict:
+        """队列深度：待执行、执行中、已失败的任务数"""
+        counts = await BanTaskRepository.count_by_state()
+        counts["inflight"] = len(self._inflight)
+        return counts
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks.append(asyncio.create_task(self._dispatch()))
+        for _ in range(self.concurrency):
+            self._tasks.append(asyncio.create_task(self._work()))
+        logger.info(f"Ban queue started with {self.concurrency} workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        logger.info("Ban queue stopped")
+
+    async def _dispatch(self):
+        """从数据库取出到期任务分发给 worker"""
+        while True:
+            # 先清除再读取，读取期间的 enqueue 不会丢失唤醒
+            self._wakeup.clear()
+            try:
+                tasks = await BanTaskRepository.fetch_due(
+                    self._queue.maxsize, set(self._inflight)
+                )
+            except Exception as e:
+                logger.error(f"读取禁用任务失败: {e}", exc_info=True)
+                tasks = []
+
+            for task in tasks:
+                self._inflight.add(task.id)
+                await self._queue.put(task)
+
+            if not tasks:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _work(self):
+        while True:
+            task = await self._queue.get()
+            self._running[task.telegram_id] = task
+            try:
+                await self._process(task)
+            except Exception as e:
+                logger.error(f"处理禁用任务 {task} 失败: {e}", exc_info=True)
+            finally:
+                if self._running.get(task.telegram_id) is task:
+                    del self._running[task.telegram_id]
+                self._cancelled.discard(task.id)
+                self._inflight.discard(task.id)
+                self._queue.task_done()
+
+    def _rejoined(self, task: BanTask) -> bool:
+        """任务已被取消，或用户已回到其退出的群组（未记录群组时为任一群组）"""
+        if task.id in self._cancelled:
+            return True
+        if task.chat_id is None:
+            return task.telegram_id in member_registry
+        return task.chat_id in member_registry.groups_of(task.telegram_id)
+
+    async def _process(self, task: BanTask):
+        error: Optional[str] = None
+        try:
+            if self._rejoined(task):
+                logger.info(f"Ban task for {task.telegram_id} skipped: user rejoined")
+                await BanTaskRepository.complete(task)
+                return
+            user = await self.user_service.must_get_user(task.telegram_id)
+            if (
+                not user.has_emby_account()
+                or user.is_emby_baned()
+                or user.is_whitelist
+            ):
+                # 已无需禁用
+                await BanTaskRepository.complete(task)
+                return
+            # 查询用户期间可能已重新入群，调用 Emby 前再确认一次
+            if self._rejoined(task):
+                logger.info(f"Ban task for {task.telegram_id} skipped: user rejoined")
+                await BanTaskRepository.complete(task)
+                return
+            if await self.user_service.emby_ban(task.telegram_id, task.reason):
+                await BanTaskRepository.complete(task)
+                self.processed += 1
+                return
+            error = "emby_ban returned False"
+        except Exception as e:
+            error = str(e)
+
+        attempts = task.attempts + 1
+        if attempts >= self.max_attempts:
+            self.failed += 1
+            logger.error(f"禁用任务 {task.telegram_id} 已达最大重试次数: {error}")
+            await BanTaskRepository.fail(task, attempts, error)
+            return
+        delay = self.backoff * 2 ** (attempts - 1)
+        next_run_at = int(datetime.now().timestamp()) + delay
+        logger.warning(f"禁用任务 {task.telegram_id} 失败，{delay} 秒后重试: {error}")
+        await BanTaskRepository.retry(task, attempts, next_run_at, error)
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from core.emby_api import EmbyApi
+
+logger = logging.getLogger(__name__)
+
+# 分库统计的条目类型
+_LIBRARY_ITEM_TYPES = ("Movie", "Series", "Episode")
+
+
+class LibraryCount(NamedTuple):
+    """单个媒体库的条目数量"""
+
+    name: str
+    movies: int
+    series: int
+    episodes: int
+
+
+class CountSnapshot(NamedTuple):
+    """某一时刻的影片数量统计"""
+
+    counts: dict
+    libraries: list[LibraryCount]
+    taken_at: int  # Unix 时间戳
+
+
+class LibraryStats:
+    """
+    影片数量统计缓存：后台按间隔刷新，查询时直接返回最近一次的结果，
+    结果过期时在后台刷新（stale-while-revalidate），同时只会有一个刷新在进行。
+    """
+
+    def __init__(
+        self,
+        emby_api: EmbyApi,
+        refresh_interval: int = 600,
+        per_library: bool = False,
+        concurrency: int = 5,
+    ):
+        """
+        :param emby_api: Emby API 客户端
+        :param refresh_interval: 刷新间隔（秒），超过该时间的结果视为过期
+        :param per_library: 是否通过 /Library/MediaFolders 统计各媒体库的数量
+        :param concurrency: 分库统计时并发请求 Emby 的上限
+        """
+        self.emby_api = emby_api
+        self.refresh_interval = refresh_interval
+        self.per_library = per_library
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.snapshot: Optional[CountSnapshot] = None
+        self._refreshing: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def is_stale(self) -> bool:
+        if self.snapshot is None:
+            return True
+        age = int(datetime.now().timestamp()) - self.snapshot.taken_at
+        return age >= self.refresh_interval
+
+    async def get(self) -> CountSnapshot:
+        """
+        获取统计结果。尚无结果时等待刷新完成，
+        结果过期时立即返回旧结果并在后台刷新。
+        """
+        if self.snapshot is None:
+            return await self.refresh()
+        if self.is_stale():
+            self._start_refresh()
+        return self.snapshot
+
+    async def refresh(self) -> CountSnapshot:
+        """刷新统计结果，并发的刷新请求会合并为一次。"""
+        # shield：调用方被取消时不影响正在进行的刷新
+        return await asyncio.shield(self._start_refresh())
+
+    def _start_refresh(self) -> asyncio.Task:
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(self._do_refresh())
+            self._refreshing.add_done_callback(self._log_refresh_error)
+        return self._refreshing
+
+    @staticmethod
+    def _log_refresh_error(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"刷新影片数量失败: {task.exception()}")
+
+    async def _do_refresh(self) -> CountSnapshot:
+        counts = await self.emby_api.count() or {}
+        libraries = await self._count_libraries() if self.per_library else []
+        self.snapshot = CountSnapshot(
+            counts=counts,
+            libraries=libraries,
+            taken_at=int(datetime.now().timestamp()),
+        )
+        logger.debug(f"Library counts refreshed: {counts}")
+        return self.snapshot
+
+    async def _count(self, library_id: str, item_type: str) -> int:
+        async with self._semaphore:
+            return await self.emby_api.count_items(library_id, item_type)
+
+    async def _count_libraries(self) -> list[LibraryCount]:
+        folders = await self.emby_api.get_media_folders()
+        results = await asyncio.gather(
+            *(
+                self._count(folder["Id"], item_type)
+                for folder in folders
+                for item_type in _LIBRARY_ITEM_TYPES
+            )
+        )
+        n = len(_LIBRARY_ITEM_TYPES)
+        return [
+            LibraryCount(folder.get("Name", ""), *results[i * n : (i + 1) * n])
+            for i, folder in enumerate(folders)
+        ]
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        for task in (self._task, self._refreshing):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._task = None
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                # 已在 _log_refresh_error 中记录
+                pass
+            await asyncio.sleep(self.refresh_interval)
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+from typing import List
+
+from core.emby_api import EmbyApi
+from core.emby_pool import EmbyBackend, EmbyPool
+from models.user_model import UserRepository
+
+logger = logging.getLogger(__name__)
+
+
+class ReconcileReport:
+    """一次数据库与 Emby 对账的结果"""
+
+    # 摘要中每类问题最多展示的 ID 数量
+    SAMPLE_SIZE = 10
+
+    def __init__(self):
+        self.emby_users = 0
+        self.db_users = 0
+        # Emby 中存在、数据库中没有绑定的账号
+        self.orphan_emby_ids: List[str] = []
+        # 数据库中已绑定、Emby 中已不存在的账号
+        self.deleted_emby_ids: List[str] = []
+        # 数据库中已禁用、Emby 中仍可用的账号
+        self.banned_but_enabled: List[str] = []
+        # 数据库中正常、Emby 中被禁用的账号（通常是手动操作，仅报告）
+        self.enabled_but_disabled: List[str] = []
+        self.fixed: List[str] = []
+        self.fix_failed: List[str] = []
+
+    def has_mismatch(self) -> bool:
+        return bool(
+            self.orphan_emby_ids
+            or self.deleted_emby_ids
+            or self.banned_but_enabled
+            or self.enabled_but_disabled
+        )
+
+    def summary(self) -> str:
+        def line(title: str, ids: List[str]) -> str:
+            sample = ", ".join(ids[: self.SAMPLE_SIZE])
+            more = " ..." if len(ids) > self.SAMPLE_SIZE else ""
+            return f"{title}：{len(ids)}" + (f"（{sample}{more}）" if ids else "")
+
+        return "\n".join(
+            [
+                f"Emby 用户数：{self.emby_users}，数据库绑定数：{self.db_users}",
+                line("Emby 孤立账号", self.orphan_emby_ids),
+                line("Emby 中已删除的账号", self.deleted_emby_ids),
+                line("已禁用但 Emby 仍可用", self.banned_but_enabled),
+                line("未禁用但 Emby 已禁用", self.enabled_but_disabled),
+                line("已修复", self.fixed),
+                line("修复失败", self.fix_failed),
+            ]
+        )
+
+
+class ReconcileService:
+    """
+    数据库 user 表与 Emby 实际状态的对账任务。
+    逐个 Emby 后端进行：Emby 用户分页拉取精简记录后排序，
+    数据库按 emby_id 分批顺序读取该后端的账号，二者归并比对。
+    """
+
+    def __init__(
+        self,
+        emby_pool: EmbyPool,
+        page_size: int = 500,
+        batch_size: int = 1000,
+        concurrency: int = 10,
+    ):
+        """
+        :param emby_pool: Emby 后端
+        :param page_size: 拉取 Emby 用户的分页大小
+        :param batch_size: 读取数据库用户的批大小
+        :param concurrency: 修复时并发调用 Emby 的上限
+        """
+        self.emby_pool = emby_pool
+        self.page_size = page_size
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _key(emby_id: str) -> str:
+        # 与 MySQL 默认的大小写不敏感排序保持一致
+        return emby_id.lower()
+
+    async def run(self, fix: bool = False) -> ReconcileReport:
+        """
+        执行一次对账。
+        :param fix: 是否修复可自动修复的问题（禁用数据库中已禁用的 Emby 账号）
+        """
+        if self._lock.locked():
+            raise Exception("对账任务正在运行中，请稍后再试。")
+        async with self._lock:
+            report = ReconcileReport()
+            for backend in self.emby_pool:
+                await self._reconcile_backend(report, backend, fix)
+            logger.info(f"Reconcile finished:\n{report.summary()}")
+            return report
+
+    async def _reconcile_backend(
+        self, report: ReconcileReport, backend: EmbyBackend, fix: bool
+    ):
+        """对账单个后端，结果累加到 report"""
+        emby_users = [
+            record
+            async for record in backend.api.iter_users(page_size=self.page_size)
+        ]
+        emby_users.sort(key=lambda record: self._key(record.id))
+        report.emby_users += len(emby_users)
+
+        # 默认后端同时负责未记录后端的旧账号
+        backends = [backend.name]
+        if backend is self.emby_pool.default:
+            backends.append(None)
+        banned_but_enabled: List[str] = []
+        emby_iter = iter(emby_users)
+        emby_user = next(emby_iter, None)
+        async for row in UserRepository.iter_emby_bindings(self.batch_size, backends):
+            report.db_users += 1
+            key = self._key(row.emby_id)
+            while emby_user is not None and self._key(emby_user.id) < key:
+                self._report_orphan(report, emby_user)
+                emby_user = next(emby_iter, None)
+
+            if emby_user is None or self._key(emby_user.id) != key:
+                report.deleted_emby_ids.append(row.emby_id)
+                continue
+
+            banned = bool(row.ban_time and row.ban_time > 0)
+            if banned and not emby_user.is_disabled:
+                banned_but_enabled.append(emby_user.id)
+            elif not banned and emby_user.is_disabled:
+                report.enabled_but_disabled.append(emby_user.id)
+            emby_user = next(emby_iter, None)
+
+        while emby_user is not None:
+            self._report_orphan(report, emby_user)
+            emby_user = next(emby_iter, None)
+
+        report.banned_but_enabled.extend(banned_but_enabled)
+        if fix and banned_but_enabled:
+            await self._ban_all(report, backend.api, banned_but_enabled)
+
+    @staticmethod
+    def _report_orphan(report: ReconcileReport, emby_user):
+        # Emby 管理员账号不由 Bot 管理
+        if not emby_user.is_administrator:
+            report.orphan_emby_ids.append(emby_user.id)
+
+    async def _ban_all(
+        self, report: ReconcileReport, emby_api: EmbyApi, emby_ids: List[str]
+    ):
+        """以有限并发批量禁用 Emby 账号"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def ban(emby_id: str):
+            async with semaphore:
+                try:
+                    await emby_api.ban_user(emby_id)
+                    report.fixed.append(emby_id)
+                except Exception as e:
+                    logger.error(f"对账修复禁用 {emby_id} 失败: {e}")
+                    report.fix_failed.append(emby_id)
+
+        await asyncio.gather(*(ban(emby_id) for emby_id in emby_ids))
@@ -0,0 +1,224 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+from models.user_model import User
+from services.user_service import RegistrationClosedError, UserService
+
+logger = logging.getLogger(__name__)
+
+# 创建完成后的回调：(创建成功的用户, 失败时的异常)
+RegisterCallback = Callable[[Optional[User], Optional[Exception]], Awaitable]
+
+
+class _RegisterRequest:
+    __slots__ = (
+        "telegram_id",
+        "username",
+        "password",
+        "whitelisted",
+        "on_done",
+        "done",
+    )
+
+    def __init__(
+        self,
+        telegram_id: int,
+        username: str,
+        password: str,
+        whitelisted: bool,
+        on_done: RegisterCallback,
+        done: asyncio.Future,
+    ):
+        self.telegram_id = telegram_id
+        self.username = username
+        self.password = password
+        self.whitelisted = whitelisted
+        self.on_done = on_done
+        self.done = done
+
+
+class RegisterQueue:
+    """
+    注册排队：开放注册时大量 /create 同时到达，按先来后到的顺序排队，
+    以有限并发调用 Emby 创建账号，避免压垮 Emby。
+    公开名额用尽后，队列中仍在等待的非白名单用户会被直接拒绝，不再逐个请求 Emby。
+    """
+
+    def __init__(
+        self,
+        user_service: UserService,
+        concurrency: int = 3,
+        stop_timeout: float = 30,
+    ):
+        """
+        :param user_service: 用户业务层，用于执行实际的创建
+        :param concurrency: 同时创建账号的 worker 数量
+        :param stop_timeout: 停止时等待创建中请求完成的最长时间（秒）
+        """
+        self.user_service = user_service
+        self.concurrency = concurrency
+        self.stop_timeout = stop_timeout
+        self._waiting: deque[_RegisterRequest] = deque()
+        self._requests: dict[int, _RegisterRequest] = {}
+        self._processing: set[_RegisterRequest] = set()
+        self._stopping = False
+        self._active = 0
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._notifying: set[asyncio.Task] = set()
+        self.created = 0
+        self.failed = 0
+
+    async def submit(
+        self,
+        telegram_id: int,
+        username: str,
+        password: str,
+        on_done: RegisterCallback,
+    ) -> int:
+        """
+        加入注册队列，创建结束后调用 on_done。
+        :return: 排队位置（从 1 开始），0 表示有空闲 worker、无需等待
+        """
+        if self._stopping:
+            raise Exception("服务正在停止，请稍后重试。")
+        if telegram_id in self._requests:
+            raise Exception("您已在注册队列中，请耐心等待。")
+        user = await self.user_service.get_or_create_user_by_telegram_id(telegram_id)
+        if user.has_emby_account():
+            raise Exception("该 Telegram 用户已经绑定过 Emby 账号，无法重复创建。")
+        # 查询用户期间可能已有同一用户的请求入队
+        if telegram_id in self._requests:
+            raise Exception("您已在注册队列中，请耐心等待。")
+
+        request = _RegisterRequest(
+            telegram_id,
+            username,
+            password,
+            user.enable_register,
+            on_done,
+            asyncio.get_running_loop().create_future(),
+        )
+        ahead = len(self._waiting)
+        self._waiting.append(request)
+        self._requests[telegram_id] = request
+        self._wakeup.set()
+        idle = self.concurrency - self._active
+        return max(0, ahead + 1 - idle)
+
+    async def wait(self, telegram_id: int):
+        """
+        等待该用户的注册请求处理完成并已通知结果（包括失败），不在队列中时立即返回
+        """
+        request = self._requests.get(telegram_id)
+        if request is not None:
+            await asyncio.shield(request.done)
+
+    def depth(self) -> dict:
+        """排队中与创建中的请求数"""
+        return {"waiting": len(self._waiting), "active": self._active}
+
+    def start(self):
+        if self._tasks:
+            return
+        for _ in range(self.concurrency):
+            self._tasks.append(asyncio.create_task(self._work()))
+        logger.info(f"Register queue started with {self.concurrency} workers")
+
+    async def stop(self):
+        """
+        拒绝排队中的请求，等待创建中的请求完成（最多 stop_timeout 秒）后停止 worker。
+        超时仍未完成的请求以停止为由结束，保证每个请求都会通知用户。
+        """
+        self._stopping = True
+        stopping = Exception("服务正在停止，请稍后重试。")
+        while self._waiting:
+            self._finish(self._waiting.popleft(), None, stopping)
+        if self._processing:
+            await asyncio.wait(
+                [request.done for request in self._processing],
+                timeout=self.stop_timeout,
+            )
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        for request in list(self._processing):
+            logger.warning(f"注册请求 {request.telegram_id} 未在停止前完成")
+            self._finish(request, None, stopping)
+        await asyncio.gather(*self._notifying, return_exceptions=True)
+        logger.info("Register queue stopped")
+
+    async def _work(self):
+        while True:
+            while not self._waiting:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            request = self._waiting.popleft()
+            self._active += 1
+            self._processing.add(request)
+            try:
+                # 请求在 _finish 中移出 _processing；被取消时留给 stop() 结束
+                await self._process(request)
+            finally:
+                self._active -= 1
+
+    async def _process(self, request: _RegisterRequest):
+        try:
+            user = await self.user_service.emby_create_user(
+                request.telegram_id, request.username, request.password
+            )
+        except RegistrationClosedError as e:
+            self._finish(request, None, e)
+            self._reject_waiting(e)
+        except Exception as e:
+            self._finish(request, None, e)
+        else:
+            self.created += 1
+            self._finish(request, user, None)
+
+    def _reject_waiting(self, error: RegistrationClosedError):
+        """名额已用尽：直接拒绝仍在排队的非白名单用户，白名单用户继续排队"""
+        remaining = deque()
+        rejected = 0
+        while self._waiting:
+            request = self._waiting.popleft()
+            if request.whitelisted:
+                remaining.append(request)
+            else:
+                self._finish(request, None, error)
+                rejected += 1
+        self._waiting = remaining
+        if rejected:
+            logger.info(f"Registration closed, rejected {rejected} queued requests")
+
+    def _finish(
+        self,
+        request: _RegisterRequest,
+        user: Optional[User],
+        error: Optional[Exception],
+    ):
+        if self._requests.get(request.telegram_id) is not request:
+            # 已经结束过
+            return
+        if error is not None:
+            self.failed += 1
+        del self._requests[request.telegram_id]
+        self._processing.discard(request)
+        # 回调（编辑排队消息）经由出站队列发送，不占用 worker
+        task = asyncio.create_task(self._notify(request, user, error))
+        self._notifying.add(task)
+        task.add_done_callback(self._notifying.discard)
+
+    @staticmethod
+    async def _notify(
+        request: _RegisterRequest, user: Optional[User], error: Optional[Exception]
+    ):
+        try:
+            await request.on_done(user, error)
+        except Exception as e:
+            logger.error(f"通知 {request.telegram_id} 注册结果失败: {e}", exc_info=True)
+        finally:
+            request.done.set_result(None)
@@ -1,21 +1,27 @@
 import logging
 import re
 import string
+import time
 from datetime import datetime
 from random import sample
-from typing import Optional, List, Dict, Tuple
+from typing import Callable, Optional, List, Dict, Tuple
 
 import shortuuid
 
 from config import config
-from core.emby_api import EmbyApi, EmbyRouterAPI
+from core.emby_api import EmbyApi, EmbyRouterAPI, EmbyUserRecord
+from core.emby_pool import EmbyBackend, EmbyPool
+from core.member_registry import member_registry
 from models.config_model import Config, ConfigRepository
 from models.invite_code_model import InviteCode, InviteCodeRepository, InviteCodeType
 from models.user_model import User, UserRepository
-from models.database import get_session
+from models.database import unit_of_work
 
 logger = logging.getLogger(__name__)
 
+# 放置新账号时使用的各后端账号数缓存时间（秒），期间新建的账号在本地累加
+BACKEND_COUNT_TTL = 60
+
 
 class NotBoundError(Exception):
     """用户未绑定 Emby 账号的异常"""
@@ -23,12 +29,40 @@ class NotBoundError(Exception):
     pass
 
 
+class RegistrationClosedError(Exception):
+    """没有注册权限且公开注册名额已用尽的异常"""
+
+    pass
+
+
 class UserService:
     """用户与 Emby 相关的业务逻辑层"""
 
-    def __init__(self, emby_api: EmbyApi, emby_router_api: EmbyRouterAPI):
-        self.emby_api = emby_api
+    def __init__(self, emby_pool: EmbyPool, emby_router_api: EmbyRouterAPI):
+        self.emby_pool = emby_pool
         self.emby_router_api = emby_router_api
+        self._backend_counts: Optional[dict[Optional[str], int]] = None
+        self._backend_counts_at = 0.0
+
+    def emby_api_for(self, user: User) -> EmbyApi:
+        """用户账号所在后端的 Emby API"""
+        return self.emby_pool.api_for(user.emby_backend)
+
+    async def _get_backend_counts(self) -> dict[Optional[str], int]:
+        now = time.monotonic()
+        if (
+            self._backend_counts is None
+            or now - self._backend_counts_at > BACKEND_COUNT_TTL
+        ):
+            self._backend_counts = await UserRepository.count_by_emby_backend()
+            self._backend_counts_at = now
+        return self._backend_counts
+
+    async def backend_load(self) -> list[dict]:
+        """各 Emby 后端的账号数、容量与熔断状态"""
+        self._backend_counts = await UserRepository.count_by_emby_backend()
+        self._backend_counts_at = time.monotonic()
+        return self.emby_pool.report(self._backend_counts)
 
     @staticmethod
     async def get_or_create_user_by_telegram_id(telegram_id: int) -> User:
@@ -39,9 +73,7 @@ class UserService:
             user = await UserRepository.create_user(
                 telegram_id=telegram_id,
                 is_admin=telegram_id in config.admin_list,
-                telegram_name=config.group_members.get(telegram_id, {}).username
-                if config.group_members.get(telegram_id)
-                else None,
+                telegram_name=member_registry.get_username(telegram_id),
             )
         return user
 
@@ -68,27 +100,35 @@ class UserService:
         return user
 
     async def _emby_create_user(
-        self, telegram_id: int, username: str, password: str
-    ) -> User:
-        """内部使用：真正调用 Emby API 创建用户，并设置初始密码"""
-        user = await self.get_or_create_user_by_telegram_id(telegram_id)
-        emby_user = self.emby_api.create_user(username)
+        self, username: str, password: str, backend: EmbyBackend
+    ) -> str:
+        """
+        内部使用：在选定的后端上调用 Emby API 创建用户，并设置初始密码与默认 Policy。
+        不在事务中执行；后续步骤失败时删除已创建的账号。
+        :return: Emby 用户 ID
+        """
+        emby_api = backend.api
+        emby_user = await emby_api.create_user(username)
         if not emby_user or not emby_user.get("Id"):
             raise Exception("在 Emby 系统中创建账号失败，请检查 Emby 服务是否正常。")
 
         emby_id = emby_user["Id"]
-        # Update user directly with UserRepository
-        await UserRepository.update_user(
-            user.id, emby_id=emby_id, emby_name=username, enable_register=False
-        )
-
-        # Reload user after update
-        user = await UserRepository.get_by_id(user.id)
+        try:
+            # 设置初始密码 & 默认Policy
+            await emby_api.set_user_password(emby_id, password)
+            await emby_api.set_default_policy(emby_id)
+        except Exception:
+            await self._discard_emby_account(emby_api, emby_id)
+            raise
+        return emby_id
 
-        # 设置初始密码 & 默认Policy
-        self.emby_api.set_user_password(emby_id, password)
-        self.emby_api.set_default_policy(emby_id)
-        return user
+    @staticmethod
+    async def _discard_emby_account(emby_api: EmbyApi, emby_id: str):
+        """删除创建流程中途失败的 Emby 账号，避免留下无人绑定的账号占用用户名"""
+        try:
+            await emby_api.delete_user(emby_id)
+        except Exception as e:
+            logger.error(f"清理未绑定的 Emby 账号 {emby_id} 失败，请手动删除: {e}")
 
     @staticmethod
     def gen_default_passwd() -> str:
@@ -105,6 +145,34 @@ class UserService:
         """批量生成白名单邀请码"""
         return [f"epw-{str(shortuuid.uuid())}" for _ in range(num)]
 
+    @staticmethod
+    async def _bulk_create_codes(
+        telegram_id: int,
+        count: int,
+        code_type: InviteCodeType,
+        gen_codes: Callable[[int], List[str]],
+        max_attempts: int = 3,
+    ) -> List[InviteCode]:
+        """
+        批量写入邀请码，发生 code 冲突时重新生成冲突的数量。
+        重试 max_attempts 次后仍有冲突时返回已创建的部分，调用方需比较数量。
+        """
+        created_codes: List[InviteCode] = []
+        for _ in range(max_attempts):
+            missing = count - len(created_codes)
+            if missing <= 0:
+                break
+            created, _collisions = await InviteCodeRepository.bulk_create(
+                gen_codes(missing), telegram_id, code_type
+            )
+            created_codes.extend(created)
+        if len(created_codes) < count:
+            logger.warning(
+                f"用户 {telegram_id} 请求生成 {count} 个邀请码，"
+                f"重试 {max_attempts} 次后仅生成 {len(created_codes)} 个"
+            )
+        return created_codes
+
     async def create_invite_code(
         self, telegram_id: int, count: int = 1
     ) -> List[InviteCode]:
@@ -113,15 +181,9 @@ class UserService:
         if not user.check_create_invite_code():
             raise Exception("您没有权限生成普通邀请码。")
 
-        # Create and store invite codes one by one
-        created_codes = []
-        for code in self.gen_register_code(count):
-            invite_code = await InviteCodeRepository.create_invite_code(
-                code=code, telegram_id=telegram_id, code_type=InviteCodeType.REGISTER
-            )
-            created_codes.append(invite_code)
-
-        return created_codes
+        return await self._bulk_create_codes(
+            telegram_id, count, InviteCodeType.REGISTER, self.gen_register_code
+        )
 
     async def create_whitelist_code(
         self, telegram_id: int, count: int = 1
@@ -131,22 +193,16 @@ class UserService:
         if not user.check_create_whitelist_code():
             raise Exception("您没有权限生成白名单邀请码。")
 
-        # Create and store whitelist codes one by one
-        created_codes = []
-        for code in self.gen_whitelist_code(count):
-            invite_code = await InviteCodeRepository.create_invite_code(
-                code=code, telegram_id=telegram_id, code_type=InviteCodeType.WHITELIST
-            )
-            created_codes.append(invite_code)
-
-        return created_codes
+        return await self._bulk_create_codes(
+            telegram_id, count, InviteCodeType.WHITELIST, self.gen_whitelist_code
+        )
 
-    async def emby_info(self, telegram_id: int) -> Tuple[User, Dict]:
-        """获取当前用户在 Emby 的信息"""
+    async def emby_info(self, telegram_id: int) -> Tuple[User, EmbyUserRecord]:
+        """获取当前用户在 Emby 的信息（带短期缓存）"""
         user = await self.must_get_user(telegram_id)
         if not user.has_emby_account():
             raise NotBoundError("该用户尚未绑定 Emby 账号。")
-        emby_user = self.emby_api.get_user(str(user.emby_id))
+        emby_user = await self.emby_api_for(user).get_user_record(str(user.emby_id))
         if not emby_user:
             raise Exception(
                 "从 Emby 服务器获取用户信息失败，请检查 Emby 服务是否正常。"
@@ -174,37 +230,62 @@ class UserService:
         if not emby_config:
             raise Exception("未找到 Emby 配置，无法创建账号。")
 
-        if not await self._check_register_permission(user, emby_config):
-            raise Exception("当前没有可用的注册权限或名额，创建账号被拒绝。")
+        # 非白名单用户先用一条条件 UPDATE 原子地领取公开注册名额，
+        # 并发创建时不会超发，也不必锁住配置行等待 Emby 请求完成
+        claimed = False
+        if not user.enable_register:
+            claimed = await ConfigRepository.claim_public_slot(emby_config.id)
+        if not claimed and not await self._check_register_permission(
+            user, emby_config
+        ):
+            raise RegistrationClosedError(
+                "当前没有可用的注册权限或名额，创建账号被拒绝。"
+            )
 
-        # Use manual session management instead of transaction context manager
-        async for session in get_session():
-            try:
-                if not user.enable_register and emby_config.register_public_user > 0:
-                    emby_config.register_public_user -= 1
-
-                emby_config.total_register_user += 1
-                await ConfigRepository.update_config(
-                    emby_config.id,
-                    register_public_user=emby_config.register_public_user,
-                    total_register_user=emby_config.total_register_user,
-                )
+        backend = None
+        try:
+            # 按放置策略选择 Emby 后端并预留名额
+            backend = self.emby_pool.place(await self._get_backend_counts())
 
-                # Create user in Emby system
-                new_user = await self._emby_create_user(telegram_id, username, password)
+            # Create user in Emby system（不占用数据库事务）
+            emby_id = await self._emby_create_user(username, password, backend)
 
-                await session.commit()
-                return new_user
-            except Exception as e:
-                await session.rollback()
-                logger.error(f"创建用户失败: {e}")
+            # Emby 账号绑定与注册总数累加在同一个短事务中
+            try:
+                async with unit_of_work():
+                    await UserRepository.update_user(
+                        user.id,
+                        emby_id=emby_id,
+                        emby_name=username,
+                        emby_backend=backend.name,
+                        enable_register=False,
+                    )
+                    await ConfigRepository.increment_total_register(emby_config.id)
+            except Exception:
+                await self._discard_emby_account(backend.api, emby_id)
                 raise
+            user = await UserRepository.get_by_id(user.id)
+            if self._backend_counts is not None:
+                self._backend_counts[backend.name] = (
+                    self._backend_counts.get(backend.name, 0) + 1
+                )
+            return user
+        except Exception as e:
+            logger.error(f"创建用户失败: {e}")
+            if claimed:
+                # 创建失败，归还领取的公开注册名额
+                await ConfigRepository.release_public_slot(emby_config.id)
+            raise
+        finally:
+            if backend is not None:
+                self.emby_pool.release(backend.name)
 
     async def _check_register_permission(self, user: User, emby_config: Config) -> bool:
-        """检查用户是否有权限注册 Emby 账号"""
+        """
+        检查用户是否有权限注册 Emby 账号（白名单或处于开放注册时间内）。
+        公开注册名额由 ConfigRepository.claim_public_slot 原子领取，不在此处判断。
+        """
         enable_register = user.enable_register
-        if not enable_register and emby_config.register_public_user > 0:
-            enable_register = True
         if (
             not enable_register
             and emby_config.register_public_time > 0
@@ -223,9 +304,10 @@ class UserService:
 
         user = await self.must_get_user(telegram_id)
 
-        # Use direct session rather than transaction context manager
-        async for session in get_session():
-            try:
+        # 核销邀请码与更新用户在同一个事务中完成；解禁 Emby 账号在提交后进行
+        needs_unban = False
+        try:
+            async with unit_of_work():
                 # Get invite code
                 valid_code = await InviteCodeRepository.get_by_code(code)
 
@@ -237,35 +319,44 @@ class UserService:
                     user.check_use_redeem_code()
                 elif valid_code.code_type == InviteCodeType.WHITELIST:
                     user.check_use_whitelist_code()
-                    if user.is_emby_baned():
-                        await self.emby_unban(telegram_id)
+                    needs_unban = user.is_emby_baned()
 
-                # Mark code as used
+                # Mark code as used（仅当邀请码仍未被使用时才会更新成功）
                 now = int(datetime.now().timestamp())
-                await InviteCodeRepository.mark_as_used(valid_code.id, now, telegram_id)
+                if not await InviteCodeRepository.mark_as_used(
+                    valid_code.id, now, telegram_id
+                ):
+                    raise Exception("该邀请码无效或已被使用。")
 
                 # Update user based on code type
                 if valid_code.code_type == InviteCodeType.REGISTER:
                     await UserRepository.update_user(user.id, enable_register=True)
                 elif valid_code.code_type == InviteCodeType.WHITELIST:
                     await UserRepository.update_user(user.id, is_whitelist=True)
+        except Exception as e:
+            logger.error(f"使用邀请码失败: {e}")
+            raise
 
-                await session.commit()
-
-                # Refresh user object after update
-                user = await UserRepository.get_by_id(user.id)
-                return valid_code
+        # 邀请码已核销，再调用 Emby 解禁；只有解禁成功才会清除禁用状态
+        if needs_unban:
+            try:
+                unbanned = await self.emby_unban(telegram_id)
             except Exception as e:
-                await session.rollback()
-                logger.error(f"使用邀请码失败: {e}")
-                raise
+                logger.error(f"使用白名单邀请码后解禁失败: {e}")
+                unbanned = False
+            if not unbanned:
+                logger.warning(
+                    f"用户 {telegram_id} 已成为白名单，但 Emby 账号解禁失败，需重新解禁"
+                )
+        return valid_code
 
     async def reset_password(self, telegram_id: int, password: str = "") -> bool:
         """重置用户的 Emby 密码。"""
         user = await self.must_get_emby_user(telegram_id)
         try:
-            self.emby_api.reset_user_password(user.emby_id)
-            self.emby_api.set_user_password(user.emby_id, password)
+            emby_api = self.emby_api_for(user)
+            await emby_api.reset_user_password(user.emby_id)
+            await emby_api.set_user_password(user.emby_id, password)
             return True
         except Exception as e:
             logger.error(f"重置密码失败: {e}")
@@ -284,7 +375,7 @@ class UserService:
         user.check_emby_ban()
 
         try:
-            self.emby_api.ban_user(str(user.emby_id))
+            await self.emby_api_for(user).ban_user(str(user.emby_id))
             ban_time = int(datetime.now().timestamp())
             await UserRepository.update_user(user.id, ban_time=ban_time, reason=reason)
             return True
@@ -305,7 +396,7 @@ class UserService:
         user.check_emby_unban()
 
         try:
-            self.emby_api.set_default_policy(str(user.emby_id))
+            await self.emby_api_for(user).set_default_policy(str(user.emby_id))
             await UserRepository.update_user(user.id, ban_time=0, reason=None)
             return True
         except Exception as e:
@@ -333,27 +424,26 @@ class UserService:
             update_data["register_public_time"] = register_public_time
 
         if update_data:
-            await ConfigRepository.update_config(emby_config.id, **update_data)
-            # Refresh config after update
-            emby_config = await ConfigRepository.get_by_id(emby_config.id)
+            # 更新并取回最新配置
+            emby_config = await ConfigRepository.update_config(
+                emby_config.id, refresh=True, **update_data
+            )
 
         return emby_config
 
-    def emby_count(self) -> Dict:
-        """从 Emby API 获取当前影片数量统计"""
-        return self.emby_api.count()
-
     async def get_user_router(self, telegram_id: int) -> Dict:
         """获取用户的线路信息"""
         user = await self.must_get_emby_user(telegram_id)
-        return self.emby_router_api.query_user_route(user.emby_id)
+        return await self.emby_router_api.query_user_route(user.emby_id)
 
     async def update_user_router(self, telegram_id: int, new_index: str) -> bool:
         """更新用户线路信息"""
         user = await self.must_get_emby_user(telegram_id)
-        return self.emby_router_api.update_user_route(str(user.emby_id), str(new_index))
+        return await self.emby_router_api.update_user_route(
+            str(user.emby_id), str(new_index)
+        )
 
     async def get_router_list(self, telegram_id: int) -> List[Dict]:
         """获取所有可用线路"""
         await self.must_get_emby_user(telegram_id)
-        return self.emby_router_api.query_all_route()
+        return await self.emby_router_api.query_all_route()
@@ -0,0 +1,203 @@
+import bisect
+import logging
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from utils.metrics import CIRCUIT_REJECTIONS, CIRCUIT_TRANSITIONS
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，请求被直接拒绝"""
+
+    def __init__(self, display_name: str, endpoint: str, retry_after: float):
+        super().__init__(
+            f"{display_name}暂时不可用，请约 {int(retry_after) + 1} 秒后再试。"
+        )
+        self.display_name = display_name
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    单个接口的熔断器与自适应超时。
+    连续失败达到阈值后打开，冷却期内直接拒绝请求；冷却结束后进入半开状态，
+    只放行一个探测请求，成功则关闭，失败则重新打开。
+    请求超时取最近成功请求耗时的 p99 乘以倍数，并限制在 [min_timeout, max_timeout] 内；
+    样本不足或探测请求时使用 max_timeout。
+    """
+
+    def __init__(
+        self,
+        service: str,
+        endpoint: str,
+        display_name: str = "",
+        failure_threshold: int = 5,
+        recovery_time: float = 30,
+        min_timeout: float = 1,
+        max_timeout: float = 10,
+        timeout_multiplier: float = 3,
+        window: int = 100,
+        min_samples: int = 20,
+    ):
+        self.service = service
+        self.endpoint = endpoint
+        self.display_name = display_name or service
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self.min_samples = min_samples
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._sorted: list[float] = []
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        logger.warning(
+            f"Circuit {self.service} {self.endpoint}: {self.state} -> {state}"
+        )
+        self.state = state
+        CIRCUIT_TRANSITIONS.inc(self.service, self.endpoint, state)
+
+    def timeout(self) -> float:
+        """当前请求应使用的超时（秒）"""
+        if self.state != CLOSED or len(self._sorted) < self.min_samples:
+            return self.max_timeout
+        index = min(len(self._sorted) - 1, int(len(self._sorted) * 0.99))
+        p99 = self._sorted[index]
+        timeout = p99 * self.timeout_multiplier
+        return min(self.max_timeout, max(self.min_timeout, timeout))
+
+    def acquire(self, adaptive: bool = True) -> float:
+        """
+        请求前调用，返回本次请求的超时；熔断时抛出 CircuitOpenError。
+        :param adaptive: 为 False 时不使用自适应超时，固定为 max_timeout
+        """
+        if self.state == OPEN:
+            elapsed = time.monotonic() - self.opened_at
+            if elapsed < self.recovery_time:
+                CIRCUIT_REJECTIONS.inc(self.service, self.endpoint)
+                raise CircuitOpenError(
+                    self.display_name, self.endpoint, self.recovery_time - elapsed
+                )
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self._probing:
+                CIRCUIT_REJECTIONS.inc(self.service, self.endpoint)
+                raise CircuitOpenError(self.display_name, self.endpoint, 0)
+            self._probing = True
+        return self.timeout() if adaptive else self.max_timeout
+
+    def record_success(self, latency: float):
+        if len(self._latencies) == self._latencies.maxlen:
+            oldest = self._latencies[0]
+            del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+        self._latencies.append(latency)
+        bisect.insort(self._sorted, latency)
+        self.failures = 0
+        self._probing = False
+        self._transition(CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._transition(OPEN)
+
+    def release(self):
+        """请求被取消等既非成功也非失败的情况，释放半开探测名额"""
+        self._probing = False
+
+    def is_open(self) -> bool:
+        """是否处于熔断冷却期（请求会被直接拒绝）"""
+        return (
+            self.state == OPEN
+            and time.monotonic() - self.opened_at < self.recovery_time
+        )
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "timeout": round(self.timeout(), 3),
+            "samples": len(self._latencies),
+        }
+
+
+class CircuitBreakers:
+    """按接口划分的熔断器集合"""
+
+    def __init__(
+        self,
+        service: str,
+        display_name: str,
+        is_failure: Callable[[BaseException], bool],
+        **options,
+    ):
+        """
+        :param service: 服务标识，用于日志与指标标签
+        :param display_name: 回复用户时使用的服务名称
+        :param is_failure: 判断异常是否计为服务故障（超时、连接失败、5xx 等）
+        :param options: 传给 CircuitBreaker 的参数
+        """
+        self.service = service
+        self.display_name = display_name
+        self.is_failure = is_failure
+        self.options = options
+        self._breakers: dict[str, CircuitBreaker] = {}
+
+    def get(self, endpoint: str) -> CircuitBreaker:
+        breaker = self._breakers.get(endpoint)
+        if breaker is None:
+            breaker = self._breakers[endpoint] = CircuitBreaker(
+                self.service, endpoint, self.display_name, **self.options
+            )
+        return breaker
+
+    async def call(
+        self, endpoint: str, func: Callable, *args, adaptive: bool = True, **kwargs
+    ):
+        """
+        经熔断器执行 func(*args, timeout=..., **kwargs)。
+        非幂等的请求应传 adaptive=False：客户端超时后服务端可能已完成写入，
+        使用完整的 max_timeout 以免过早放弃。
+        """
+        breaker = self.get(endpoint)
+        timeout = breaker.acquire(adaptive)
+        start = time.perf_counter()
+        outcome: Optional[bool] = None
+        try:
+            result = await func(*args, timeout=timeout, **kwargs)
+            outcome = True
+            return result
+        except Exception as e:
+            outcome = not self.is_failure(e)
+            raise
+        finally:
+            if outcome is True:
+                breaker.record_success(time.perf_counter() - start)
+            elif outcome is False:
+                breaker.record_failure()
+            else:
+                breaker.release()
+
+    def open_endpoints(self) -> list[str]:
+        """当前处于熔断冷却期的接口"""
+        return [endpoint for endpoint, b in self._breakers.items() if b.is_open()]
+
+    def snapshot(self) -> dict[str, dict]:
+        return {endpoint: b.snapshot() for endpoint, b in self._breakers.items()}
@@ -0,0 +1,301 @@
+import bisect
+import contextvars
+import functools
+import logging
+import re
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from utils import tracing
+
+logger = logging.getLogger(__name__)
+
+# 默认的耗时分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    parts = [
+        f'{name}="{str(value)}"'.replace("\n", " ")
+        for name, value in zip(labelnames, values, strict=True)
+    ]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """只增不减的计数器"""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+        ]
+        for labels, value in self._values.items():
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+            )
+        return lines
+
+
+class Histogram:
+    """
+    分桶统计。每次 observe 只更新命中的一个桶，渲染时再累加，
+    以保证热路径上的开销足够小。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        buckets: tuple = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [各桶计数..., +Inf 计数, 总和]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        data = self._values.get(labels)
+        if data is None:
+            data = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        data[bisect.bisect_left(self.buckets, value)] += 1
+        data[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for labels, data in self._values.items():
+            cumulative = 0
+            buckets = data[: len(self.buckets)]
+            for bound, count in zip(self.buckets, buckets, strict=True):
+                cumulative += count
+                label_str = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{label_str} {cumulative}")
+            cumulative += data[len(self.buckets)]
+            label_str = _format_labels(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{label_str} {cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {data[-1]}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        buckets: tuple = DEFAULT_BUCKETS,
+    ):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """以 Prometheus 文本格式输出全部指标"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+COMMANDS = registry.counter(
+    "embybot_commands_total", "Handled bot commands", ("command", "status")
+)
+COMMAND_LATENCY = registry.histogram(
+    "embybot_command_duration_seconds", "Command handler latency", ("command",)
+)
+COMMAND_DB_QUERIES = registry.histogram(
+    "embybot_command_db_queries",
+    "Database round trips per command",
+    ("command",),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50),
+)
+EMBY_REQUESTS = registry.counter(
+    "embybot_emby_requests_total",
+    "Emby API requests",
+    ("backend", "method", "endpoint", "status"),
+)
+EMBY_LATENCY = registry.histogram(
+    "embybot_emby_request_duration_seconds",
+    "Emby API latency",
+    ("backend", "method", "endpoint"),
+)
+ROUTER_REQUESTS = registry.counter(
+    "embybot_router_requests_total", "Router API requests", ("endpoint", "status")
+)
+ROUTER_LATENCY = registry.histogram(
+    "embybot_router_request_duration_seconds", "Router API latency", ("endpoint",)
+)
+DB_OPERATIONS = registry.counter(
+    "embybot_db_operations_total",
+    "DbOperations calls",
+    ("operation", "model", "status"),
+)
+DB_OPERATION_LATENCY = registry.histogram(
+    "embybot_db_operation_duration_seconds",
+    "DbOperations latency",
+    ("operation", "model"),
+)
+DB_QUERIES = registry.counter("embybot_db_queries_total", "Executed SQL statements")
+FILTERS = registry.counter(
+    "embybot_filter_checks_total", "Command filter checks", ("filter", "result")
+)
+FILTER_LATENCY = registry.histogram(
+    "embybot_filter_duration_seconds", "Command filter latency", ("filter",)
+)
+CIRCUIT_REJECTIONS = registry.counter(
+    "embybot_circuit_rejections_total",
+    "Requests rejected by an open circuit breaker",
+    ("service", "endpoint"),
+)
+CIRCUIT_TRANSITIONS = registry.counter(
+    "embybot_circuit_transitions_total",
+    "Circuit breaker state changes",
+    ("service", "endpoint", "state"),
+)
+
+# 路径中的 ID（32 位十六进制或纯数字）替换为占位符，避免标签基数膨胀
+_ID_SEGMENT = re.compile(r"/(?:[0-9a-fA-F]{32}|[0-9a-fA-F-]{36}|\d+)(?=/|$)")
+
+
+def endpoint_label(path: str) -> str:
+    """将请求路径归一化为指标标签，如 /emby/users/{id}/policy"""
+    return _ID_SEGMENT.sub("/{id}", path.split("?", 1)[0]).lower()
+
+
+class _CommandScope:
+    __slots__ = ("name", "db_queries", "failed", "deferred")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.db_queries = 0
+        self.failed = False
+        self.deferred = False
+
+
+_current_command: contextvars.ContextVar[Optional[_CommandScope]] = (
+    contextvars.ContextVar("current_command", default=None)
+)
+
+
+@contextmanager
+def command_scope(name: str):
+    """记录一次命令处理的耗时、数据库往返次数和结果"""
+    scope = _CommandScope(name)
+    token = _current_command.set(scope)
+    start = time.perf_counter()
+    try:
+        yield scope
+    except BaseException:
+        scope.failed = True
+        raise
+    finally:
+        _current_command.reset(token)
+        COMMAND_LATENCY.observe(time.perf_counter() - start, name)
+        COMMAND_DB_QUERIES.observe(scope.db_queries, name)
+        if not scope.deferred:
+            COMMANDS.inc(name, "error" if scope.failed else "ok")
+
+
+def instrumented(func):
+    """装饰器：以函数名作为命令名记录处理耗时与结果"""
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with command_scope(func.__name__), tracing.command(func.__name__):
+            return await func(*args, **kwargs)
+
+    return wrapper
+
+
+def mark_command_failed():
+    """命令内部捕获了异常并回复用户时调用，计入错误数"""
+    scope = _current_command.get()
+    if scope is not None:
+        scope.failed = True
+
+
+def defer_command_result() -> Callable[[bool], None]:
+    """
+    命令的结果要等后台处理结束才能确定时调用：本次处理结束时不计入结果，
+    改由返回的函数在后台处理结束时记录（参数为是否失败）。
+    """
+    scope = _current_command.get()
+    if scope is None:
+        return lambda failed: None
+    scope.deferred = True
+    name = scope.name
+
+    def record(failed: bool):
+        COMMANDS.inc(name, "error" if failed else "ok")
+
+    return record
+
+
+def record_db_query():
+    DB_QUERIES.inc()
+    scope = _current_command.get()
+    if scope is not None:
+        scope.db_queries += 1
+
+
+async def start_metrics_server(host: str, port: int):
+    """
+    启动 /metrics HTTP 服务。
+    :return: aiohttp AppRunner，停止时调用 cleanup()
+    """
+    from aiohttp import web
+
+    async def handle_metrics(request):
+        return web.Response(
+            text=registry.render(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Metrics server listening on {host}:{port}")
+    return runner
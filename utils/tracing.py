@@ -0,0 +1,163 @@
+import contextvars
+import json
+import logging
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# 单个 trace 最多记录的 span 数量
+MAX_SPANS = 200
+
+_enabled = False
+_slow_ms = 0.0
+_export_file = None
+
+
+class Trace:
+    """一次更新（消息 / 回调）的处理过程"""
+
+    __slots__ = ("update", "command", "user_id", "chat_id", "start", "spans")
+
+    def __init__(self, update: str, user_id=None, chat_id=None):
+        self.update = update
+        self.command: Optional[str] = None
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.start = time.perf_counter()
+        self.spans: list[tuple[str, float, float]] = []
+
+    def add(self, name: str, start: float, end: float):
+        if len(self.spans) < MAX_SPANS:
+            self.spans.append((name, start, end))
+
+    def to_dict(self, end: float) -> dict:
+        return {
+            "ts": int(time.time()),
+            "update": self.update,
+            "command": self.command,
+            "user_id": self.user_id,
+            "chat_id": self.chat_id,
+            "total_ms": round((end - self.start) * 1000, 2),
+            "spans": [
+                {
+                    "name": name,
+                    "start_ms": round((start - self.start) * 1000, 2),
+                    "ms": round((finish - start) * 1000, 2),
+                }
+                for name, start, finish in self.spans
+            ],
+        }
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar(
+    "current_trace", default=None
+)
+
+
+class _Span:
+    __slots__ = ("trace", "name", "start")
+
+    def __init__(self, trace: Trace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add(self.name, self.start, time.perf_counter())
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def configure(slow_ms: float = 0, export_path: Optional[str] = None):
+    """
+    开启追踪。slow_ms 和 export_path 都未设置时追踪保持关闭。
+    :param slow_ms: 处理耗时超过该值（毫秒）的更新会输出一行结构化日志
+    :param export_path: 将每个 trace 以 JSON Lines 格式追加写入该文件
+    """
+    global _enabled, _slow_ms, _export_file
+    _slow_ms = slow_ms
+    if export_path:
+        _export_file = open(export_path, "a", encoding="utf-8", buffering=1)
+    _enabled = slow_ms > 0 or _export_file is not None
+    if _enabled:
+        logger.info(f"Tracing enabled, slow threshold: {slow_ms} ms")
+
+
+def close():
+    global _enabled, _export_file
+    _enabled = False
+    if _export_file is not None:
+        _export_file.close()
+        _export_file = None
+
+
+def begin(update: str, user_id=None, chat_id=None):
+    """开始追踪一次更新（在过滤器执行之前调用）"""
+    if _enabled:
+        _current_trace.set(Trace(update, user_id, chat_id))
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def span(name: str):
+    """记录一段耗时，未在追踪中时为空操作"""
+    trace = _current_trace.get()
+    if trace is None:
+        return _NULL_SPAN
+    return _Span(trace, name)
+
+
+@contextmanager
+def command(name: str):
+    """命令处理结束时结束当前 trace，并按阈值输出日志或导出"""
+    if not _enabled:
+        yield
+        return
+    trace = _current_trace.get()
+    token = None
+    if trace is None:
+        trace = Trace(name)
+        token = _current_trace.set(trace)
+    trace.command = name
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        if token is not None:
+            _current_trace.reset(token)
+        else:
+            _current_trace.set(None)
+        _finish(trace, end)
+
+
+def _finish(trace: Trace, end: float):
+    is_slow = 0 < _slow_ms <= (end - trace.start) * 1000
+    if not is_slow and _export_file is None:
+        return
+    record = trace.to_dict(end)
+    if is_slow:
+        logger.warning(f"Slow update: {json.dumps(record, ensure_ascii=False)}")
+    if _export_file is not None:
+        try:
+            _export_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except Exception as e:
+            logger.error(f"写入 trace 失败: {e}")